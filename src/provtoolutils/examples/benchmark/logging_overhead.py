@@ -0,0 +1,99 @@
+"""
+Measures the logging overhead per wrapped file of DirectoryWrapper.plain2prov.
+
+Three setups are compared:
+    - no handler: the loggers are left unconfigured (library usage)
+    - file handler: a FileHandler is attached directly to the logger (the former import time behaviour)
+    - queue: provtoolutils.provtoollogger with a file sink written by a background thread
+
+Use --latency to emulate a log file on a slow (network) file system.
+
+Usage:
+
+    python logging_overhead.py --files 2000 --latency 0.2
+"""
+import argparse
+import datetime
+import logging
+import os
+import tempfile
+import time
+
+from collections import namedtuple
+
+from provtoolutils import provtoollogger
+from provtoolutils.directorywrapper import DirectoryWrapper
+
+config = '''{
+   "agent": {
+       "type": "software", "creator": "Max Mustermann", "version": "-", "label": "Benchmark", "location": "-",
+       "acted_on_behalf_of": {"given_name": "Max", "family_name": "Mustermann", "type": "person"}
+   },
+   "activity": {"location": "-", "label": "Benchmark", "means": "Measuring the logging overhead"}
+}'''
+
+Hash = namedtuple('Hash', 'name hash')
+
+
+class SlowFileHandler(logging.FileHandler):
+
+    def __init__(self, filename, latency):
+        logging.FileHandler.__init__(self, filename)
+        self.latency = latency
+
+    def emit(self, record):
+        time.sleep(self.latency)
+        logging.FileHandler.emit(self, record)
+
+
+def wrap(directory, count):
+    dw = DirectoryWrapper(config_content=config)
+    hashes = [Hash(os.path.join(directory, f'file{i}.txt'), f'{i:064x}') for i in range(count)]
+    start = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+    t = time.perf_counter()
+    dw.plain2prov(set(), hashes, start, start, None)
+    return time.perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser('Logging overhead per wrapped file')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Additional time in ms for each log write')
+    args = parser.parse_args()
+
+    logger = logging.getLogger('DirectoryWrapper')
+    results = {}
+    with tempfile.TemporaryDirectory() as d:
+        logger.setLevel(logging.WARNING)
+        results['no handler'] = wrap(os.path.join(d), args.files)
+
+        for f in os.listdir(d):
+            os.remove(os.path.join(d, f))
+        fh = SlowFileHandler(os.path.join(d, 'direct.log'), args.latency / 1000)
+        fh.setFormatter(logging.Formatter(provtoollogger.FORMAT))
+        logger.addHandler(fh)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        results['file handler'] = wrap(d, args.files)
+        logger.removeHandler(fh)
+        fh.close()
+
+        for f in os.listdir(d):
+            if f.endswith('.prov'):
+                os.remove(os.path.join(d, f))
+        qh = SlowFileHandler(os.path.join(d, 'queue.log'), args.latency / 1000)
+        qh.setFormatter(logging.Formatter(provtoollogger.FORMAT))
+        provtoollogger.configure([qh], 'INFO')
+        results['queue'] = wrap(d, args.files)
+        t = time.perf_counter()
+        provtoollogger.shutdown()
+        results['queue (incl. flush)'] = results['queue'] + time.perf_counter() - t
+
+    baseline = results['no handler']
+    for name, duration in results.items():
+        print(f'{name:>20}: {1e6 * duration / args.files:8.1f} us per file, '
+              f'overhead {1e6 * (duration - baseline) / args.files:8.1f} us per file')
+
+
+if __name__ == '__main__':
+    main()
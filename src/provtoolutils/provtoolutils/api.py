@@ -0,0 +1,141 @@
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+from collections import namedtuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Union
+
+from provtoolutils.atomicwrite import fsync_path, write_atomic
+from provtoolutils.constants import default_jobs
+from provtoolutils.directorywrapper import DirectoryWrapper
+from provtoolutils.parallel import run_parallel
+from provtoolutils.utilities import calculate_data_hash, calculate_file_hash
+
+_logger = logging.getLogger('provtool')
+
+_Hash = namedtuple('Hash', 'name hash')
+
+
+def _content(value: Union[None, str, Dict]) -> Optional[str]:
+    """
+    Configurations are given either as path of a json file, as json string or as dictionary.
+    """
+    if value is None or isinstance(value, dict):
+        return json.dumps(value) if value is not None else None
+    if os.path.isfile(value):
+        with open(value, 'r', encoding='utf-8') as f:
+            return f.read()
+    return value
+
+
+class ActivityRecorder:
+    """
+    Collects the used containers and the outputs of an activity within a Python program. The hash of each output is
+    computed when it is registered, so there is no need to scan directories at the end. See activity.
+    """
+
+    def __init__(self):
+        self.used: Set[str] = set()
+        # Path: (size, mtime in ns, hash) at the time of registration.
+        self.outputs: Dict[str, tuple] = {}
+        # Path: id of the container, once written.
+        self.written: Dict[str, str] = {}
+
+    def use(self, cid: str):
+        """
+        Registers a used container by its id. The path of a container file is accepted as well.
+        """
+        if cid.endswith('.prov'):
+            cid = os.path.basename(cid)[:-len('.prov')]
+        self.used.add(cid)
+
+    def _register(self, path: str, datahash: str) -> str:
+        st = os.stat(path)
+        self.outputs[os.path.abspath(path)] = (st.st_size, st.st_mtime_ns, datahash)
+        return datahash
+
+    def add_bytes(self, path: str, data: bytes) -> str:
+        """
+        Writes **data** to **path** and registers it as output.
+
+        :return: The hash of the data.
+        """
+        write_atomic(path, data, fsync=False)
+        return self._register(path, calculate_data_hash(data))
+
+    def add_stream(self, path: str, stream: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Copies **stream** to **path** and registers it as output. The data is hashed while copying.
+
+        :return: The hash of the data.
+        """
+        digest = hashlib.sha256()
+        tmp = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp, 'xb') as f:
+                chunk = stream.read(chunk_size)
+                while chunk:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    chunk = stream.read(chunk_size)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return self._register(path, digest.hexdigest())
+
+    def add_path(self, path: str) -> str:
+        """
+        Registers a file, which was written by other means, as output. The file should not be modified afterwards.
+        Otherwise, it is hashed again at the end of the activity.
+
+        :return: The hash of the file.
+        """
+        return self._register(path, calculate_file_hash(path))
+
+    def _hashes(self) -> List[_Hash]:
+        hashes = []
+        for path, (size, mtime_ns, datahash) in sorted(self.outputs.items()):
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                _logger.warning('%s was modified after it was registered. Hashing it again', path)
+                datahash = calculate_file_hash(path)
+            hashes.append(_Hash(path, datahash))
+        return hashes
+
+
+@contextlib.contextmanager
+def activity(config: Union[str, Dict], agentinfo: Union[None, str, Dict] = None, activity_id: str = None,
+             started_by: str = None, blobstore: str = None, jobs: int = default_jobs) -> Iterator[ActivityRecorder]:
+    """
+    Records an activity performed by Python code. The activity starts when entering and ends when leaving the
+    block. At the end, a container is written next to each registered output. The agents and the activity are
+    described by the same configuration as for the directory wrapper.
+
+    Example::
+
+        with activity('config.json', 'agent.json') as act:
+            act.use(cid)
+            act.add_bytes('output/result.txt', result)
+
+    If the block raises, no containers are written.
+
+    :param config: Path of a configuration file, its content or the parsed content.
+    :param agentinfo: Optional additional agents (path, content or parsed content).
+    """
+    wrapper = DirectoryWrapper(agentinfo_content=_content(agentinfo), config_content=_content(config),
+                               blobstore=blobstore)
+    recorder = ActivityRecorder()
+    start = datetime.datetime.now(datetime.timezone.utc)
+    yield recorder
+    end = datetime.datetime.now(datetime.timezone.utc)
+
+    hashes = recorder._hashes()
+    # The data files were written without fsync. They are persisted together here, the containers are persisted
+    # as one batch by plain2prov.
+    run_parallel(fsync_path, [h.name for h in hashes], jobs)
+    recorder.written = wrapper.plain2prov(recorder.used, hashes, start, end, activity_id, started_by)
@@ -0,0 +1,129 @@
+import contextlib
+import os
+import uuid
+
+from typing import List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Not available on Windows. Shared files are written without advisory locks there.
+    fcntl = None
+
+from provtoolutils.constants import default_jobs
+from provtoolutils.parallel import run_parallel
+
+
+def fsync_path(path: str, directory: bool = False):
+    """
+    Persists the file (or with **directory** set, the directory entries) at **path**.
+    """
+    flags = os.O_RDONLY | (getattr(os, 'O_DIRECTORY', 0) if directory else 0)
+    try:
+        fd = os.open(path, flags)
+    except OSError:
+        if directory:
+            # Directories can not be opened on some platforms (Windows). Their entries are persisted anyway.
+            return
+        raise
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FsyncBatch:
+    """
+    Writes a group of files atomically. Each file is written to a temporary file in the target directory first.
+    commit persists all temporary files (fsync), renames them to their targets and persists each of the affected
+    directories once. Readers never see partially written files, and the cost of fsync is paid once per group
+    instead of once per file.
+
+    Used as context manager, the batch is committed at the end of the block. If the block raises, the temporary
+    files are removed and no target is touched.
+    """
+
+    def __init__(self, fsync: bool = True, jobs: int = default_jobs):
+        """
+        :param fsync: Without fsync, the files are still replaced atomically but may be lost on a crash.
+        :param jobs: Number of files persisted concurrently. Waiting for the storage overlaps this way.
+        """
+        self.fsync = fsync
+        self.jobs = jobs
+        self._pending: List[Tuple[str, str]] = []
+
+    def write(self, path: str, data: bytes):
+        directory = os.path.dirname(path)
+        tmp = os.path.join(directory, f'.{os.path.basename(path)}.{uuid.uuid4().hex}.tmp')
+        with open(tmp, 'xb') as f:
+            f.write(data)
+        self._pending.append((tmp, path))
+
+    def commit(self):
+        pending, self._pending = self._pending, []
+        directories = sorted({os.path.dirname(os.path.abspath(path)) for _, path in pending})
+        replaced = 0
+        try:
+            if self.fsync:
+                run_parallel(fsync_path, [tmp for tmp, _ in pending], self.jobs)
+            for tmp, path in pending:
+                os.replace(tmp, path)
+                replaced += 1
+        finally:
+            # Only left over, if persisting or renaming failed.
+            for tmp, _ in pending[replaced:]:
+                os.remove(tmp)
+        if self.fsync:
+            for directory in directories:
+                fsync_path(directory, directory=True)
+
+    def abort(self):
+        pending, self._pending = self._pending, []
+        for tmp, _ in pending:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __enter__(self) -> 'FsyncBatch':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def write_atomic(path: str, data: bytes, fsync: bool = True):
+    """
+    Replaces **path** with **data** atomically. See FsyncBatch.
+    """
+    with FsyncBatch(fsync) as batch:
+        batch.write(path, data)
+
+
+@contextlib.contextmanager
+def locked(f):
+    """
+    Holds an exclusive advisory lock on the open file **f** (flock). Processes, which take the lock as well, are
+    serialized. Without fcntl, nothing is locked.
+    """
+    if fcntl is None:  # pragma: no cover
+        yield f
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def append_locked(path: str, text: str, fsync: bool = True):
+    """
+    Appends **text** to a file shared by concurrent writers. The text is written under an exclusive lock with a
+    single write call, so lines of different writers are never interleaved.
+    """
+    with open(path, 'a', encoding='utf-8') as f, locked(f):
+        f.write(text)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
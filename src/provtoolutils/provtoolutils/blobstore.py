@@ -0,0 +1,213 @@
+import argparse
+import contextlib
+import os
+import sqlite3
+import stat
+import sys
+import textwrap
+import uuid
+
+from typing import Iterable, Optional
+
+from provtoolutils.materialize import materialize, strategies
+from provtoolutils.utilities import calculate_data_hash, calculate_file_hash
+
+# Environment variable with the root of the blob store used, if none is given explicitly.
+blobstore_env = 'PROVTOOLBLOBSTORE'
+
+
+def blob_path(root: str, datahash: str) -> str:
+    """
+    The path of the data with the given hash in the blob store at **root**. The data may not exist.
+    """
+    return os.path.join(root, datahash[:2], datahash)
+
+
+class BlobStore:
+    """
+    Content addressed store for the data of provenance containers. Byte identical data of different containers is
+    stored only once.
+
+    The data is stored under root/<first two characters of the datahash>/<datahash>. The stored files are read only,
+    because they may be shared via hardlinks. The containers referencing a blob are kept in an sqlite database in the
+    root directory. A blob is deleted, once the last container referencing it is released.
+
+    Several processes may use the same store concurrently.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('create table if not exists refs(datahash text not null, cid text not null, '
+                         'primary key (datahash, cid))')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # One connection per operation. Connections can not be shared between the threads of the daemon.
+        conn = sqlite3.connect(os.path.join(self.root, 'refs.db'), timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def path(self, datahash: str) -> str:
+        return blob_path(self.root, datahash)
+
+    def contains(self, datahash: str) -> bool:
+        return os.path.isfile(self.path(datahash))
+
+    def _import(self, filepath: str, datahash: str) -> str:
+        target = self.path(datahash)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = os.path.join(os.path.dirname(target), f'.{datahash}.{uuid.uuid4().hex}.tmp')
+        # Never hardlink into the store. A later modification of the source would change the stored data.
+        materialize(filepath, tmp)
+        if calculate_file_hash(tmp) != datahash:
+            os.remove(tmp)
+            raise ValueError(f'Hash of {filepath} does not match {datahash}')
+        os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        return tmp
+
+    def put(self, filepath: str, cid: str, datahash: str = None) -> str:
+        """
+        Stores the content of **filepath** (if not yet stored) and references it by the container **cid**.
+
+        :return: The datahash of the content.
+        """
+        if datahash is None:
+            datahash = calculate_file_hash(filepath)
+
+        # Copy outside of the lock. If another process stores the same data meanwhile, the copy is discarded.
+        tmp = None if self.contains(datahash) else self._import(filepath, datahash)
+        try:
+            with self._connect() as conn:
+                conn.execute('begin immediate')
+                if not self.contains(datahash):
+                    if tmp is None:
+                        tmp = self._import(filepath, datahash)
+                    os.replace(tmp, self.path(datahash))
+                    tmp = None
+                conn.execute('insert or ignore into refs(datahash, cid) values (?, ?)', (datahash, cid))
+        finally:
+            if tmp is not None:
+                os.remove(tmp)
+
+        return datahash
+
+    def put_bytes(self, data: bytes, cid: str, datahash: str = None) -> str:
+        """
+        Same as put for data in memory.
+        """
+        if datahash is None:
+            datahash = calculate_data_hash(data)
+        if self.contains(datahash):
+            self.add_ref(datahash, cid)
+            return datahash
+
+        tmp = os.path.join(self.root, f'.{datahash}.{uuid.uuid4().hex}.tmp')
+        with open(tmp, 'xb') as f:
+            f.write(data)
+        try:
+            return self.put(tmp, cid, datahash)
+        finally:
+            os.remove(tmp)
+
+    def add_ref(self, datahash: str, cid: str):
+        """
+        References already stored data by the container **cid**.
+        """
+        with self._connect() as conn:
+            conn.execute('begin immediate')
+            if not self.contains(datahash):
+                raise ValueError(f'No data with hash {datahash} in blob store {self.root}')
+            conn.execute('insert or ignore into refs(datahash, cid) values (?, ?)', (datahash, cid))
+
+    def deduplicate(self, filepath: str, datahash: str) -> Optional[str]:
+        """
+        Replaces the file at **filepath** by a hardlink to (or, across devices, a reflink of) the stored data, so the
+        content is kept on disk once. Hardlinked files are read only like the store. A full copy would not save any
+        space, so the file is kept as it is, if neither is supported.
+
+        :return: The strategy used or None, if the file was kept.
+        """
+        if not self.contains(datahash):
+            raise ValueError(f'No data with hash {datahash} in blob store {self.root}')
+        tmp = os.path.join(os.path.dirname(filepath), f'.{os.path.basename(filepath)}.{uuid.uuid4().hex}.tmp')
+        for strategy in ['hardlink', 'reflink']:
+            try:
+                strategies[strategy](self.path(datahash), tmp)
+            except FileExistsError:
+                raise
+            except OSError:
+                continue
+            os.replace(tmp, filepath)
+            return strategy
+        return None
+
+    def refcount(self, datahash: str) -> int:
+        with self._connect() as conn:
+            return conn.execute('select count(*) from refs where datahash = ?', (datahash,)).fetchone()[0]
+
+    def release(self, datahash: str, cid: str) -> bool:
+        """
+        Removes the reference of the container **cid**. The data is deleted, if no references are left.
+
+        :return: True, if the data was deleted.
+        """
+        with self._connect() as conn:
+            conn.execute('begin immediate')
+            conn.execute('delete from refs where datahash = ? and cid = ?', (datahash, cid))
+            remaining = conn.execute('select count(*) from refs where datahash = ?', (datahash,)).fetchone()[0]
+            if remaining == 0 and self.contains(datahash):
+                os.remove(self.path(datahash))
+                return True
+        return False
+
+    def collect(self, cids: Iterable[str]) -> int:
+        """
+        Releases the references of all containers except **cids**, for example the containers still existing. Data,
+        which is not referenced anymore, is deleted.
+
+        :return: The number of deleted blobs.
+        """
+        keep = set(cids)
+        with self._connect() as conn:
+            refs = conn.execute('select datahash, cid from refs').fetchall()
+        return sum(1 for datahash, cid in refs if cid not in keep and self.release(datahash, cid))
+
+    def materialize(self, datahash: str, dst: str, strategy: str = 'auto') -> str:
+        """
+        Makes the stored data available as **dst**. See provtoolutils.materialize for the strategies. Hardlinks to
+        the store are read only.
+
+        :return: The strategy, which was used finally.
+        """
+        if not self.contains(datahash):
+            raise ValueError(f'No data with hash {datahash} in blob store {self.root}')
+        return materialize(self.path(datahash), dst, strategy)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    parser = argparse.ArgumentParser('Blob store garbage collection', formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--blobstore', default=os.environ.get(blobstore_env), help=textwrap.dedent(
+        f'''
+            Root directory of the blob store. Defaults to the value of the environment variable {blobstore_env}.
+        '''
+    ))
+    parser.add_argument('directories', nargs='+', help=textwrap.dedent(
+        '''
+            Directories, which contain all containers referencing the store (searched recursively). References of
+            other containers are released and data not referenced anymore is deleted.
+        '''
+    ))
+    args = parser.parse_args()
+    if args.blobstore is None:
+        parser.error(f'No blob store given. Use --blobstore or set {blobstore_env}')
+
+    live = {f[:-len('.prov')] for d in args.directories for _, _, filenames in os.walk(d)
+            for f in filenames if f.endswith('.prov')}
+    print(f'Deleted {BlobStore(args.blobstore).collect(live)} blobs')
+    sys.exit(0)
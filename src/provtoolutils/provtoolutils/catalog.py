@@ -0,0 +1,430 @@
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import textwrap
+
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from provtoolutils.constants import default_jobs, model_encoding
+from provtoolutils.parallel import run_parallel
+
+_logger = logging.getLogger('provtool')
+
+# Name of the database next to the containers, which maps the paths of the wrapped files to their containers.
+catalog_filename = 'provtool_catalog.db'
+
+# Name of the text files, which mapped paths to containers before the catalog. See migrate.
+mapping_filename = 'provtool_filemapping.txt'
+
+# Entries of mapping files: <path>=<container id>.prov. Older versions did not separate the entries by newlines.
+_mapping_entry = re.compile(r'(.+?)=([0-9a-f]{64})\.prov\n?')
+
+
+def utc(value: Union[str, datetime.datetime]) -> str:
+    """
+    A time (ISO 8601 string or datetime) in UTC with fixed width. Such times compare as strings in the order of time,
+    so the database compares them by its indexes. Times without time zone are taken as UTC.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            # Not all ISO 8601 forms are supported by fromisoformat (for example Z as time zone).
+            import dateutil.parser
+            value = dateutil.parser.isoparse(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+
+def container_metadata(rawprov: bytes, container_path: str) -> Dict:
+    """
+    The metadata of a container, which the catalog indexes (see Catalog.add and Catalog.query).
+
+    :param container_path: Where the container is stored.
+    """
+    prov = json.loads(rawprov.decode(model_encoding))
+    entity = next(iter(prov['entity'].values()))
+    activity_id, activity = next(iter(prov['activity'].items()))
+    return {
+        'cid': os.path.basename(container_path)[:-len('.prov')],
+        'container': os.path.abspath(container_path),
+        'label': entity['prov:label'],
+        'type': entity['prov:type'],
+        'datahash': entity['provtool:datahash'],
+        'activity': activity_id,
+        'activity_label': activity['prov:label'],
+        'location': activity['prov:location'],
+        'start': utc(activity['prov:startTime']),
+        'end': utc(activity['prov:endTime']),
+        'agents': sorted({a['prov:label'] for a in prov['agent'].values()}),
+        'used': sorted({u['prov:entity'] for u in prov.get('used', {}).values()})
+    }
+
+
+_container_columns = ['cid', 'container', 'label', 'type', 'datahash', 'activity', 'activity_label', 'location',
+                      'start', 'end']
+
+
+class Catalog:
+    """
+    Index of the containers in a directory. For each wrapped file, the path of the file, the id of the container,
+    the hash of the data and the time the container was written are recorded. Lookups by path, container id or
+    datahash use indexes instead of scanning.
+
+    Besides, the metadata of the containers (entity, activity, agents and used containers) is kept in indexed tables.
+    Queries (see query) are answered from these without reading any container.
+
+    Several processes may use the same catalog concurrently (write ahead log).
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The database file. It is created, if it does not exist.
+        """
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('create table if not exists files(path text not null, cid text not null, '
+                         'datahash text not null, time text not null, primary key (path, cid))')
+            conn.execute('create index if not exists files_cid on files(cid)')
+            conn.execute('create index if not exists files_datahash on files(datahash)')
+            conn.execute('create table if not exists containers(cid text primary key, container text not null, '
+                         'label text not null, type text not null, datahash text not null, activity text not null, '
+                         'activity_label text not null, location text not null, start text not null, '
+                         'end text not null)')
+            conn.execute('create index if not exists containers_datahash on containers(datahash)')
+            conn.execute('create index if not exists containers_location on containers(location, end)')
+            conn.execute('create index if not exists containers_end on containers(end)')
+            conn.execute('create table if not exists agents(cid text not null, agent text not null, '
+                         'primary key (cid, agent))')
+            conn.execute('create index if not exists agents_agent on agents(agent, cid)')
+            conn.execute('create table if not exists used(cid text not null, used text not null, '
+                         'primary key (cid, used))')
+            # Reverse lineage: the containers, which used a container.
+            conn.execute('create index if not exists used_used on used(used, cid)')
+
+    @staticmethod
+    def in_directory(directory: str) -> 'Catalog':
+        return Catalog(os.path.join(directory, catalog_filename))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, entries: Iterable[Tuple], time: datetime.datetime = None, metadata: Iterable[Dict] = ()):
+        """
+        Records the (path, cid, datahash) **entries** in a single transaction. An entry may have its own time as
+        fourth element, for example the time of the commit of a revision.
+
+        :param time: The time the containers were written. Defaults to now.
+        :param metadata: The metadata (see container_metadata) of the containers, which is indexed in the same
+        transaction.
+        """
+        time = time if time is not None else datetime.datetime.now(datetime.timezone.utc)
+        with self._connect() as conn:
+            conn.executemany('insert or replace into files(path, cid, datahash, time) values (?, ?, ?, ?)',
+                             [(os.path.abspath(e[0]), e[1], e[2], utc(e[3] if len(e) > 3 else time))
+                              for e in entries])
+            self._add_metadata(conn, metadata)
+
+    def index(self, metadata: Iterable[Dict]):
+        """
+        Indexes the metadata (see container_metadata) of containers in a single transaction.
+        """
+        with self._connect() as conn:
+            self._add_metadata(conn, metadata)
+
+    @staticmethod
+    def _add_metadata(conn: sqlite3.Connection, metadata: Iterable[Dict]):
+        metadata = list(metadata)
+        conn.executemany(f'insert or replace into containers({", ".join(_container_columns)}) '
+                         f'values ({", ".join(["?"] * len(_container_columns))})',
+                         [[m[c] for c in _container_columns] for m in metadata])
+        conn.executemany('insert or ignore into agents(cid, agent) values (?, ?)',
+                         [(m['cid'], a) for m in metadata for a in m['agents']])
+        conn.executemany('insert or ignore into used(cid, used) values (?, ?)',
+                         [(m['cid'], u) for m in metadata for u in m['used']])
+
+    def _select(self, column: str, value: str) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(f'select path, cid, datahash, time from files where {column} = ? '
+                                'order by time desc, cid', (value,)).fetchall()
+        return [{'path': r[0], 'cid': r[1], 'datahash': r[2], 'time': r[3]} for r in rows]
+
+    @staticmethod
+    def _query_sql(agent: str = None, since: str = None, until: str = None, datahash: str = None,
+                   location: str = None) -> Tuple[str, List]:
+        conditions, params = [], []
+        if agent is not None:
+            conditions.append('cid in (select cid from agents where agent = ?)')
+            params.append(agent)
+        if since is not None:
+            conditions.append('end >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('end <= ?')
+            params.append(until)
+        if datahash is not None:
+            conditions.append('datahash = ?')
+            params.append(datahash)
+        if location is not None:
+            conditions.append('location = ?')
+            params.append(location)
+        where = f' where {" and ".join(conditions)}' if len(conditions) > 0 else ''
+        return f'select {", ".join(_container_columns)} from containers{where} order by end, cid', params
+
+    def query(self, agent: str = None, since: Union[None, str, datetime.datetime] = None,
+              until: Union[None, str, datetime.datetime] = None, datahash: str = None,
+              location: str = None) -> List[Dict]:
+        """
+        The containers matching all given criteria, ordered by the end of their activity. Each container is returned
+        with its metadata (see container_metadata).
+
+        :param agent: Label of an agent involved in the activity (for persons given and family name).
+        :param since: Earliest end of the activity, which generated the entity. Times without time zone are UTC.
+        :param until: Latest end of the activity.
+        :param datahash: Hash of the data.
+        :param location: Location of the activity.
+        """
+        sql, params = self._query_sql(agent, utc(since) if since is not None else None,
+                                      utc(until) if until is not None else None, datahash, location)
+        with self._connect() as conn:
+            return [self._complete(conn, row) for row in conn.execute(sql, params).fetchall()]
+
+    @staticmethod
+    def _complete(conn: sqlite3.Connection, row: Tuple) -> Dict:
+        m = dict(zip(_container_columns, row))
+        m['agents'] = [r[0] for r in conn.execute('select agent from agents where cid = ? order by agent', (m['cid'],))]
+        m['used'] = [r[0] for r in conn.execute('select used from used where cid = ? order by used', (m['cid'],))]
+        return m
+
+    def impact(self, cid: str) -> List[Dict]:
+        """
+        The containers, which depend on the container **cid** directly or transitively (its descendants), ordered
+        by the end of their activity. Each is returned with its metadata (see container_metadata) except agents and
+        used containers.
+
+        The descendants are collected by the database in a single recursive query over the reverse lineage index.
+        Each container is visited once, also if the lineage has cycles.
+        """
+        with self._connect() as conn:
+            rows = conn.execute('with recursive descendants(cid) as ('
+                                'select cid from used where used = ? '
+                                'union select used.cid from used join descendants on used.used = descendants.cid) '
+                                f'select {", ".join("containers." + c for c in _container_columns)} '
+                                'from descendants join containers on containers.cid = descendants.cid '
+                                'where containers.cid != ? order by containers.end, containers.cid',
+                                (cid, cid)).fetchall()
+        return [dict(zip(_container_columns, row)) for row in rows]
+
+    def metadata(self, cid: str) -> Optional[Dict]:
+        """
+        The metadata of the container **cid** or None, if it is not indexed.
+        """
+        with self._connect() as conn:
+            row = conn.execute(f'select {", ".join(_container_columns)} from containers where cid = ?',
+                               (cid,)).fetchone()
+            return self._complete(conn, row) if row is not None else None
+
+    def entries(self) -> List[Dict]:
+        """
+        All entries ordered by path and time.
+        """
+        with self._connect() as conn:
+            rows = conn.execute('select path, cid, datahash, time from files order by path, time, cid').fetchall()
+        return [{'path': r[0], 'cid': r[1], 'datahash': r[2], 'time': r[3]} for r in rows]
+
+    def lookup(self, path: str) -> List[Dict]:
+        """
+        The containers written for the file at **path**, the latest first.
+        """
+        return self._select('path', os.path.abspath(path))
+
+    def by_cid(self, cid: str) -> List[Dict]:
+        return self._select('cid', cid)
+
+    def by_datahash(self, datahash: str) -> List[Dict]:
+        return self._select('datahash', datahash)
+
+
+def _datahash(container_filepath: str) -> str:
+    with open(container_filepath, 'rb') as f:
+        prov = json.loads(f.read().decode(model_encoding))
+    return next(iter(prov['entity'].values()))['provtool:datahash']
+
+
+def migrate(directory: str) -> int:
+    """
+    Imports the mapping files (provtool_filemapping.txt) in **directory** and below into the catalogs of their
+    directories. The datahash is taken from the container and the time is the modification time of the container.
+    Entries, whose container does not exist anymore, are skipped. The mapping files are kept.
+
+    :return: The number of imported entries.
+    """
+    count = 0
+    for dirname, dirnames, filenames in os.walk(directory):
+        if mapping_filename not in filenames:
+            continue
+        with open(os.path.join(dirname, mapping_filename), 'r', encoding='utf-8') as f:
+            text = f.read()
+
+        entries = []
+        for match in _mapping_entry.finditer(text):
+            path, cid = match.group(1), match.group(2)
+            container_filepath = os.path.join(dirname, f'{cid}.prov')
+            if not os.path.exists(container_filepath):
+                _logger.warning('Skipping %s: Container %s does not exist', path, container_filepath)
+                continue
+            mtime = datetime.datetime.fromtimestamp(os.path.getmtime(container_filepath), tz=datetime.timezone.utc)
+            entries.append((path, cid, _datahash(container_filepath), mtime))
+        Catalog.in_directory(dirname).add(entries)
+        count = count + len(entries)
+    return count
+
+
+def index_directory(directory: str, catalog: Catalog = None, jobs: int = default_jobs) -> int:
+    """
+    Indexes the metadata of all containers in **directory** and below, for example of the outputs of the directory
+    wrapper. The containers are read and parsed by a pool of **jobs** threads. Unreadable containers are skipped.
+
+    :param catalog: Defaults to the catalog in **directory**.
+    :return: The number of indexed containers.
+    """
+    catalog = catalog if catalog is not None else Catalog.in_directory(directory)
+
+    def read(container_path):
+        try:
+            with open(container_path, 'rb') as f:
+                return container_metadata(f.read(), container_path)
+        # Any file ending with .prov is tried. Invalid ones are reported and skipped.
+        except Exception as e:
+            _logger.warning('Skipping %s: %s', container_path, e)
+            return None
+
+    paths = (os.path.join(dirname, f) for dirname, _, filenames in os.walk(directory)
+             for f in filenames if f.endswith('.prov'))
+    metadata = [m for m in run_parallel(read, paths, jobs) if m is not None]
+    catalog.index(metadata)
+    return len(metadata)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    usage_message = """
+        %(prog)s <command> [options]
+
+
+        Example:
+
+        python -m provtoolutils.catalog lookup --path results/output.txt
+        python -m provtoolutils.catalog lookup --datahash <hash> --directory results
+        python -m provtoolutils.catalog migrate <directory>
+        python -m provtoolutils.catalog index <directory>
+        python -m provtoolutils.catalog query --agent "Max Mustermann" --since 2021-01-01T00:00:00+00:00
+        python -m provtoolutils.catalog impact <container id> --directory results
+        """
+    parser = argparse.ArgumentParser('Provenance catalog', usage=usage_message,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', metavar='{lookup,migrate,index,query,impact}', required=True)
+
+    lookup_parser = subparsers.add_parser('lookup', formatter_class=argparse.RawTextHelpFormatter, help=textwrap.dedent(
+        '''
+            Print the containers written for a file, or with a container id or datahash. One line with path,
+            container id, datahash and time per container.
+        '''
+    ))
+    keys = lookup_parser.add_mutually_exclusive_group(required=True)
+    keys.add_argument('--path', help='Path of a wrapped file')
+    keys.add_argument('--cid', help='Id of a container')
+    keys.add_argument('--datahash', help='Hash of the data of a container')
+    lookup_parser.add_argument('--directory', help=textwrap.dedent(
+        '''
+            Directory of the catalog. Defaults to the directory of --path or the current directory.
+        '''
+    ))
+
+    migrate_parser = subparsers.add_parser('migrate', help=textwrap.dedent(
+        f'''
+            Import the {mapping_filename} files in a directory and below into catalogs.
+        '''
+    ))
+    migrate_parser.add_argument('directory')
+
+    index_parser = subparsers.add_parser('index', help=textwrap.dedent(
+        '''
+            Index the metadata of all containers in a directory and below into the catalog of the directory.
+        '''
+    ))
+    index_parser.add_argument('directory')
+
+    query_parser = subparsers.add_parser('query', formatter_class=argparse.RawTextHelpFormatter, help=textwrap.dedent(
+        '''
+            Print the indexed containers matching all given criteria. One line with container, entity label, end
+            of the activity and agents per container.
+        '''
+    ))
+    query_parser.add_argument('--agent', help='Label of an agent (for persons given and family name)')
+    query_parser.add_argument('--since', help='Earliest end of the generating activity (ISO 8601, default UTC)')
+    query_parser.add_argument('--until', help='Latest end of the generating activity (ISO 8601, default UTC)')
+    query_parser.add_argument('--datahash', help='Hash of the data')
+    query_parser.add_argument('--location', help='Location of the activity')
+    query_parser.add_argument('--directory', default='.', help='Directory of the catalog')
+
+    impact_parser = subparsers.add_parser('impact', formatter_class=argparse.RawTextHelpFormatter, help=textwrap.dedent(
+        '''
+            Print the indexed containers, which depend on a container directly or transitively. One line with
+            container, entity label and end of the activity per container.
+        '''
+    ))
+    impact_parser.add_argument('cid', help='Id of the container')
+    impact_parser.add_argument('--directory', default='.', help='Directory of the catalog')
+
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        print(f'Imported {migrate(args.directory)} entries')
+        sys.exit(0)
+    if args.command == 'index':
+        print(f'Indexed {index_directory(args.directory)} containers')
+        sys.exit(0)
+    if args.command in ('query', 'impact') and not os.path.exists(os.path.join(args.directory, catalog_filename)):
+        parser.error(f'No catalog in {args.directory}')
+    if args.command == 'impact':
+        found = Catalog.in_directory(args.directory).impact(args.cid)
+        for m in found:
+            print('\t'.join([m['container'], m['label'], m['end']]))
+        sys.exit(0 if len(found) > 0 else 1)
+    if args.command == 'query':
+        found = Catalog.in_directory(args.directory).query(args.agent, args.since, args.until, args.datahash,
+                                                           args.location)
+        for m in found:
+            print('\t'.join([m['container'], m['label'], m['end'], ', '.join(m['agents'])]))
+        sys.exit(0 if len(found) > 0 else 1)
+
+    directory = args.directory
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(args.path)) if args.path is not None else os.getcwd()
+    if not os.path.exists(os.path.join(directory, catalog_filename)):
+        parser.error(f'No catalog in {directory}')
+
+    catalog = Catalog.in_directory(directory)
+    if args.path is not None:
+        found = catalog.lookup(args.path)
+    elif args.cid is not None:
+        found = catalog.by_cid(args.cid)
+    else:
+        found = catalog.by_datahash(args.datahash)
+    for e in found:
+        print('\t'.join([e['path'], e['cid'], e['datahash'], e['time']]))
+    sys.exit(0 if len(found) > 0 else 1)
@@ -1,5 +1,12 @@
 model_encoding = 'utf-8'
 
+# Name of the file, in which DirectoryWrapper keeps track of already wrapped output files.
+manifest_filename = 'provtool_manifest.json'
+
+# Number of threads for reading and hashing files. Mostly waiting for I/O, so more threads than cores pay off on
+# network file systems.
+default_jobs = 8
+
 config_schema = {
     "definitions": {
         "agents": {
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+from typing import Dict, List, Tuple
+
+from provtoolutils.constants import default_jobs, model_encoding
+from provtoolutils.parallel import run_parallel
+from provtoolutils.utilities import calculate_file_hash
+
+# Value of prov:type for entities, which stand for a directory (see provtoolutils.model.Entity.DIRECTORY).
+directory_type = 'Directory'
+
+
+def _files(directory: str) -> List[str]:
+    """
+    The paths of all files below **directory**, relative to it with '/' as separator and sorted.
+    """
+    relpaths = []
+    for dirname, dirnames, filenames in os.walk(directory):
+        for f in filenames:
+            relpaths.append(os.path.relpath(os.path.join(dirname, f), directory).replace(os.sep, '/'))
+    return sorted(relpaths)
+
+
+def build_manifest(directory: str, jobs: int = default_jobs, prehashed: Dict[str, Tuple] = None) -> List[Dict]:
+    """
+    Hashes all files below **directory** in a pool of **jobs** threads.
+
+    :param prehashed: Hashes already known (see DirectoryWrapper._wrap_outputs). The keys are the file paths, the
+    values (size, mtime in ns, hash) tuples. Files with a different size or modification time are hashed again.
+    :return: One dictionary with path, size and hash for each file, sorted by path.
+    """
+    prehashed = prehashed if prehashed is not None else {}
+
+    def entry(relpath):
+        filepath = os.path.join(directory, *relpath.split('/'))
+        st = os.stat(filepath)
+        known = prehashed.get(filepath)
+        if known is not None and known[:2] == (st.st_size, st.st_mtime_ns):
+            return {'path': relpath, 'size': st.st_size, 'hash': known[2]}
+        return {'path': relpath, 'size': st.st_size, 'hash': calculate_file_hash(filepath)}
+
+    return run_parallel(entry, _files(directory), jobs)
+
+
+def merkle_root(entries: List[Dict]) -> str:
+    """
+    Calculates the root of a Merkle tree over the entries of a manifest. Leaves and inner nodes are hashed with
+    different prefixes and a node without sibling is moved up unchanged (as in RFC 6962), so different manifests
+    never share a root.
+    """
+    if len(entries) == 0:
+        return hashlib.sha256(b'').hexdigest()
+
+    level = [hashlib.sha256(b'\x00' + f'{e["path"]}\x00{e["size"]}\x00{e["hash"]}'.encode(model_encoding)).digest()
+             for e in sorted(entries, key=lambda e: e['path'])]
+    while len(level) > 1:
+        parents = [hashlib.sha256(b'\x01' + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2 == 1:
+            parents.append(level[-1])
+        level = parents
+    return level[0].hex()
+
+
+def manifest_bytes(entries: List[Dict]) -> bytes:
+    """
+    The manifest as stored as data of a directory container.
+    """
+    files = sorted(entries, key=lambda e: e['path'])
+    return json.dumps({'version': 1, 'files': files}, ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':')).encode(model_encoding)
+
+
+def read_manifest(data: bytes, datahash: str) -> List[Dict]:
+    """
+    Parses the data of a directory container and checks it against the datahash of the container.
+    """
+    entries = json.loads(data.decode(model_encoding))['files']
+    if merkle_root(entries) != datahash:
+        raise ValueError(f'Manifest does not match the datahash {datahash}')
+    return entries
+
+
+def verify_members(entries: List[Dict], directory: str, jobs: int = default_jobs):
+    """
+    Checks, that **directory** contains exactly the files listed in the manifest with the listed sizes and hashes.
+    The files are hashed in a pool of **jobs** threads.
+    """
+    if not os.path.isdir(directory):
+        raise ValueError(f'Directory {directory} does not exist')
+
+    expected = {e['path'] for e in entries}
+    found = set(_files(directory))
+    problems = [f'{p}: missing' for p in sorted(expected - found)] + \
+               [f'{p}: not in manifest' for p in sorted(found - expected)]
+
+    def verify(e):
+        filepath = os.path.join(directory, *e['path'].split('/'))
+        if os.path.getsize(filepath) != e['size'] or calculate_file_hash(filepath) != e['hash']:
+            return f'{e["path"]}: modified'
+        return None
+
+    problems.extend([p for p in run_parallel(verify, [e for e in entries if e['path'] in found], jobs)
+                     if p is not None])
+    if len(problems) > 0:
+        raise ValueError(f'Directory {directory} does not match its manifest:\n' + '\n'.join(problems))
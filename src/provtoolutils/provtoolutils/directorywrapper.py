@@ -5,22 +5,32 @@ import json
 import jsonschema
 import logging
 import os
+import queue
+import signal
 import textwrap
 import sys
+import threading
 
 if sys.version_info < (3, 10):
     from importlib_metadata import entry_points
 else:
     from importlib.metadata import entry_points
 
-from typing import List, Set
+from typing import Dict, List, Set, Tuple
 
 from collections import namedtuple
 
-from provtoolutils.constants import agent_schema, config_schema, model_encoding
+from provtoolutils.constants import agent_schema, config_schema, default_jobs, manifest_filename, model_encoding, \
+                                   prov_schema
+from provtoolutils.atomicwrite import FsyncBatch, write_atomic
+from provtoolutils.blobstore import blobstore_env, BlobStore
+from provtoolutils.materialize import materialize, strategies
+from provtoolutils.parallel import run_parallel
+from provtoolutils.stepcache import stepcache_env, StepCache
+from provtoolutils import dataset, provtoollogger, resources, watch
 from provtoolutils.model import make_provstring, ActingSoftware, Activity, Entity,\
                                 Organization, Person, ProvIdentifiableObject
-from provtoolutils.utilities import calculate_data_hash
+from provtoolutils.utilities import calculate_data_hash, calculate_file_hash
 
 
 def read_provanddata(options, cid):
@@ -50,27 +60,39 @@ class DirectoryWrapper:
         - An optional config file provides the static provenance information about the agent and the activity.
     """
 
-    def _init_logger():
-        logger = logging.getLogger('DirectoryWrapper')
-        fh = logging.FileHandler('DirectoryWrapper.log')
-        fh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logger.addHandler(fh)
-        logger.setLevel(logging.DEBUG)
+    # Handlers are configured by the applications (see provtoolutils.provtoollogger), not at import time.
+    _logger = logging.getLogger('DirectoryWrapper')
 
-        return logger
-
-    _logger = _init_logger()
-
-    def __init__(self, agentinfo_filepath=None, config_filepath=None):
+    def __init__(self, agentinfo_filepath=None, config_filepath=None, agentinfo_content=None, config_content=None,
+                 blobstore=None, stepcache=None, directory_entities=False):
+        """
+        The agent and config information are either read from the given files or taken directly from the given
+        contents (for example, if they are already available in memory).
+
+        :param blobstore: Optional root directory of a provtoolutils.blobstore.BlobStore. Output data is added to the
+        store and input data is looked up in the store first.
+        :param stepcache: Optional root directory of a provtoolutils.stepcache.StepCache. Outputs of already
+        executed steps are restored from there by run_exec.
+        :param directory_entities: Wrap each subdirectory of the output directory as a single container of type
+        Directory instead of one container per file. See provtoolutils.dataset.
+        """
         self.agentinfo_filepath = agentinfo_filepath
+        self.directory_entities = directory_entities
+        self.blobstore = BlobStore(blobstore) if blobstore is not None else None
+        self.stepcache = StepCache(stepcache) if stepcache is not None else None
 
         if agentinfo_filepath is not None:
             with open(agentinfo_filepath, 'r', encoding='utf-8') as f:
-                self.agentinfo_content = f.read()
+                agentinfo_content = f.read()
+        if agentinfo_content is not None:
+            self.agentinfo_content = agentinfo_content
 
         if config_filepath is not None:
             with open(config_filepath, 'r', encoding='utf-8') as f:
-                self.config_content = f.read()
+                config_content = f.read()
+
+        if config_content is not None:
+            self.config_content = config_content
             try:
                 prov = json.loads(self.config_content)
                 jsonschema.validate(prov, config_schema)
@@ -84,7 +106,7 @@ class DirectoryWrapper:
             config_agent = DirectoryWrapper._parse_agentinfo(self.config_content)
             self.__provagent = config_agent
 
-            if agentinfo_filepath is not None:
+            if agentinfo_content is not None:
                 prov = json.loads(self.agentinfo_content)
                 try:
                     jsonschema.validate(prov, agent_schema)
@@ -93,7 +115,7 @@ class DirectoryWrapper:
                     DirectoryWrapper._logger.error(error)
                     DirectoryWrapper._logger.error(e)
                     raise error
-            if agentinfo_filepath is not None:
+            if agentinfo_content is not None:
                 agent = DirectoryWrapper._parse_agentinfo(self.agentinfo_content)
             else:
                 agent = None
@@ -111,6 +133,15 @@ class DirectoryWrapper:
                 DirectoryWrapper._logger.error(error)
                 raise error
 
+    def _software_versions(self) -> List[str]:
+        versions = []
+        ag = self.__provagent
+        while ag is not None:
+            if isinstance(ag, ActingSoftware):
+                versions.append(f'{ag.label} {ag.version}')
+            ag = ag.acted_on_behalf_of if hasattr(ag, 'acted_on_behalf_of') else None
+        return versions
+
     @staticmethod
     def _parse_agentinfo(agentinfo_content):
         def single_agent(ag):
@@ -143,40 +174,126 @@ class DirectoryWrapper:
         sa = single_agent(config['agent'])
         return sa
 
-    def prov2plain(self, input_dirpath, extract=True) -> Set:
+    @staticmethod
+    def _read_container(pf: str, blobstore: BlobStore = None, verified: bool = False):
+        """
+        Reads and verifies the container **pf**. The data is looked up in the **blobstore** first.
+
+        :param verified: The container was hashed already (see _verify_inputs). Only its data is verified.
+
+        :return: The provenance and either the path of the verified data file next to the container or, if there is
+        no such file, the data as read by the reader plugins.
         """
+        cid = os.path.basename(pf).replace('.prov', '')
+        with open(pf, 'rb') as f:
+            pr = f.read()
+        prov = json.loads(pr.decode(model_encoding))
+        datahash = prov['entity']['self']['provtool:datahash'] if 'self' in prov.get('entity', {}) else None
+        data_filepath = os.path.join(os.path.dirname(pf), datahash) if datahash is not None else None
+        if datahash is not None and blobstore is not None and blobstore.contains(datahash):
+            data_filepath = blobstore.path(datahash)
+
+        if data_filepath is None or not os.path.isfile(data_filepath):
+            options = {'directory': os.path.dirname(pf)}
+            if blobstore is not None:
+                options['blobstore'] = blobstore.root
+            pr, dr, err = read_provanddata(options, cid)
+            if err:
+                raise ValueError('Error reading prov file')
+            return pr, None, dr
+
+        jsonschema.validate(prov, prov_schema)
+        # Hash the data file in chunks. It is not kept in memory, because it is extracted by linking or copying.
+        if (not verified and calculate_data_hash(pr) != cid) or calculate_file_hash(data_filepath) != datahash:
+            raise ValueError('Error reading prov file')
+        return pr, data_filepath, None
+
+    @staticmethod
+    def _verify_directory(pf: str, pr: bytes, blobstore: BlobStore = None, verified: bool = False) -> str:
+        """
+        Verifies the directory container **pf** with its manifest and the files of the directory next to it.
+        See _read_container for **verified**.
         """
-        result_used = set()
+        cid = os.path.basename(pf).replace('.prov', '')
+        prov = json.loads(pr.decode(model_encoding))
+        jsonschema.validate(prov, prov_schema)
+        if not verified and calculate_data_hash(pr) != cid:
+            raise ValueError('Error reading prov file')
+
+        entity = prov['entity']['self']
+        if os.path.basename(entity['prov:label']) != entity['prov:label'] or entity['prov:label'] in ['.', '..']:
+            raise ValueError(f'Error. Label of entity is not sane. Got {entity["prov:label"]}')
+        manifest_filepath = os.path.join(os.path.dirname(pf), entity['provtool:datahash'])
+        if blobstore is not None and blobstore.contains(entity['provtool:datahash']):
+            manifest_filepath = blobstore.path(entity['provtool:datahash'])
+        with open(manifest_filepath, 'rb') as f:
+            entries = dataset.read_manifest(f.read(), entity['provtool:datahash'])
+        dataset.verify_members(entries, os.path.join(os.path.dirname(pf), entity['prov:label']))
+        DirectoryWrapper._logger.info('Verified directory %s with %d files', entity['prov:label'], len(entries))
+        return cid
 
+    @staticmethod
+    def _unpack(pf: str, extract: bool, strategy: str, blobstore: BlobStore = None, verified: bool = False) -> str:
+        DirectoryWrapper._logger.info('Reading provenance file: %s', pf)
+        with open(pf, 'rb') as f:
+            pr = f.read()
+        if json.loads(pr.decode(model_encoding))['entity'].get('self', {}).get('prov:type') == dataset.directory_type:
+            # The files of a directory are not packed into the container. They have to be next to it already.
+            return DirectoryWrapper._verify_directory(pf, pr, blobstore, verified)
+
+        pr, data_filepath, dr = DirectoryWrapper._read_container(pf, blobstore, verified)
+        target_filename = json.loads(pr.decode(model_encoding))['entity']['self']['prov:label']
+        _stf = [x for x in target_filename if x.isalnum() or x in ['.', ' ', '_', '-']]
+        sanitized_target_filename = ''.join(_stf)
+        if target_filename != sanitized_target_filename:
+            raise ValueError(f'Error. Label of entity is not sane. Got {target_filename}, ' +
+                             f'but something like {sanitized_target_filename} is needed')
+        target_filepath = os.path.join(os.path.dirname(pf), target_filename)
+
+        if extract:
+            # Targets are created exclusively. Two containers with the same label fail, even if they are unpacked
+            # concurrently.
+            if os.path.exists(target_filepath):
+                raise FileExistsError(f'Unpacking of {pf} would lead to overwritten ' +
+                                      f'existing file {target_filepath}')
+            if data_filepath is not None:
+                used_strategy = materialize(data_filepath, target_filepath, strategy)
+                DirectoryWrapper._logger.info('Extracted plain file: %s with strategy %s', target_filepath,
+                                              used_strategy)
+            else:
+                with open(target_filepath, 'xb') as target_f:
+                    DirectoryWrapper._logger.info('Writing plain file: %s with length %d', target_filepath, len(dr))
+                    target_f.write(dr)
+
+        # The id was verified against the content while reading.
+        return os.path.basename(pf).replace('.prov', '')
+
+    @staticmethod
+    def _prov_files(input_dirpath: str, warn: bool = False):
         for dirname, dirnames, filenames in os.walk(input_dirpath):
-            prov_files = [os.path.join(dirname, f) for f in filenames]
-            for pf in prov_files:
-                if pf.endswith('.prov'):
-                    DirectoryWrapper._logger.info('Reading provenance file: {}'.format(pf))
-                    pr, dr, err = read_provanddata({'directory': os.path.dirname(pf)},
-                                                   os.path.basename(pf).replace('.prov', ''))
-                    if err:
-                        raise ValueError('Error reading prov file')
-                    target_filename = json.loads(pr.decode(model_encoding))['entity']['self']['prov:label']
-                    _stf = [x for x in target_filename if x.isalnum() or x in ['.', ' ', '_', '-']]
-                    sanitized_target_filename = ''.join(_stf)
-                    if target_filename != sanitized_target_filename:
-                        raise ValueError(f'Error. Label of entity is not sane. Got {target_filename}, ' +
-                                         f'but something like {sanitized_target_filename} is needed')
-                    target_filepath = os.path.join(os.path.dirname(pf), target_filename)
-
-                    result_used.add(calculate_data_hash(pr))
-
-                    if extract:
-                        if os.path.exists(target_filepath):
-                            raise FileExistsError(f'Unpacking of {pf} would lead to overwritten ' +
-                                                  f'existing file {target_filepath}')
-                        with open(target_filepath, 'wb') as target_f:
-                            DirectoryWrapper._logger.info(f'Writing plain file: {target_filepath} ' +
-                                                          f'with length {len(dr)}')
-                            target_f.write(dr)
-                else:
-                    DirectoryWrapper._logger.warning(f'Non provenance file detected in directory {dirname}')
+            for f in filenames:
+                if f.endswith('.prov'):
+                    yield os.path.join(dirname, f)
+                elif warn:
+                    DirectoryWrapper._logger.warning('Non provenance file detected in directory %s', dirname)
+
+    def prov2plain(self, input_dirpath, extract=True, strategy='auto', jobs=default_jobs, verified: Set = None) -> Set:
+        """
+        :param strategy: How the data is extracted from the container. See provtoolutils.materialize. The default
+        avoids copying the data where possible but results in independent files. Use hardlink or symlink only, if
+        the extracted files are never modified in place.
+        :param jobs: Number of containers verified and extracted concurrently. All containers are processed, errors
+        are raised together at the end.
+        :param verified: Ids of containers, which were hashed already (see _verify_inputs). Only their data is
+        verified.
+        """
+        verified = verified if verified is not None else set()
+
+        def unpack(pf):
+            return DirectoryWrapper._unpack(pf, extract, strategy, self.blobstore,
+                                            os.path.basename(pf).replace('.prov', '') in verified)
+
+        result_used = set(run_parallel(unpack, DirectoryWrapper._prov_files(input_dirpath, warn=True), jobs))
 
         if len(result_used) == 0:
             DirectoryWrapper._logger.warn(f'No provenance file detected in input directory {input_dirpath}')
@@ -184,10 +301,20 @@ class DirectoryWrapper:
         return result_used
 
     def plain2prov(self, used: Set, hashes: List, start: datetime, end: datetime, activity_id,
-                   started_by=None):
+                   started_by=None, additional_props: Dict = None, manifests: Dict[str, bytes] = None):
         """
         Converts all non-prov files in a given directory into prov files. The prov files from an
         additional input directory are listed as used entities.
+
+        If a blob store is configured, the data of the plain files is added to it. The plain files are replaced by
+        hardlinks into the store (or reflinks, see BlobStore.deduplicate), so identical outputs occupy space once.
+
+        :param additional_props: Further properties of the activity, for example its resource usage.
+        :param manifests: Manifests (see provtoolutils.dataset) of the directories among **hashes**. A directory
+        container is written for these, with the manifest as data next to it. Manifests are not added to the blob
+        store, because they are named by their Merkle root, not by the hash of their content.
+
+        :return: A dictionary with the path of each plain file as key and the id of the container written for it.
         """
         if started_by is not None:
             placeholder_activity = Activity(None, None, None, None, None)
@@ -196,67 +323,340 @@ class DirectoryWrapper:
             placeholder_activity = None
         provactivity = Activity(start_time=start, end_time=end, location=self.activity['location'],
                                 label=self.activity['label'], means=self.activity['means'], used=used,
-                                started_by=placeholder_activity
+                                started_by=placeholder_activity,
+                                additional_props=additional_props if additional_props is not None else {}
                                 )
         if activity_id is not None:
             provactivity._internal_id = activity_id
 
-        for h in hashes:
-            rawprov = make_provstring(os.path.basename(h.name), Entity.FILE,
-                                      self.__provagent, provactivity,
-                                      h.hash
-                                      )
-            entityid = calculate_data_hash(rawprov)
+        manifests = manifests if manifests is not None else {}
+        written = {}
+        # The containers appear under their final names only once they are completely written. They are persisted
+        # together at the end.
+        with FsyncBatch() as batch:
+            for h in hashes:
+                rawprov = make_provstring(os.path.basename(h.name),
+                                          Entity.DIRECTORY if h.name in manifests else Entity.FILE,
+                                          self.__provagent, provactivity,
+                                          h.hash
+                                          )
+                entityid = calculate_data_hash(rawprov)
+
+                provfilename = '{}.prov'.format(entityid)
 
-            provfilename = '{}.prov'.format(entityid)
+                provfile = os.path.join(os.path.dirname(h.name), provfilename)
 
-            provfile = os.path.join(os.path.dirname(h.name), provfilename)
+                batch.write(provfile, rawprov)
+                DirectoryWrapper._logger.info('Writing provenance file: %s with length %d', provfile, len(rawprov))
+                if h.name in manifests:
+                    batch.write(os.path.join(os.path.dirname(h.name), h.hash), manifests[h.name])
+                written[h.name] = entityid
 
-            with open(provfile, 'wb') as target_f:
-                target_f.write(rawprov)
-                DirectoryWrapper._logger.info(f'Writing provenance file: {provfile} ' +
-                                              f'with length {len(rawprov)}')
+        if self.blobstore is not None:
+            for h in hashes:
+                if h.name not in manifests:
+                    self.blobstore.put(h.name, written[h.name], h.hash)
+                    self.blobstore.deduplicate(h.name, h.hash)
 
-    def run_in(self, input_dirpath: str, start: str, end: str, activity_id: str = None, started_by: str = None):
+        return written
+
+    def run_in(self, input_dirpath: str, start: str, end: str, activity_id: str = None, started_by: str = None,
+               strategy: str = 'auto', jobs: int = default_jobs):
         """
         """
         if input_dirpath is None:
             raise ValueError('Input dir path should not be None')
-        DirectoryWrapper._logger.info('Creating plain files in directory: {}'.format(input_dirpath))
-        self.prov2plain(input_dirpath)
+        DirectoryWrapper._logger.info('Creating plain files in directory: %s', input_dirpath)
+        self.prov2plain(input_dirpath, strategy=strategy, jobs=jobs)
+
+    @staticmethod
+    def _read_manifest(output_dirpath: str) -> Tuple[Dict[str, Dict], List[str]]:
+        """
+        :return: The wrapped files and the names of the files (containers and manifests of directories) written for
+        earlier versions of them.
+        """
+        manifest_filepath = os.path.join(output_dirpath, manifest_filename)
+        if not os.path.exists(manifest_filepath):
+            return {}, []
+        with open(manifest_filepath, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+        return content['files'], content.get('superseded', [])
+
+    @staticmethod
+    def _written_names(files: Dict[str, Dict]) -> Set[str]:
+        """
+        The names of the files written by the wrapper for the manifest entries **files**.
+        """
+        names = {entry['cid'] + '.prov' for entry in files.values()}
+        names.update(entry['hash'] for entry in files.values() if entry.get('directory', False))
+        return names
+
+    @staticmethod
+    def _write_manifest(output_dirpath: str, files: Dict[str, Dict], superseded: List[str]):
+        content = json.dumps({'version': 1, 'files': files, 'superseded': superseded}, ensure_ascii=False,
+                             sort_keys=True, indent=1)
+        write_atomic(os.path.join(output_dirpath, manifest_filename), content.encode('utf-8'))
 
     def run_out(self, input_dirpath: str, output_dirpath: str, start: str, end: str,
-                activity_id: str = None, started_by: str = None):
+                activity_id: str = None, started_by: str = None, incremental: bool = False, jobs: int = default_jobs):
         """
+        :param incremental: Keep a manifest (path, size, mtime, hash, cid) of the wrapped files in the output
+        directory. Files, which did not change since the last run into the same output directory, are neither
+        hashed nor wrapped again. The containers written by previous runs are not treated as output files.
+        :param jobs: Number of files hashed concurrently. All files are processed, errors are raised together at the
+        end.
         """
         if output_dirpath is None:
             raise ValueError('Output dir path should not be None')
-        DirectoryWrapper._logger.info('Creating prov files in directory: {}'.format(output_dirpath))
+        DirectoryWrapper._logger.info('Creating prov files in directory: %s', output_dirpath)
+
+        used = DirectoryWrapper._verify_inputs(input_dirpath, jobs)
+        self._wrap_outputs(used, output_dirpath, dateutil.parser.parse(start), dateutil.parser.parse(end),
+                           activity_id, started_by, incremental, jobs)
+
+    @staticmethod
+    def _verify_inputs(input_dirpath: str, jobs: int) -> Set:
+        def verify(pf):
+            enthash = os.path.basename(pf).replace('.prov', '')
+            realhash = calculate_file_hash(pf)
+            if enthash != realhash:
+                raise ValueError(f'Hash does not match file name for {pf}. Expecting {enthash} ' +
+                                 f'and got {realhash}')
+            return enthash
+
+        if input_dirpath is None:
+            return set()
+        return set(run_parallel(verify, DirectoryWrapper._prov_files(input_dirpath), jobs))
+
+    def _wrap_outputs(self, used: Set, output_dirpath: str, start: datetime, end: datetime, activity_id: str,
+                      started_by: str, incremental: bool, jobs: int, prehashed: Dict[str, Tuple] = None,
+                      additional_props: Dict = None):
+        """
+        :param prehashed: Hashes already known, for example because the files were hashed while being written. The
+        keys are the file paths, the values (size, mtime in ns, hash) tuples. Files with a different size or
+        modification time are hashed again.
+        """
+        prehashed = prehashed if prehashed is not None else {}
+        manifest, superseded = DirectoryWrapper._read_manifest(output_dirpath) if incremental else ({}, [])
+        # The containers and the manifests of directory containers written by earlier runs, also those of earlier
+        # versions of changed files. These are no outputs.
+        written_names = DirectoryWrapper._written_names(manifest) | set(superseded)
+        unchanged = {}
+        stats = {}
+        directories = []
+
+        Hash = namedtuple('Hash', 'name hash')
+
+        def plain_files():
+            for dirname, dirnames, filenames in os.walk(output_dirpath):
+                if self.directory_entities:
+                    # Subdirectories are wrapped as a whole.
+                    directories.extend([os.path.join(dirname, d) for d in sorted(dirnames)])
+                    dirnames[:] = []
+                for pf in [os.path.join(dirname, f) for f in filenames]:
+                    if incremental:
+                        relpath = os.path.relpath(pf, output_dirpath)
+                        if relpath == manifest_filename or os.path.basename(pf) in written_names:
+                            continue
+                    # Stat before reading. A modification during hashing leads to rewrapping next time.
+                    st = os.stat(pf)
+                    stats[pf] = st
+                    if incremental:
+                        entry = manifest.get(relpath)
+                        if (entry is not None and entry.get('size') == st.st_size and
+                                entry.get('mtime') == st.st_mtime_ns and
+                                os.path.exists(os.path.join(dirname, entry['cid'] + '.prov'))):
+                            DirectoryWrapper._logger.debug('Skipping unchanged file: %s', pf)
+                            unchanged[relpath] = entry
+                            continue
+                    yield pf
+
+        def hash_file(pf):
+            known = prehashed.get(pf)
+            if known is not None and known[:2] == (stats[pf].st_size, stats[pf].st_mtime_ns):
+                return Hash(pf, known[2])
+            return Hash(pf, calculate_file_hash(pf))
+
+        hashes = run_parallel(hash_file, plain_files(), jobs)
+
+        manifests = {}
+        for d in directories:
+            entries = dataset.build_manifest(d, jobs, prehashed)
+            root = dataset.merkle_root(entries)
+            DirectoryWrapper._logger.info('Hashed directory %s with %d files', d, len(entries))
+            if incremental:
+                relpath = os.path.relpath(d, output_dirpath)
+                entry = manifest.get(relpath)
+                if (entry is not None and entry.get('hash') == root and
+                        os.path.exists(os.path.join(os.path.dirname(d), entry['cid'] + '.prov'))):
+                    DirectoryWrapper._logger.debug('Skipping unchanged directory: %s', d)
+                    unchanged[relpath] = entry
+                    continue
+            manifests[d] = dataset.manifest_bytes(entries)
+            hashes.append(Hash(d, root))
+
+        written = self.plain2prov(used, hashes, start, end, activity_id, started_by, additional_props, manifests)
+
+        if incremental:
+            for h in hashes:
+                if h.name in manifests:
+                    unchanged[os.path.relpath(h.name, output_dirpath)] = {
+                        'hash': h.hash, 'cid': written[h.name], 'directory': True
+                    }
+                    continue
+                # Deduplicated files were replaced by links into the blob store.
+                st = os.stat(h.name) if self.blobstore is not None else stats[h.name]
+                unchanged[os.path.relpath(h.name, output_dirpath)] = {
+                    'size': st.st_size, 'mtime': st.st_mtime_ns, 'hash': h.hash,
+                    'cid': written[h.name]
+                }
+            DirectoryWrapper._write_manifest(output_dirpath, unchanged,
+                                             sorted(written_names - DirectoryWrapper._written_names(unchanged)))
+
+    def run_exec(self, input_dirpath: str, output_dirpath: str, command: List[str], activity_id: str = None,
+                 started_by: str = None, incremental: bool = False, strategy: str = 'auto',
+                 jobs: int = default_jobs) -> int:
+        """
+        Combines run_in, the execution of **command** and run_out in a single call. The start and end times of
+        the activity are taken right before starting and after the exit of the command.
+
+        Output files are hashed while the command is still running, as soon as they are closed after writing
+        (only where inotify is available). All remaining files are hashed after the command exits. The outputs are
+        wrapped regardless of the exit code of the command. The resource usage of the command (see
+        provtoolutils.resources) is recorded in the activity.
+
+        With a step cache, the outputs of a step executed before with the same inputs, configuration and command
+        are restored instead. Outputs of successful executions are added to the cache.
+
+        :return: The exit code of the command.
+        """
+        if output_dirpath is None:
+            raise ValueError('Output dir path should not be None')
+        if command is None or len(command) == 0:
+            raise ValueError('No command given')
+
+        key = None
+        verified = set()
+        if self.stepcache is not None:
+            normalized = StepCache.normalize_command(command, {'{inputdir}': input_dirpath,
+                                                               '{outputdir}': output_dirpath})
+            # The inputs are hashed once. On a miss, only their data is verified while unpacking.
+            verified = DirectoryWrapper._verify_inputs(input_dirpath, jobs)
+            key = StepCache.key(verified, self.activity, self._software_versions(), normalized)
+            if self.stepcache.contains(key):
+                os.makedirs(output_dirpath, exist_ok=True)
+                restored = self.stepcache.restore(key, output_dirpath, strategy)
+                DirectoryWrapper._logger.info('Restored %d files of step %s from cache', len(restored), key)
+                return 0
 
         used = set()
         if input_dirpath is not None:
-            for dirname, dirnames, filenames in os.walk(input_dirpath):
-                prov_files = [os.path.join(dirname, f) for f in filenames]
-                for pf in prov_files:
-                    if pf.endswith('.prov'):
-                        with open(pf, 'rb') as f:
-                            enthash = os.path.basename(pf).replace('.prov', '')
-                            realhash = calculate_data_hash(f.read())
-                            if enthash != realhash:
-                                raise ValueError(f'Hash does not match file name for {pf}. Expecting {enthash} ' +
-                                                 f'and got {realhash}')
-                            used.add(enthash)
-        hashes = []
-        Hash = namedtuple('Hash', 'name hash')
-        for dirname, dirnames, filenames in os.walk(output_dirpath):
-            plain_files = [os.path.join(dirname, f) for f in filenames]
-            for pf in plain_files:
-                with open(pf, 'rb') as output_file:
-                    datab = output_file.read()
-                    hashes.append(Hash(pf, calculate_data_hash(datab)))
+            DirectoryWrapper._logger.info('Creating plain files in directory: %s', input_dirpath)
+            used = self.prov2plain(input_dirpath, strategy=strategy, jobs=jobs, verified=verified)
+        os.makedirs(output_dirpath, exist_ok=True)
+
+        hasher = _ClosedFileHasher(output_dirpath, jobs).start()
+
+        DirectoryWrapper._logger.info('Executing: %s', command)
+        start = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            returncode, usage = resources.run(command)
+        finally:
+            end = datetime.datetime.now(datetime.timezone.utc)
+            prehashed = hasher.stop()
+        DirectoryWrapper._logger.info('Command exited with %d', returncode)
+
+        DirectoryWrapper._logger.info('Creating prov files in directory: %s', output_dirpath)
+        self._wrap_outputs(used, output_dirpath, start, end, activity_id, started_by, incremental, jobs, prehashed,
+                           usage)
 
-        self.plain2prov(used, hashes, dateutil.parser.parse(start),
-                        dateutil.parser.parse(end), activity_id, started_by)
+        if key is not None and returncode == 0 and self.stepcache.store(key, output_dirpath):
+            DirectoryWrapper._logger.info('Added outputs of step %s to cache', key)
+
+        return returncode
+
+    def run_watch(self, input_dirpath: str, output_dirpath: str, stop: threading.Event, activity_id: str = None,
+                  started_by: str = None, incremental: bool = False, start: datetime.datetime = None,
+                  jobs: int = default_jobs):
+        """
+        Watches **output_dirpath** while a tool, which was started independently, writes into it. Each file is
+        hashed as soon as it is closed after writing (only where inotify is available). Once **stop** is set, the
+        activity ends and the outputs are wrapped. Only files, which were not hashed during the run or changed
+        afterwards, are hashed then.
+
+        The containers are written at the end, because each of them contains the end time of the activity and
+        therefore its id is not known before.
+
+        :param start: The start time of the activity. Defaults to the time of the call.
+        """
+        if output_dirpath is None:
+            raise ValueError('Output dir path should not be None')
+        if start is None:
+            start = datetime.datetime.now(datetime.timezone.utc)
+
+        os.makedirs(output_dirpath, exist_ok=True)
+        hasher = _ClosedFileHasher(output_dirpath, jobs).start()
+        try:
+            DirectoryWrapper._logger.info('Watching directory: %s', output_dirpath)
+            used = DirectoryWrapper._verify_inputs(input_dirpath, jobs)
+            # Wait in steps. Signal handlers of the main thread are not run during an unbounded wait on older Python
+            # versions.
+            while not stop.wait(0.5):
+                pass
+        finally:
+            end = datetime.datetime.now(datetime.timezone.utc)
+            prehashed = hasher.stop()
+        DirectoryWrapper._logger.info('Hashed %d files while watching', len(prehashed))
+
+        DirectoryWrapper._logger.info('Creating prov files in directory: %s', output_dirpath)
+        self._wrap_outputs(used, output_dirpath, start, end, activity_id, started_by, incremental, jobs, prehashed)
+
+
+class _ClosedFileHasher:
+    """
+    Hashes the files of a directory tree in a pool of threads as soon as they are closed after writing (see
+    provtoolutils.watch). Without inotify nothing is hashed in advance.
+    """
+
+    def __init__(self, directory: str, jobs: int):
+        self.directory = directory
+        self.jobs = jobs
+        # Path: (size, mtime in ns, hash). See DirectoryWrapper._wrap_outputs.
+        self.prehashed: Dict[str, Tuple] = {}
+        self._closed: queue.Queue = queue.Queue()
+        self._watcher = None
+        self._thread = threading.Thread(target=run_parallel, args=(self._hash, self._closed_files(), jobs),
+                                        daemon=True)
+
+    def _hash(self, pf: str):
+        try:
+            st = os.stat(pf)
+            self.prehashed[pf] = (st.st_size, st.st_mtime_ns, calculate_file_hash(pf))
+        # The file may be removed or replaced meanwhile. It is handled, when the outputs are wrapped.
+        except OSError as e:
+            DirectoryWrapper._logger.debug('Hashing %s in advance failed: %s', pf, e)
+
+    def _closed_files(self):
+        pf = self._closed.get()
+        while pf is not None:
+            yield pf
+            pf = self._closed.get()
+
+    def start(self) -> '_ClosedFileHasher':
+        if watch.available():
+            self._watcher = watch.DirectoryWatcher(self.directory, self._closed.put).start()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Tuple]:
+        """
+        Stops watching, waits for the pending files and returns the hashes.
+        """
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._closed.put(None)
+        self._thread.join()
+        return self.prehashed
 
 
 def create_activity_id():
@@ -273,11 +673,14 @@ def main():
     python -m provtoolutils.directorywrapper --configfile config.json --agentinfo agent.json \
            --inputdir /home/testuser/test --outputdir /home/testuser/test \
            --start YYYY-MM-DDThh:mm:ss --end YYYY-MM-DDThh:mm:ss
+    python -m provtoolutils.directorywrapper exec --configfile config.json --agentinfo agent.json \
+           --inputdir /home/testuser/input --outputdir /home/testuser/output -- tool --some-option
+    python -m provtoolutils.directorywrapper watch --configfile config.json --agentinfo agent.json \
+           --inputdir /home/testuser/input --outputdir /home/testuser/output
     """
-    parser = argparse.ArgumentParser('Provenance directory wrapper', usage=usage_message,
-                                     formatter_class=argparse.RawTextHelpFormatter
-                                     )
-    parser.add_argument('--configfile', help=textwrap.dedent(
+    # The options are shared between the plain call and the exec mode.
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--configfile', help=textwrap.dedent(
         '''
             Static information about the used activity and agents.
 
@@ -305,7 +708,7 @@ def main():
             }
         '''
     ))
-    parser.add_argument('--agentinfo', help=textwrap.dedent(
+    options.add_argument('--agentinfo', help=textwrap.dedent(
         '''
             Optional additional file with information about agents in json.
 
@@ -333,45 +736,139 @@ def main():
             }
         '''
     ))
-    parser.add_argument('--createactivityid', action='store_true', help=textwrap.dedent(
+    options.add_argument('--createactivityid', action='store_true', help=textwrap.dedent(
         '''
             Start the programm in activity id generation mode. There will be no prov file generation
             or unpacking. It will generate an id, which can be later on be used for --started_by
             or --activity_id.
         '''
     ))
-    parser.add_argument('--startedby', help=textwrap.dedent(
+    options.add_argument('--startedby', help=textwrap.dedent(
         '''
             Activity id of an overall workflow which started the process for which the files are currently used.
         '''
     ))
-    parser.add_argument('--activityid', help=textwrap.dedent(
+    options.add_argument('--activityid', help=textwrap.dedent(
         '''
             Activity id to use.
         '''
     ))
-    parser.add_argument('--inputdir')
-    parser.add_argument('--outputdir')
-    parser.add_argument('--start')
-    parser.add_argument('--end')
+    options.add_argument('--incremental', action='store_true', help=textwrap.dedent(
+        '''
+            Keep a manifest of the wrapped files in the output directory. Files, which did not change since the
+            last run into the same output directory, are not wrapped again.
+        '''
+    ))
+    options.add_argument('--extractstrategy', default='auto', choices=['auto'] + list(strategies.keys()),
+                         help=textwrap.dedent(
+        '''
+            How the data is extracted from the containers in the input directory. By default, a reflink or an in
+            kernel copy is tried before falling back to a plain copy. hardlink and symlink avoid copying, but the
+            extracted files share the data with the container and must not be modified in place.
+        '''
+    ))
+    options.add_argument('--jobs', type=int, default=default_jobs, help=textwrap.dedent(
+        f'''
+            Number of files verified, extracted or hashed concurrently (default: {default_jobs}).
+        '''
+    ))
+    options.add_argument('--blobstore', default=os.environ.get(blobstore_env), help=textwrap.dedent(
+        f'''
+            Root directory of a shared content addressed blob store. The data of the output files is stored there
+            once, regardless of how many containers reference it. Input data is looked up there first. Defaults to
+            the value of the environment variable {blobstore_env}.
+        '''
+    ))
+    options.add_argument('--stepcache', help=textwrap.dedent(
+        f'''
+            Only for exec. Root directory of a (shared) cache of executed steps. If a step with the same used
+            containers, configuration and command was executed before, its outputs are restored instead of running
+            the command again. Defaults to the value of the environment variable {stepcache_env}.
+        '''
+    ))
+    options.add_argument('--directories', action='store_true', help=textwrap.dedent(
+        '''
+            Wrap each subdirectory of the output directory as one container of type Directory. Its data is a
+            manifest of the files below the subdirectory (path, size, hash), which is written next to the container.
+            Files directly in the output directory are wrapped one by one.
+        '''
+    ))
+    options.add_argument('--inputdir')
+    options.add_argument('--outputdir')
+    options.add_argument('--start')
+    options.add_argument('--end')
+
+    parser = argparse.ArgumentParser('Provenance directory wrapper', usage=usage_message,
+                                     formatter_class=argparse.RawTextHelpFormatter, parents=[options]
+                                     )
+    subparsers = parser.add_subparsers(dest='mode', metavar='{exec,watch}')
+    exec_parser = subparsers.add_parser('exec', parents=[options], formatter_class=argparse.RawTextHelpFormatter,
+                                        help=textwrap.dedent(
+        '''
+            Unpack the input directory, run the given command and wrap the output directory in one call. The start
+            and end times are taken from the execution of the command. The options must follow exec, the command
+            follows after --. The exit code is the one of the command.
+        '''
+    ))
+    exec_parser.add_argument('command', nargs=argparse.REMAINDER)
+    watch_parser = subparsers.add_parser('watch', parents=[options], formatter_class=argparse.RawTextHelpFormatter,
+                                         help=textwrap.dedent(
+        '''
+            Watch the output directory while a tool, which is started independently, writes into it. Files are
+            hashed as soon as they are closed. On SIGTERM or SIGINT the activity ends and
+            the output directory is wrapped. The start time is the time of the call, unless --start is given.
+        '''
+    ))
 
     args = parser.parse_args()
+    provtoollogger.configure(default_sinks=['file:DirectoryWrapper.log'], default_level='INFO')
 
     if args.createactivityid:
         print(create_activity_id())
         return
 
+    if args.mode == 'exec':
+        command = args.command[1:] if len(args.command) > 0 and args.command[0] == '--' else args.command
+        if args.outputdir is None or args.configfile is None or len(command) == 0:
+            exec_parser.print_help()
+            sys.exit(1)
+        stepcache = args.stepcache if args.stepcache is not None else os.environ.get(stepcache_env)
+        pw = DirectoryWrapper(args.agentinfo, args.configfile, blobstore=args.blobstore, stepcache=stepcache,
+                              directory_entities=args.directories)
+        returncode = pw.run_exec(args.inputdir, args.outputdir, command, args.activityid, args.startedby,
+                                 args.incremental, args.extractstrategy, args.jobs)
+        # Killed by a signal. Use the exit code of the shells.
+        sys.exit(returncode if returncode >= 0 else 128 - returncode)
+
+    if args.stepcache is not None:
+        # The environment variable is ignored outside of exec. Shared settings for all calls stay possible that way.
+        parser.error('--stepcache is only supported with exec')
+
+    if args.mode == 'watch':
+        if args.outputdir is None or args.configfile is None:
+            watch_parser.print_help()
+            sys.exit(1)
+        pw = DirectoryWrapper(args.agentinfo, args.configfile, blobstore=args.blobstore,
+                              directory_entities=args.directories)
+        stop = threading.Event()
+        for signum in [signal.SIGTERM, signal.SIGINT]:
+            signal.signal(signum, lambda signum, frame: stop.set())
+        pw.run_watch(args.inputdir, args.outputdir, stop, args.activityid, args.startedby, args.incremental,
+                     dateutil.parser.parse(args.start) if args.start is not None else None, args.jobs)
+        return
+
     if args.inputdir is not None and args.outputdir is None:
-        pw = DirectoryWrapper(None, args.configfile)
-        pw.run_in(args.inputdir, args.start, args.end)
+        pw = DirectoryWrapper(None, args.configfile, blobstore=args.blobstore)
+        pw.run_in(args.inputdir, args.start, args.end, strategy=args.extractstrategy, jobs=args.jobs)
         return
 
     if (args.outputdir is not None and args.start is not None and
             args.end is not None and args.configfile is not None):
-        pw = DirectoryWrapper(args.agentinfo, args.configfile)
+        pw = DirectoryWrapper(args.agentinfo, args.configfile, blobstore=args.blobstore,
+                              directory_entities=args.directories)
         pw.run_out(args.inputdir, args.outputdir, args.start, args.end,
                    args.activityid if 'activityid' in args else None,
-                   args.startedby if 'startedby' in args else None)
+                   args.startedby if 'startedby' in args else None, args.incremental, args.jobs)
         return
 
     parser.print_help()
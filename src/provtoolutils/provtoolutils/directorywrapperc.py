@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import textwrap
+
+# This module is meant to be started once per workflow step. Therefore, it only depends on the standard library.
+# Everything expensive (parsing, schema validation, hashing) is done in provtoolutils.directorywrapperd.
+
+
+def default_socket_path():
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.environ.get('PROVTOOLSOCKET',
+                          os.path.join(tempfile.gettempdir(), f'provtool_directorywrapper_{uid}.sock'))
+
+
+def send_request(socket_path: str, request: dict) -> dict:
+    """
+    Sends a single request to the directory wrapper daemon and returns its response. Request and response are
+    json objects, each on a single line.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with s.makefile('rb') as f:
+            return json.loads(f.readline().decode('utf-8'))
+
+
+def _abspath(path):
+    return None if path is None else os.path.abspath(path)
+
+
+def main():
+    usage_message = """
+    %(prog)s [options]
+
+    Client for the directory wrapper daemon. The options are the same as for provtoolutils.directorywrapper.
+
+    Example:
+
+    python -m provtoolutils.directorywrapperc --inputdir /home/testuser/test
+    python -m provtoolutils.directorywrapperc --configfile config.json --agentinfo agent.json \
+           --inputdir /home/testuser/test --outputdir /home/testuser/test \
+           --start YYYY-MM-DDThh:mm:ss --end YYYY-MM-DDThh:mm:ss
+    """
+    parser = argparse.ArgumentParser('Provenance directory wrapper client', usage=usage_message,
+                                     formatter_class=argparse.RawTextHelpFormatter
+                                     )
+    parser.add_argument('--socket', default=default_socket_path(), help=textwrap.dedent(
+        '''
+            The UNIX socket of the directory wrapper daemon. Defaults to the value of the environment variable
+            PROVTOOLSOCKET or a per user socket in the temporary directory.
+        '''
+    ))
+    parser.add_argument('--configfile', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--agentinfo', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--createactivityid', action='store_true', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--startedby', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--activityid', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--incremental', action='store_true', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--extractstrategy', default='auto', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--directories', action='store_true', help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--jobs', type=int, help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--blobstore', default=os.environ.get('PROVTOOLBLOBSTORE'),
+                        help='See provtoolutils.directorywrapper.')
+    parser.add_argument('--inputdir')
+    parser.add_argument('--outputdir')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+
+    args = parser.parse_args()
+
+    if args.createactivityid:
+        request = {'command': 'createactivityid'}
+    elif args.inputdir is not None and args.outputdir is None:
+        request = {'command': 'run_in', 'configfile': _abspath(args.configfile), 'inputdir': _abspath(args.inputdir),
+                   'start': args.start, 'end': args.end, 'extractstrategy': args.extractstrategy}
+    elif (args.outputdir is not None and args.start is not None and
+            args.end is not None and args.configfile is not None):
+        request = {'command': 'run_out', 'configfile': _abspath(args.configfile),
+                   'agentinfo': _abspath(args.agentinfo), 'inputdir': _abspath(args.inputdir),
+                   'outputdir': _abspath(args.outputdir), 'start': args.start, 'end': args.end,
+                   'activityid': args.activityid, 'startedby': args.startedby, 'incremental': args.incremental,
+                   'directories': args.directories}
+    else:
+        parser.print_help()
+        sys.exit(1)
+    if args.jobs is not None:
+        request['jobs'] = args.jobs
+    if args.blobstore is not None and request['command'] != 'createactivityid':
+        request['blobstore'] = _abspath(args.blobstore)
+
+    try:
+        response = send_request(args.socket, request)
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f'No directory wrapper daemon is listening on {args.socket}. Start it with '
+              f'python -m provtoolutils.directorywrapperd --socket {args.socket}', file=sys.stderr)
+        sys.exit(1)
+    if response['status'] != 'ok':
+        print(response.get('message', 'Unknown error'), file=sys.stderr)
+        sys.exit(1)
+    if 'result' in response:
+        print(response['result'])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
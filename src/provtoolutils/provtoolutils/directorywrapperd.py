@@ -0,0 +1,161 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import sys
+import textwrap
+import threading
+
+from collections import OrderedDict
+
+from provtoolutils import provtoollogger
+from provtoolutils.constants import default_jobs, model_encoding
+from provtoolutils.directorywrapper import create_activity_id, DirectoryWrapper
+from provtoolutils.directorywrapperc import default_socket_path
+from provtoolutils.utilities import calculate_data_hash
+
+
+def _remove_stale_socket(socket_path: str):
+    """
+    Removes the socket left over by a daemon, which did not shut down cleanly.
+
+    :raises RuntimeError: If a daemon is listening on the socket or the path is not a socket.
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f'{socket_path} exists and is not a socket')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise RuntimeError(f'Another daemon is listening on {socket_path}')
+
+
+class DirectoryWrapperDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A long running directory wrapper, which accepts run_in/run_out requests on a UNIX socket (see
+    provtoolutils.directorywrapperc for the client).
+
+    Each request is handled in its own thread. The parsed and validated config and agent information is cached
+    keyed by the hash of the file contents, so that repeated calls with the same files skip parsing and schema
+    validation.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, cache_size: int = 128):
+        self.logger = logging.getLogger('DirectoryWrapper')
+        self._cache: 'OrderedDict[str, DirectoryWrapper]' = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
+        _remove_stale_socket(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def wrapper(self, agentinfo_filepath: str = None, config_filepath: str = None,
+                blobstore: str = None, directory_entities: bool = False) -> DirectoryWrapper:
+        contents = []
+        for filepath in [agentinfo_filepath, config_filepath]:
+            if filepath is None:
+                contents.append(None)
+            else:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    contents.append(f.read())
+
+        key = calculate_data_hash(json.dumps(contents + [blobstore, directory_entities]).encode(model_encoding))
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        # Parsing happens outside of the lock. In the worst case, the same content is parsed twice concurrently.
+        dw = DirectoryWrapper(agentinfo_content=contents[0], config_content=contents[1], blobstore=blobstore,
+                              directory_entities=directory_entities)
+        with self._cache_lock:
+            self._cache[key] = dw
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return dw
+
+    def handle_request_object(self, request: dict) -> dict:
+        command = request.get('command')
+        if command == 'createactivityid':
+            return {'status': 'ok', 'result': create_activity_id()}
+        if command == 'run_in':
+            self.wrapper(None, request.get('configfile'), request.get('blobstore')).run_in(
+                request['inputdir'], request.get('start'), request.get('end'),
+                strategy=request.get('extractstrategy', 'auto'), jobs=request.get('jobs', default_jobs))
+            return {'status': 'ok'}
+        if command == 'run_out':
+            self.wrapper(request.get('agentinfo'), request['configfile'], request.get('blobstore'),
+                         request.get('directories', False)).run_out(
+                request.get('inputdir'), request['outputdir'], request['start'], request['end'],
+                request.get('activityid'), request.get('startedby'), request.get('incremental', False),
+                request.get('jobs', default_jobs))
+            return {'status': 'ok'}
+        raise ValueError(f'Unknown command: {command}')
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if len(line) == 0:
+            # Connection closed without request. Other daemons check this way, whether the socket is in use.
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+            response = self.server.handle_request_object(request)
+        # Any error is reported back to the client, which is responsible for the exit code of the workflow step.
+        except Exception as e:
+            self.server.logger.error(e)
+            response = {'status': 'error', 'message': f'{type(e).__name__}: {e}'}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+def main():
+    usage_message = """
+    %(prog)s [options]
+
+    Example:
+
+    python -m provtoolutils.directorywrapperd --socket /tmp/provtool.sock
+    """
+    parser = argparse.ArgumentParser('Provenance directory wrapper daemon', usage=usage_message,
+                                     formatter_class=argparse.RawTextHelpFormatter
+                                     )
+    parser.add_argument('--socket', default=default_socket_path(), help=textwrap.dedent(
+        '''
+            The UNIX socket to listen on. Defaults to the value of the environment variable PROVTOOLSOCKET or a
+            per user socket in the temporary directory.
+        '''
+    ))
+
+    args = parser.parse_args()
+    provtoollogger.configure(default_sinks=['file:DirectoryWrapper.log'], default_level='INFO')
+
+    try:
+        server = DirectoryWrapperDaemon(args.socket)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,122 @@
+import errno
+import os
+import shutil
+
+from typing import List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# ioctl request for cloning a whole file on copy on write file systems (btrfs, xfs, ...). See: man ioctl_ficlone
+FICLONE = 0x40049409
+
+
+def _create_exclusive(dst: str) -> int:
+    # Never overwrite existing files. Concurrent extractions to the same target fail instead of interleaving.
+    return os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+
+
+def _with_target(dst: str, fill):
+    fd = _create_exclusive(dst)
+    try:
+        fill(fd)
+    except BaseException:
+        os.close(fd)
+        os.remove(dst)
+        raise
+    os.close(fd)
+
+
+def hardlink(src: str, dst: str):
+    """
+    Shares the inode of **src**. Modifications of **dst** in place will modify **src** as well.
+    """
+    os.link(src, dst)
+
+
+def symlink(src: str, dst: str):
+    """
+    Creates a symbolic link to the absolute path of **src**. Modifications of **dst** in place will modify **src** as
+    well.
+    """
+    os.symlink(os.path.abspath(src), dst)
+
+
+def reflink(src: str, dst: str):
+    """
+    Clones **src** on file systems supporting copy on write. No data is copied until one of the files is modified.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform')
+
+    with open(src, 'rb') as s:
+        _with_target(dst, lambda fd: fcntl.ioctl(fd, FICLONE, s.fileno()))
+
+
+def copy_range(src: str, dst: str):
+    """
+    Copies **src** within the kernel by using copy_file_range. Depending on the file system, this may be a server
+    side copy or a reflink.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.EOPNOTSUPP, 'copy_file_range is not supported on this platform')
+
+    def _fill(fd):
+        with open(src, 'rb') as s:
+            remaining = os.fstat(s.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(s.fileno(), fd, remaining)
+                if copied == 0:
+                    raise OSError(errno.EIO, f'Unexpected end of file while copying {src}')
+                remaining = remaining - copied
+
+    _with_target(dst, _fill)
+
+
+def copy(src: str, dst: str):
+    """
+    Plain copy in user space.
+    """
+    def _fill(fd):
+        with open(src, 'rb') as s, os.fdopen(os.dup(fd), 'wb') as d:
+            shutil.copyfileobj(s, d)
+
+    _with_target(dst, _fill)
+
+
+strategies = {
+    'hardlink': hardlink,
+    'reflink': reflink,
+    'copy_file_range': copy_range,
+    'symlink': symlink,
+    'copy': copy
+}
+
+# Strategies tried after the requested one (or without a requested strategy). All of them result in an independent
+# file, so modifications of the target never change the source.
+fallback = ['reflink', 'copy_file_range', 'copy']
+
+
+def materialize(src: str, dst: str, strategy: str = 'auto') -> str:
+    """
+    Makes the content of **src** available as **dst** without copying the data if possible.
+
+    :param strategy: One of the keys of strategies or 'auto'. If the strategy is not supported for the given files
+    (for example hardlinks across devices), the strategies in fallback are tried in order.
+    :return: The strategy, which was used finally.
+    """
+    if strategy != 'auto' and strategy not in strategies:
+        raise ValueError(f'Unknown strategy {strategy}. Expecting one of auto, {", ".join(strategies.keys())}')
+
+    order: List[str] = ([] if strategy == 'auto' else [strategy]) + [s for s in fallback if s != strategy]
+    for i, s in enumerate(order):
+        try:
+            strategies[s](src, dst)
+            return s
+        except FileExistsError:
+            raise
+        except OSError:
+            if i == len(order) - 1:
+                raise
@@ -28,8 +28,15 @@ if 'PROVTOOLLOGLEVEL' in os.environ:
                     )
 
 
+# Namespace for the resource usage of activities (see provtoolutils.resources).
+resources_prefix = 'resources'
+resources_namespace = 'http://dlr.de/provtool/resources#'
+
+
 class Entity(Enum):
     FILE = 1
+    # The data of a directory entity is a manifest of its files. See provtoolutils.dataset.
+    DIRECTORY = 2
 
 
 class ProvIdentifiableObject:
@@ -71,10 +78,11 @@ class ProvIdentifiableObject:
                         result = result + json.dumps(av, ensure_ascii=False, sort_keys=True)
                     else:
                         raise ValueError('Unknown type in id calculation: {}'.format(type(attr_value)))
-            logger.debug('Using the following information for hash calculation with encoding %s: %s',
-                         model_encoding,
-                         result
-                         )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('Using the following information for hash calculation with encoding %s: %s',
+                             model_encoding,
+                             result
+                             )
             return calculate_data_hash(result.encode(model_encoding))
 
 
@@ -97,9 +105,13 @@ def make_provstring(entityname: str, entitytype: Entity,
     document.add_namespace('person', 'http://schema.org/Person')
     document.add_namespace('creative', 'http://schema.org/CreativeWork')
     document.add_namespace('software', 'http://schema.org/SoftwareApplication')
+    # Only declared if used. Otherwise, the ids of all containers without resource usage would change.
+    if any([k.startswith(resources_prefix + ':') for k in activity.additional_props.keys()]):
+        document.add_namespace(resources_prefix, resources_namespace)
 
     prov_types = {
-        Entity.FILE: 'File'
+        Entity.FILE: 'File',
+        Entity.DIRECTORY: 'Directory'
     }
     # Use a lookup in the dictionary without get to provoke error in case on not defined type.
     prov_entity_properties = [
@@ -0,0 +1,67 @@
+import queue
+import threading
+
+from typing import Callable, Iterable, List
+
+from provtoolutils.constants import default_jobs
+
+_done = object()
+
+
+def run_parallel(func: Callable, items: Iterable, jobs: int = default_jobs) -> List:
+    """
+    Calls **func** for each of the **items** in a pool of **jobs** threads. This is meant for I/O bound work like
+    reading and hashing files. hashlib releases the GIL for larger buffers, so hashing scales with the threads as
+    well.
+
+    The items are handed to the threads by a bounded queue. Therefore, a lazy iterable (like the files found by
+    os.walk) is not consumed faster than the items are processed.
+
+    Errors do not stop the processing of the remaining items. They are collected and raised together at the end.
+
+    :return: The results of **func** in the order of the **items**.
+    """
+    if jobs < 1:
+        raise ValueError(f'Expecting at least one job, got {jobs}')
+
+    tasks: queue.Queue = queue.Queue(maxsize=2 * jobs)
+    results = {}
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            task = tasks.get()
+            if task is _done:
+                return
+            i, item = task
+            try:
+                result = func(item)
+                with lock:
+                    results[i] = result
+            # Any error is reported in the aggregated error below.
+            except Exception as e:
+                with lock:
+                    errors.append((i, item, e))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(jobs)]
+    for t in threads:
+        t.start()
+
+    count = 0
+    try:
+        for item in items:
+            tasks.put((count, item))
+            count = count + 1
+    finally:
+        for _ in threads:
+            tasks.put(_done)
+        for t in threads:
+            t.join()
+
+    if len(errors) > 0:
+        errors.sort(key=lambda e: e[0])
+        message = '\n'.join([f'{item}: {type(e).__name__}: {e}' for _, item, e in errors])
+        raise ValueError(f'{len(errors)} of {count} items failed:\n{message}') from errors[0][2]
+
+    return [results[i] for i in range(count)]
@@ -0,0 +1,268 @@
+import json
+import sys
+
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from provtoolutils.constants import model_encoding
+
+
+class ProvGraph:
+    """
+    A compact in-memory representation of a provenance graph assembled from many provenance containers.
+
+    Every id (container ids, activity ids, agent ids) is interned to a consecutive integer. Ids, which look like
+    sha256 hex digests are stored as 32 raw bytes instead of 64 characters. The relations used, wasGeneratedBy,
+    wasAssociatedWith and wasStartedBy are kept as pairs of integer arrays. For queries they are converted lazily
+    into compressed adjacency lists (offsets and targets, both arrays as well). Attributes of the nodes are stored
+    column wise, which means there is one list per attribute instead of one dictionary per node.
+
+    The node kinds are given by the class constants ENTITY, ACTIVITY and AGENT.
+    """
+
+    ENTITY = 0
+    ACTIVITY = 1
+    AGENT = 2
+
+    RELATIONS = ('used', 'wasGeneratedBy', 'wasAssociatedWith', 'wasStartedBy')
+    COLUMNS = ('label', 'datahash', 'type', 'start_time', 'end_time', 'location')
+
+    def __init__(self):
+        self._ids: Dict[Union[bytes, str], int] = {}
+        self._names: List[Union[bytes, str]] = []
+        self._kinds = array('b')
+        # Marks entities, for which the container was actually read (in contrast to entities only known from used).
+        self._loaded = array('b')
+        self._columns: Dict[str, List[Optional[str]]] = {c: [] for c in ProvGraph.COLUMNS}
+        self._edges: Dict[str, Tuple[array, array]] = {r: (array('l'), array('l')) for r in ProvGraph.RELATIONS}
+        self._index: Dict[Tuple[str, bool], Tuple[array, array]] = {}
+
+    @staticmethod
+    def _key(name: str) -> Union[bytes, str]:
+        if len(name) == 64:
+            try:
+                return bytes.fromhex(name)
+            except ValueError:
+                pass
+        return sys.intern(name)
+
+    @staticmethod
+    def _unkey(key: Union[bytes, str]) -> str:
+        return key.hex() if isinstance(key, bytes) else key
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name: str):
+        return ProvGraph._key(name) in self._ids
+
+    def intern(self, name: str, kind: int) -> int:
+        """
+        Returns the integer id of **name**. Unknown names are added as new node of the given kind.
+        """
+        key = ProvGraph._key(name)
+        node = self._ids.get(key)
+        if node is not None:
+            return node
+
+        node = len(self._names)
+        self._ids[key] = node
+        self._names.append(key)
+        self._kinds.append(kind)
+        self._loaded.append(0)
+        for column in self._columns.values():
+            column.append(None)
+        return node
+
+    def index(self, name: str) -> Optional[int]:
+        return self._ids.get(ProvGraph._key(name))
+
+    def name(self, node: int) -> str:
+        return ProvGraph._unkey(self._names[node])
+
+    def kind(self, node: int) -> int:
+        return self._kinds[node]
+
+    def loaded(self, node: int) -> bool:
+        return bool(self._loaded[node])
+
+    def get(self, node: int, column: str) -> Optional[str]:
+        return self._columns[column][node]
+
+    def set(self, node: int, column: str, value: Optional[str]):
+        # Labels, types and locations repeat a lot over a lineage. Interning shares the string objects.
+        self._columns[column][node] = sys.intern(value) if isinstance(value, str) else value
+
+    def nodes(self, kind: int = None) -> Iterator[int]:
+        return (n for n in range(len(self._names)) if kind is None or self._kinds[n] == kind)
+
+    def add_edge(self, relation: str, source: int, target: int):
+        sources, targets = self._edges[relation]
+        sources.append(source)
+        targets.append(target)
+        self._index.clear()
+
+    def edges(self, relation: str) -> Iterator[Tuple[int, int]]:
+        sources, targets = self._edges[relation]
+        return zip(sources, targets)
+
+    def _adjacency(self, relation: str, reverse: bool) -> Tuple[array, array]:
+        """
+        Builds (and caches) an adjacency list in compressed sparse row layout for the given relation.
+        """
+        if (relation, reverse) in self._index:
+            return self._index[relation, reverse]
+
+        sources, targets = self._edges[relation]
+        if reverse:
+            sources, targets = targets, sources
+
+        offsets = array('l', [0]) * (len(self._names) + 1)
+        for s in sources:
+            offsets[s + 1] += 1
+        for i in range(len(self._names)):
+            offsets[i + 1] += offsets[i]
+
+        fill = array('l', offsets)
+        adjacent = array('l', [0]) * len(targets)
+        for s, t in zip(sources, targets):
+            adjacent[fill[s]] = t
+            fill[s] += 1
+
+        self._index[relation, reverse] = (offsets, adjacent)
+        return offsets, adjacent
+
+    def neighbours(self, relation: str, node: int, reverse: bool = False) -> array:
+        """
+        Returns the targets of all edges of type **relation** starting at **node**. With **reverse** set to True,
+        the sources of all edges ending at **node** are returned.
+        """
+        offsets, adjacent = self._adjacency(relation, reverse)
+        if node + 1 >= len(offsets):
+            return array('l')
+        return adjacent[offsets[node]:offsets[node + 1]]
+
+    def add_provenance(self, cid: str, provenance: dict) -> int:
+        """
+        Adds the content of a single provenance container (as json object in the raw container format, where the
+        entity is named 'self') to the graph.
+
+        :return: The node of the container entity.
+        """
+        entity = self.intern(cid, ProvGraph.ENTITY)
+        self._loaded[entity] = 1
+
+        ent = next(iter(provenance['entity'].values()))
+        self.set(entity, 'label', ent.get('prov:label'))
+        self.set(entity, 'type', ent.get('prov:type'))
+        self.set(entity, 'datahash', ent.get('provtool:datahash'))
+
+        # The same activity is contained in every container it generated. Its relations are only taken from the
+        # first of these containers, otherwise the edges would be duplicated for each generated entity.
+        known_activities = set()
+        activities = {}
+        for act_id, act in provenance.get('activity', {}).items():
+            activity = self.intern(act_id, ProvGraph.ACTIVITY)
+            activities[act_id] = activity
+            if self._loaded[activity]:
+                known_activities.add(activity)
+                continue
+            self._loaded[activity] = 1
+            self.set(activity, 'label', act.get('prov:label'))
+            self.set(activity, 'location', act.get('prov:location'))
+            self.set(activity, 'start_time', act.get('prov:startTime'))
+            self.set(activity, 'end_time', act.get('prov:endTime'))
+
+        agents = {}
+        for ag_id, ag in provenance.get('agent', {}).items():
+            agent = self.intern(ag_id, ProvGraph.AGENT)
+            agents[ag_id] = agent
+            self.set(agent, 'label', ag.get('prov:label'))
+            self.set(agent, 'type', ag.get('prov:type'))
+
+        def _activity(act_id):
+            activity = self.intern(act_id, ProvGraph.ACTIVITY)
+            return None if activity in known_activities else activity
+
+        if 'wasGeneratedBy' in provenance:
+            for wgb in provenance['wasGeneratedBy'].values():
+                self.add_edge('wasGeneratedBy', entity, self.intern(wgb['prov:activity'], ProvGraph.ACTIVITY))
+        else:
+            # Containers created by provtoolutils.model.make_provstring contain exactly one activity, which
+            # generated the entity, but do not state the relation explicitly.
+            for activity in activities.values():
+                self.add_edge('wasGeneratedBy', entity, activity)
+
+        if 'wasAssociatedWith' in provenance:
+            for waw in provenance['wasAssociatedWith'].values():
+                if 'prov:activity' in waw and 'prov:agent' in waw and _activity(waw['prov:activity']) is not None:
+                    self.add_edge('wasAssociatedWith', _activity(waw['prov:activity']),
+                                  self.intern(waw['prov:agent'], ProvGraph.AGENT))
+        else:
+            for activity in activities.values():
+                if activity not in known_activities:
+                    for agent in agents.values():
+                        self.add_edge('wasAssociatedWith', activity, agent)
+
+        for u in provenance.get('used', {}).values():
+            if _activity(u['prov:activity']) is not None:
+                self.add_edge('used', _activity(u['prov:activity']), self.intern(u['prov:entity'], ProvGraph.ENTITY))
+
+        for wsb in provenance.get('wasStartedBy', {}).values():
+            if _activity(wsb['prov:activity']) is not None:
+                self.add_edge('wasStartedBy', _activity(wsb['prov:activity']),
+                              self.intern(wsb['prov:starter'], ProvGraph.ACTIVITY))
+
+        return entity
+
+    def add_container(self, cid: str, rawprov: bytes) -> int:
+        return self.add_provenance(cid, json.loads(rawprov.decode(model_encoding)))
+
+    def used_entities(self, entity: int) -> List[int]:
+        """
+        Returns the entities used by the activities which generated **entity**.
+        """
+        result = []
+        for activity in self.neighbours('wasGeneratedBy', entity):
+            result.extend(self.neighbours('used', activity))
+        return result
+
+    def ancestors(self, entity: int) -> List[int]:
+        """
+        Returns all entities **entity** depends on (transitively), excluding **entity** itself.
+        """
+        seen = {entity}
+        result = []
+        stack = [entity]
+        while len(stack) > 0:
+            for parent in self.used_entities(stack.pop()):
+                if parent not in seen:
+                    seen.add(parent)
+                    result.append(parent)
+                    stack.append(parent)
+        return result
+
+    @staticmethod
+    def load(read: Callable[[str], Tuple[bytes, bytes, bool]], cid: str) -> 'ProvGraph':
+        """
+        Creates a graph for the lineage of **cid** by following the used relations.
+
+        :param read: Returns the tuple provenance, data, error for a container id (see read_provanddata of the reader
+        plugins). Containers, which cannot be read, remain in the graph as entities without attributes.
+        """
+        graph = ProvGraph()
+        queued = {graph.intern(cid, ProvGraph.ENTITY)}
+        to_scan = [cid]
+        while len(to_scan) > 0:
+            current = to_scan.pop()
+            pr, _, err = read(current)
+            if pr is None:
+                continue
+            provenance = json.loads(pr.decode(model_encoding))
+            graph.add_provenance(current, provenance)
+            for u in provenance.get('used', {}).values():
+                parent = graph.intern(u['prov:entity'], ProvGraph.ENTITY)
+                if parent not in queued:
+                    queued.add(parent)
+                    to_scan.append(u['prov:entity'])
+        return graph
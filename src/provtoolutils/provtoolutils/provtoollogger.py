@@ -1,17 +1,120 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
 
-provtoollogger = logging.getLogger('provtool')
+from typing import List, Union
 
-FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
-provtoollogger = logging.getLogger('provtool')
-provtoollogger.setLevel(logging.WARNING)
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
-fh = logging.FileHandler('provtool.log')
-fh.setLevel(logging.DEBUG)
-fh.setFormatter(logging.Formatter(FORMAT))
-provtoollogger.addHandler(fh)
+# The loggers used within provtool.
+loggers = ['provtool', 'DirectoryWrapper', 'Validator']
 
-ch = logging.StreamHandler()
-ch.setLevel(logging.WARNING)
-ch.setFormatter(logging.Formatter(FORMAT))
-provtoollogger.addHandler(ch)
+# Comma separated list of sinks (see create_sink), if none are given explicitly.
+sinks_env = 'PROVTOOLLOGSINKS'
+level_env = 'PROVTOOLLOGLEVEL'
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    The QueueHandler of the standard library formats each record before putting it into the queue. The records
+    never leave the process here, so formatting is left to the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def create_sink(sink: Union[str, logging.Handler]) -> logging.Handler:
+    """
+    Creates a handler for the given sink. Supported are 'stderr', 'stdout' and 'file:<path>'. Handlers are used as
+    they are.
+    """
+    if isinstance(sink, logging.Handler):
+        return sink
+    if sink == 'stderr':
+        handler = logging.StreamHandler(sys.stderr)
+    elif sink == 'stdout':
+        handler = logging.StreamHandler(sys.stdout)
+    elif sink.startswith('file:'):
+        # Opened with the first record. Processes, which never log, do not create empty log files.
+        handler = logging.FileHandler(sink[len('file:'):], delay=True)
+    else:
+        raise ValueError(f'Unknown log sink {sink}. Expecting stderr, stdout or file:<path>')
+    handler.setFormatter(logging.Formatter(FORMAT))
+    return handler
+
+
+def configure(sinks: List[Union[str, logging.Handler]] = None, level: str = None,
+              default_sinks: List[str] = ('stderr',), default_level: str = 'WARNING') -> logging.handlers.QueueListener:
+    """
+    Routes the records of all provtool loggers through a queue to the given sinks. The sinks are written by a
+    background thread, so logging does not block on (slow) file systems. Calling configure again replaces the
+    previous configuration instead of adding further handlers.
+
+    :param sinks: See create_sink. Defaults to the value of the environment variable PROVTOOLLOGSINKS or
+    **default_sinks**.
+    :param level: The level of the provtool loggers. Defaults to the value of the environment variable
+    PROVTOOLLOGLEVEL or **default_level**.
+    """
+    global _listener, _queue_handler
+
+    if sinks is None:
+        sinks = list(default_sinks)
+        if sinks_env in os.environ:
+            sinks = [s.strip() for s in os.environ[sinks_env].split(',') if len(s.strip()) > 0]
+    if level is None:
+        level = os.environ.get(level_env, default_level)
+    handlers = [create_sink(s) for s in sinks]
+
+    with _lock:
+        _shutdown()
+
+        q: queue.Queue = queue.Queue(-1)
+        _queue_handler = _LazyQueueHandler(q)
+        for name in loggers:
+            logger = logging.getLogger(name)
+            logger.addHandler(_queue_handler)
+            logger.setLevel(level)
+            # Records are handled by the sinks only. Otherwise, basicConfig of the root logger duplicates them.
+            logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+        _listener.start()
+
+    return _listener
+
+
+def _shutdown():
+    global _listener, _queue_handler
+
+    if _queue_handler is not None:
+        for name in loggers:
+            logging.getLogger(name).removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        # Flushes all queued records.
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+
+
+def shutdown():
+    """
+    Writes all pending records and removes the queue handlers from the provtool loggers.
+    """
+    with _lock:
+        _shutdown()
+    for name in loggers:
+        logging.getLogger(name).propagate = True
+
+
+atexit.register(shutdown)
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+from typing import Dict, List, Tuple
+
+from provtoolutils.model import resources_prefix
+
+# Blocks reported by getrusage are always 512 bytes. See: man getrusage
+_block_size = 512
+
+
+def _props(usage, returncode: int) -> Dict:
+    # ru_maxrss is given in KiB on Linux and in bytes on macOS.
+    maxrss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return {
+        f'{resources_prefix}:cpuUserTime': round(usage.ru_utime, 6),
+        f'{resources_prefix}:cpuSystemTime': round(usage.ru_stime, 6),
+        f'{resources_prefix}:maxRss': maxrss,
+        # Only I/O, which actually hits the block devices. Reads served from the page cache are not counted.
+        f'{resources_prefix}:bytesRead': usage.ru_inblock * _block_size,
+        f'{resources_prefix}:bytesWritten': usage.ru_oublock * _block_size,
+        f'{resources_prefix}:exitStatus': returncode
+    }
+
+
+def run(command: List[str]) -> Tuple[int, Dict]:
+    """
+    Runs **command** and measures its resource usage (including the resource usage of its children, which were
+    waited for).
+
+    :return: The exit code (negative signal number, if killed by a signal) and the resource usage as additional
+    properties for provtoolutils.model.Activity.
+    """
+    process = subprocess.Popen(command)
+    if not hasattr(os, 'wait4'):
+        returncode = process.wait()
+        return returncode, {f'{resources_prefix}:exitStatus': returncode}
+
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    # The process is reaped already. Tell Popen, so that it does not wait again.
+    process.returncode = returncode
+
+    return returncode, _props(usage, returncode)
@@ -1,26 +1,90 @@
 import argparse
+import os
+import queue
 import sys
+import textwrap
+import threading
+import time
+
+from typing import Iterator
 
 if sys.version_info < (3, 10):
     from importlib_metadata import entry_points
 else:
     from importlib.metadata import entry_points
 
+# Seconds without a result, after which a reader plugin is not waited for anymore.
+default_timeout = 60.0
+
+_done = object()
+
+
+def _cid(path: str) -> str:
+    name = os.path.basename(path)
+    return name[:-len('.prov')] if name.endswith('.prov') else name
+
+
+def iter_search(options, label, timeout: float = default_timeout) -> Iterator[str]:
+    """
+    Searches with all reader plugins concurrently and yields the paths of the containers found as soon as a plugin
+    returns them. Plugins with an iter_search generator (or a search returning an iterator) deliver their results one
+    by one. A container found by several plugins is yielded once.
 
-def search(options, label):
-    discovered_plugins = entry_points(group='provtoolutils.reader')
-    paths = []
-    for dp in discovered_plugins:
+    Plugins, which deliver no result (and do not finish) for **timeout** seconds, are abandoned. The time is measured
+    for each plugin separately and starts again with each of its results, so plugins streaming many results are not cut
+    off. Errors of a plugin are reported and do not affect the other plugins.
+    """
+    results: queue.Queue = queue.Queue()
+
+    def run(dp):
         try:
-            found = getattr(dp.load(), 'search')(options, label)
-            paths = paths + found
+            plugin = dp.load()
+            # Plugins may offer a generator, which delivers each container as soon as it is found.
+            find = getattr(plugin, 'iter_search', None) or getattr(plugin, 'search')
+            for path in find(options, label):
+                results.put((dp.name, path))
         # Catch any exception. These may come from arbitrary plugins and may be unpredictable. On
         # the other hand the integrity of a container (data and provenance) can always be checked.
         # Therefore, if any of the readers return without an error, it is sufficient.
         except Exception as e:
-            print(e)
+            print(f'{dp.name}: {e}', file=sys.stderr)
+        finally:
+            results.put((dp.name, _done))
+
+    # Time of the last sign of life by plugin.
+    running = {}
+    for dp in entry_points(group='provtoolutils.reader'):
+        running[dp.name] = time.monotonic()
+        # Daemon threads. An abandoned plugin does not keep the program alive.
+        threading.Thread(target=run, args=(dp,), daemon=True).start()
+
+    seen = set()
+    while len(running) > 0:
+        try:
+            name, path = results.get(timeout=max(0.0, min(running.values()) + timeout - time.monotonic()))
+        except queue.Empty:
+            now = time.monotonic()
+            idle = sorted(n for n, last in running.items() if now - last >= timeout)
+            print(f'{", ".join(idle)}: No result within {timeout} seconds', file=sys.stderr)
+            for n in idle:
+                del running[n]
+            continue
+        if name not in running:
+            continue
+        if path is _done:
+            del running[name]
+            continue
+        running[name] = time.monotonic()
+        if _cid(path) not in seen:
+            seen.add(_cid(path))
+            yield path
+
 
-    return paths
+def search(options, label, timeout: float = default_timeout):
+    """
+    The paths of the containers found by all reader plugins. See iter_search.
+    """
+    return list(iter_search(options, label, timeout))
 
 
 if __name__ == '__main__':
@@ -31,17 +95,19 @@ if __name__ == '__main__':
         help='The entity name.',
         required=True
     )
-    group = parser.add_argument_group('prov')
     parser.add_argument(
         '--searchdir',
         type=str,
         help='The directory to be searched. The directory is searched recursively.',
+        required=True
     )
+    parser.add_argument('--timeout', type=float, default=default_timeout, help=textwrap.dedent(
+        f'''
+            Seconds to wait for the next result of each reader plugin. Defaults to {default_timeout}.
+        '''
+    ))
     args = parser.parse_args()
-    if args.searchdir is None and args.searchfile is None:
-        parser.error("at least one of --searchdir or --searchfile required")
 
-    if args.searchdir is not None:
-        paths = search({'directory': args.searchdir}, args.entityname)
-        for p in paths:
-            print(p)
+    # Print each container as soon as it is found.
+    for p in iter_search({'directory': args.searchdir}, args.entityname, args.timeout):
+        print(p, flush=True)
@@ -5,6 +5,7 @@ import sys
 
 from cryptography.hazmat.primitives import serialization
 
+from provtoolutils.atomicwrite import FsyncBatch
 from provtoolutils.constants import model_encoding
 from provtoolutils.utilities import calculate_data_hash, sign
 
@@ -73,12 +74,10 @@ def main():
                                                private_key, args.timestampserver)
         sph = calculate_data_hash(signprov.encode(model_encoding))
         base = os.path.dirname(args.provfile)
-        with open(os.path.join(base, sph) + '.prov', 'wb') as sp:
-            sp.write(signprov.encode(model_encoding))
-        with open(os.path.join(base, calculate_data_hash(signature)), 'wb') as sp:
-            sp.write(signature)
-        with open(os.path.join(base, calculate_data_hash(tsignature)), 'wb') as sp:
-            sp.write(tsignature)
+        with FsyncBatch() as batch:
+            batch.write(os.path.join(base, sph) + '.prov', signprov.encode(model_encoding))
+            batch.write(os.path.join(base, calculate_data_hash(signature)), signature)
+            batch.write(os.path.join(base, calculate_data_hash(tsignature)), tsignature)
 
 
 if __name__ == '__main__':  # pragma: no cover
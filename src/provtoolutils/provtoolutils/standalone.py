@@ -1,21 +1,207 @@
 import argparse
+import csv
 import datetime
 import dateutil.parser
 import git
+import json
 import os
 import sqlite3
+import subprocess
 import textwrap
 
+from collections import defaultdict
 from git import Repo
+from typing import BinaryIO, Dict, Iterator, List, Set, Tuple
 
+from provtoolutils.atomicwrite import FsyncBatch
+from provtoolutils.blobstore import blobstore_env, BlobStore
+from provtoolutils.catalog import container_metadata, Catalog
+from provtoolutils.constants import default_jobs
 from provtoolutils.model import make_provstring, Activity, Entity, Person
+from provtoolutils.parallel import run_parallel
 from provtoolutils.utilities import calculate_data_hash
 
+# Name of the database in the output directory of a backfill, which records its progress.
+backfill_db = 'provtool_backfill.db'
+
+# File modes of regular files in git trees. Symbolic links (120000) and submodules (160000) are not wrapped.
+_file_modes = ('100644', '100755')
+
+
+def _split_nul(stream: BinaryIO, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    The NUL terminated fields of the output of a git command (option -z), read as it is produced.
+    """
+    rest = b''
+    chunk = stream.read(chunk_size)
+    while chunk:
+        fields = (rest + chunk).split(b'\0')
+        rest = fields.pop()
+        yield from fields
+        chunk = stream.read(chunk_size)
+    if rest:
+        yield rest
+
+
+def _decode_path(path: bytes) -> str:
+    return path.decode('utf-8', 'surrogateescape')
+
+
+def _tracked_files(repo: Repo, paths: List[str]) -> Dict[str, str]:
+    """
+    The regular files in HEAD (below **paths**, if given) with the ids of their blobs.
+    """
+    files = {}
+    output = repo.git.ls_tree('-r', '-z', '--full-tree', 'HEAD', '--', *paths, stdout_as_string=False)
+    for field in output.split(b'\0'):
+        if len(field) == 0:
+            continue
+        info, path = field.split(b'\t', 1)
+        mode, objtype, sha = info.decode('ascii').split(' ')
+        if objtype == 'blob' and mode in _file_modes:
+            files[_decode_path(path)] = sha
+    return files
+
+
+def _last_commits(repo: Repo, relpaths: Set[str], paths: List[str]) -> Dict[str, Tuple[str, int, str]]:
+    """
+    The last commit changing each of **relpaths** as (hexsha, commit time, author name). The history is read in a
+    single pass of git log, which stops as soon as a commit is known for every path.
+    """
+    commits: Dict[str, Tuple[str, int, str]] = {}
+    # -c lists the files of merges, which differ from all parents. Such merges are the last commit of the file, as
+    # in git log <file>.
+    proc = subprocess.Popen([repo.git.GIT_PYTHON_GIT_EXECUTABLE, 'log', '-z', '--name-only', '-c', '--no-renames',
+                             '--format=%x01%H %ct %an', 'HEAD', '--'] + paths,
+                            cwd=repo.working_tree_dir, stdout=subprocess.PIPE)
+    try:
+        commit = None
+        for field in _split_nul(proc.stdout):
+            if field.startswith(b'\x01'):
+                hexsha, timestamp, author = field[1:].decode('utf-8', 'replace').split(' ', 2)
+                commit = (hexsha, int(timestamp), author)
+                continue
+            # The first file of a commit follows the header on a new line.
+            relpath = _decode_path(field[1:] if field.startswith(b'\n') else field)
+            if relpath in relpaths and relpath not in commits:
+                commits[relpath] = commit
+                if len(commits) == len(relpaths):
+                    break
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+
+    if len(commits) < len(relpaths) and returncode != 0:
+        raise RuntimeError(f'git log failed with exit code {returncode}')
+    return commits
+
+
+_null_sha = '0' * 40
+
+
+def _history(repo: Repo, paths: List[str]) -> Iterator[Tuple[Tuple[str, int, str],
+                                                             List[Tuple[str, Tuple[str, ...], str]]]]:
+    """
+    The commits of the history of HEAD, parents before children, as (hexsha, commit time, author name) with the
+    changed regular files as (path, blobs before, blob after). There is one blob before per parent, which had the
+    file. Deleted files are left out. Merges list the files, which differ from all parents (for example resolved
+    conflicts). Files taken unchanged from one of the parents are no changes of the merge.
+    """
+    # With -c, merges are shown as combined diff: only files differing from all parents, with the blob of each.
+    proc = subprocess.Popen([repo.git.GIT_PYTHON_GIT_EXECUTABLE, 'log', '-z', '--raw', '-c', '--no-abbrev',
+                             '--reverse', '--topo-order', '--no-renames', '--format=%x01%H %ct %an', 'HEAD', '--'] +
+                            paths, cwd=repo.working_tree_dir, stdout=subprocess.PIPE)
+    try:
+        commit, changes, info = None, [], None
+        for field in _split_nul(proc.stdout):
+            if info is not None:
+                # One mode and blob per parent, followed by the mode and blob after.
+                parents = len(info) // 2 - 1
+                newmode, olds, new = info[parents], info[parents + 1:2 * parents + 1], info[2 * parents + 1]
+                if newmode in _file_modes:
+                    changes.append((_decode_path(field), tuple(o for o in olds if o != _null_sha), new))
+                info = None
+            elif field.startswith(b'\x01'):
+                if commit is not None:
+                    yield commit, changes
+                hexsha, timestamp, author = field[1:].decode('utf-8', 'replace').split(' ', 2)
+                commit, changes = (hexsha, int(timestamp), author), []
+            elif len(field.strip()) > 0:
+                # :<old mode> <new mode> <old blob> <new blob> <status>, followed by the path. Merges have one colon,
+                # old mode and old blob per parent. The first change of a commit follows the header on a new line.
+                info = field.decode('ascii').strip().lstrip(':').split(' ')[:-1]
+        if commit is not None:
+            yield commit, changes
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f'git log failed with exit code {returncode}')
+
+
+def _author(name: str) -> Person:
+    return Person(name.split(' ')[0], ' '.join(name.split(' ')[1:]))
+
+
+def _authors(names: List[str]) -> Person:
+    """
+    The first author, on whose behalf each of the following authors acted (as in the interactive mode).
+    """
+    author = _author(names[0])
+    last = author
+    for name in names[1:]:
+        last.acted_on_behalf_of = _author(name)
+        last = last.acted_on_behalf_of
+    return author
+
+
+# Columns of a batch manifest. The authors and the used containers are lists (separated by ';' in csv files).
+_manifest_columns = ['entity_path', 'authors', 'activity_location', 'activity_label', 'activity_means',
+                     'activity_time', 'used']
+
+
+def _read_batch_manifest(manifest_path: str) -> List[Dict]:
+    """
+    Reads the rows of a batch manifest (csv with header or json lines). The paths are relative to the directory of
+    the manifest.
+    """
+    with open(manifest_path, 'r', encoding='utf-8', newline='') as f:
+        if manifest_path.endswith('.csv'):
+            lines = [(i + 2, {k: v.split(';') if k in ('authors', 'used') and v else v for k, v in row.items()})
+                     for i, row in enumerate(csv.DictReader(f))]
+        else:
+            lines = [(i + 1, json.loads(line)) for i, line in enumerate(f) if len(line.strip()) > 0]
+
+    rows = []
+    for number, line in lines:
+        missing = [c for c in _manifest_columns[:-1] if not line.get(c)]
+        if len(missing) > 0:
+            raise ValueError(f'{manifest_path}:{number}: Missing {", ".join(missing)}')
+        row = {c: line.get(c) for c in _manifest_columns}
+        row['entity_path'] = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), row['entity_path'])
+        row['activity_time'] = dateutil.parser.parse(row['activity_time'])
+        row['used'] = row['used'] if row['used'] else []
+        rows.append(row)
+    return rows
+
+
+def _commit_label(hexsha: str, activity_description: str) -> str:
+    return f'Git commit {hexsha}' + (f'. {activity_description}' if len(activity_description) > 0 else '')
+
 
 class Standalone:
 
-    def __init__(self, db='provtool.db'):
+    def __init__(self, db='provtool.db', blobstore=None):
+        """
+        :param blobstore: Optional root directory of a provtoolutils.blobstore.BlobStore. The data is stored there
+        instead of next to the container.
+        """
         self.conn = sqlite3.connect(db)
+        self.blobstore = BlobStore(blobstore) if blobstore is not None else None
 
         self.bar = '##############################'
 
@@ -58,31 +244,44 @@ class Standalone:
             self.conn.commit()
             return inp
 
-    def write_prov_file(self, activity_time: datetime, activity_location, activity_label,
-                        activity_means, used, entity_path, author):
+    @staticmethod
+    def make_container(activity_time: datetime, activity_location, activity_label, activity_means, used,
+                       entity_path, author, datahash: str) -> Tuple[str, bytes]:
+        """
+        :return: The id of the container and the container.
+        """
         activity = Activity(start_time=activity_time, end_time=activity_time, location=activity_location,
                             label=activity_label, means=activity_means, used=used, generate_uuid=False)
+        rawprov = make_provstring(os.path.basename(entity_path), Entity.FILE, author, activity, datahash)
+        return calculate_data_hash(rawprov), rawprov
 
-        with open(entity_path, 'rb') as f:
-            datab = f.read()
-            rawprov = make_provstring(os.path.basename(entity_path), Entity.FILE, author, activity,
-                                      calculate_data_hash(datab)
-                                      )
-            entityid = calculate_data_hash(rawprov)
-
-            provfilename = '{}.prov'.format(entityid)
-            rawfilename = calculate_data_hash(datab)
-
-            provfile = os.path.join(os.path.dirname(entity_path), provfilename)
-            rawfile = os.path.join(os.path.dirname(entity_path), rawfilename)
-            print('Writing file: {}'.format(provfile))
-
-            with open(provfile, 'wb') as target_f:
-                target_f.write(rawprov)
-            with open(rawfile, 'wb') as target_f:
-                target_f.write(datab)
-            with open(os.path.join(os.path.dirname(entity_path), 'provtool_filemapping.txt'), 'a') as mapping_file:
-                mapping_file.write('{}={}'.format(entity_path, provfilename))
+    def write_prov_file(self, activity_time: datetime, activity_location, activity_label,
+                        activity_means, used, entity_path, author, data: bytes = None):
+        """
+        :param data: The content of **entity_path**, if already known. Otherwise, the file is read.
+        """
+        if data is None:
+            with open(entity_path, 'rb') as f:
+                data = f.read()
+        rawfilename = calculate_data_hash(data)
+        entityid, rawprov = self.make_container(activity_time, activity_location, activity_label, activity_means,
+                                                used, entity_path, author, rawfilename)
+
+        provfilename = '{}.prov'.format(entityid)
+
+        provfile = os.path.join(os.path.dirname(entity_path), provfilename)
+        rawfile = os.path.join(os.path.dirname(entity_path), rawfilename)
+        print('Writing file: {}'.format(provfile))
+
+        # Container and data become visible under their final names only once completely written.
+        with FsyncBatch() as batch:
+            batch.write(provfile, rawprov)
+            if self.blobstore is None:
+                batch.write(rawfile, data)
+        if self.blobstore is not None:
+            self.blobstore.put_bytes(data, entityid)
+        Catalog.in_directory(os.path.dirname(entity_path)).add([(entity_path, entityid, rawfilename)],
+                                                               metadata=[container_metadata(rawprov, provfile)])
 
     def run(self):
         self.heading('File')
@@ -133,15 +332,233 @@ class Standalone:
         commit = next(iter(repo.iter_commits(paths=file_path, max_count=1)))
         # The Linux timestamp should be in UTC ALWAYS. Use the explicit time zone for converting.
         dt = datetime.datetime.fromtimestamp(commit.committed_datetime.timestamp(), tz=datetime.timezone.utc)
-        self.write_prov_file(dt, 'Unkown', f'Git commit {commit.hexsha}' +
-                             (f'. {activity_description}' if len(activity_description) > 0 else ''),
-                             '-', [], os.path.join(repo_path, file_path),
-                             Person(commit.author.name.split(' ')[0], " ".join(commit.author.name.split(' ')[1:]))
+        self.write_prov_file(dt, 'Unkown', _commit_label(commit.hexsha, activity_description),
+                             '-', [], os.path.join(repo_path, file_path), _author(commit.author.name)
                              )
 
         repo.git.clear_cache()
         repo.close()
 
+    def run_repo_bulk(self, repo_path, activity_description='', paths: List[str] = None,
+                      jobs: int = default_jobs) -> Dict[str, str]:
+        """
+        Same as run_repo for all files of the repository (or below **paths**, relative to the repository root) at
+        once. The last commit of every file is found in a single pass over the history. The content of the files is
+        read from the committed blobs through one persistent git cat-file --batch process, while the containers are
+        built and written by a pool of **jobs** threads. All containers are persisted as one batch.
+
+        :return: The path of each file and the id of the container written for it.
+        """
+        repo = Repo(repo_path, search_parent_directories=True, odbt=git.GitCmdObjectDB)
+        try:
+            if repo.is_dirty():
+                raise ValueError('Repository is dirty. Please commit before using this tool')
+            paths = paths if paths is not None else []
+            root = repo.working_tree_dir
+            files = _tracked_files(repo, paths)
+            commits = _last_commits(repo, set(files), paths)
+
+            def contents():
+                # Reading from cat-file is serial. Hashing and writing the previous files goes on meanwhile.
+                for relpath in sorted(files):
+                    yield relpath, repo.git.get_object_data(files[relpath])[3]
+
+            with FsyncBatch(jobs=jobs) as batch:
+                def wrap(item):
+                    relpath, datab = item
+                    hexsha, timestamp, author = commits[relpath]
+                    dt = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+                    entity_path = os.path.join(root, *relpath.split('/'))
+                    datahash = calculate_data_hash(datab)
+                    entityid, rawprov = self.make_container(dt, 'Unkown', _commit_label(hexsha, activity_description),
+                                                            '-', [], entity_path, _author(author), datahash)
+                    provfile = os.path.join(os.path.dirname(entity_path), f'{entityid}.prov')
+                    batch.write(provfile, rawprov)
+                    if self.blobstore is None:
+                        batch.write(os.path.join(os.path.dirname(entity_path), datahash), datab)
+                    else:
+                        # The committed blob, not the working tree file. Both may differ (filters, line endings).
+                        self.blobstore.put_bytes(datab, entityid, datahash)
+                    return entity_path, entityid, datahash, container_metadata(rawprov, provfile)
+
+                results = run_parallel(wrap, contents(), jobs)
+        finally:
+            repo.git.clear_cache()
+            repo.close()
+
+        self._record(results)
+        print(f'Wrote {len(results)} containers')
+
+        return {entity_path: entityid for entity_path, entityid, _, _ in results}
+
+    @staticmethod
+    def _record(results: List[Tuple[str, str, str, Dict]]):
+        """
+        Records the (path, cid, datahash, metadata) **results** in the catalogs next to the containers. One
+        transaction per directory.
+        """
+        entries = defaultdict(list)
+        for result in results:
+            entries[os.path.dirname(result[0])].append(result)
+        for directory, directory_entries in entries.items():
+            Catalog.in_directory(directory).add([e[:3] for e in directory_entries],
+                                                metadata=[e[3] for e in directory_entries])
+
+    def run_batch(self, manifest_path: str, jobs: int = default_jobs) -> Dict[str, str]:
+        """
+        Non interactive mode for many files. Each row of the manifest describes a file with the same information as
+        asked for in the interactive mode: entity_path, authors (given and family name, the first one is the main
+        author), activity_location, activity_label, activity_means, activity_time and optionally used (container
+        ids). The manifest is a csv file (lists separated by ';') or a file with one json object per line.
+
+        The files are read and hashed by a pool of **jobs** threads and all containers are persisted as one batch.
+        The containers are recorded in the catalog (see provtoolutils.catalog) next to them.
+
+        :return: The path of each file and the id of the container written for it.
+        """
+        rows = _read_batch_manifest(manifest_path)
+
+        with FsyncBatch(jobs=jobs) as batch:
+            def wrap(row):
+                with open(row['entity_path'], 'rb') as f:
+                    datab = f.read()
+                datahash = calculate_data_hash(datab)
+                entityid, rawprov = self.make_container(row['activity_time'], row['activity_location'],
+                                                        row['activity_label'], row['activity_means'], row['used'],
+                                                        row['entity_path'], _authors(row['authors']), datahash)
+                directory = os.path.dirname(row['entity_path'])
+                provfile = os.path.join(directory, f'{entityid}.prov')
+                batch.write(provfile, rawprov)
+                if self.blobstore is None:
+                    batch.write(os.path.join(directory, datahash), datab)
+                return row['entity_path'], entityid, datahash, container_metadata(rawprov, provfile)
+
+            results = run_parallel(wrap, rows, jobs)
+
+        if self.blobstore is not None:
+            run_parallel(lambda r: self.blobstore.put(r[0], r[1], r[2]), results, jobs)
+
+        self._record(results)
+        print(f'Wrote {len(results)} containers')
+
+        return {entity_path: entityid for entity_path, entityid, _, _ in results}
+
+    def run_backfill(self, repo_path, output_dir, activity_description='', paths: List[str] = None,
+                     jobs: int = default_jobs, checkpoint_every: int = 1000) -> int:
+        """
+        Creates containers for all revisions of the files (below **paths**) in the history of HEAD. Each revision
+        (path and blob) gets one container, which uses the container of the revision of the same path in the parent
+        commit. Containers and data are written to **output_dir**. The revisions are recorded in its catalog with the
+        path of the file in the working tree and the time of the commit.
+
+        The blobs are read from the object database (no checkouts) and each blob is hashed once, in a pool of **jobs**
+        threads. The progress is recorded in output_dir/provtool_backfill.db every **checkpoint_every** revisions.
+        An interrupted backfill continues from there when started again.
+
+        :return: The number of containers written.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint = sqlite3.connect(os.path.join(output_dir, backfill_db))
+        with checkpoint:
+            checkpoint.executescript(
+                'create table if not exists commits(hexsha text primary key);'
+                'create table if not exists blobs(sha text primary key, datahash text not null);'
+                'create table if not exists revisions(path text not null, sha text not null, cid text not null, '
+                'primary key (path, sha));')
+        done = {r[0] for r in checkpoint.execute('select hexsha from commits')}
+        datahashes = dict(checkpoint.execute('select sha, datahash from blobs').fetchall())
+        cids = {(path, sha): cid for path, sha, cid in checkpoint.execute('select path, sha, cid from revisions')}
+
+        repo = Repo(repo_path, search_parent_directories=True, odbt=git.GitCmdObjectDB)
+        count = 0
+        try:
+            chunk, size = [], 0
+            for commit, changes in _history(repo, paths if paths is not None else []):
+                if commit[0] in done:
+                    continue
+                chunk.append((commit, changes))
+                size = size + len(changes)
+                if size >= checkpoint_every:
+                    count = count + self._backfill_chunk(repo, output_dir, chunk, datahashes, cids,
+                                                         activity_description, checkpoint, jobs)
+                    chunk, size = [], 0
+            if len(chunk) > 0:
+                count = count + self._backfill_chunk(repo, output_dir, chunk, datahashes, cids, activity_description,
+                                                     checkpoint, jobs)
+        finally:
+            repo.git.clear_cache()
+            repo.close()
+            checkpoint.close()
+
+        print(f'Wrote {count} containers')
+        return count
+
+    def _backfill_chunk(self, repo: Repo, output_dir: str, chunk: List, datahashes: Dict[str, str],
+                        cids: Dict[Tuple[str, str], str], activity_description: str, checkpoint: sqlite3.Connection,
+                        jobs: int) -> int:
+        """
+        Writes the containers of the revisions of the commits in **chunk** and records them in the checkpoint.
+        """
+        blobs = sorted({new for _, changes in chunk for _, _, new in changes} - set(datahashes))
+
+        def contents():
+            for sha in blobs:
+                yield sha, repo.git.get_object_data(sha)[3]
+
+        # The data of each blob is hashed and stored once, even if several revisions share it.
+        with FsyncBatch(jobs=jobs) as batch:
+            def store(item):
+                sha, datab = item
+                datahash = calculate_data_hash(datab)
+                if not os.path.exists(os.path.join(output_dir, datahash)):
+                    batch.write(os.path.join(output_dir, datahash), datab)
+                return datahash
+
+            new_blobs = dict(zip(blobs, run_parallel(store, contents(), jobs)))
+        datahashes.update(new_blobs)
+
+        # The containers are cheap to build, but each depends on the one of the previous revision.
+        new_revisions, metadata = [], []
+        with FsyncBatch(jobs=jobs) as batch:
+            for (hexsha, timestamp, author), changes in chunk:
+                dt = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+                for path, olds, new in changes:
+                    if (path, new) in cids:
+                        continue
+                    # The revisions of all parents of a merge are used.
+                    previous = list(dict.fromkeys(cids[(path, old)] for old in olds if (path, old) in cids))
+                    cid, rawprov = self.make_container(dt, 'Unkown', _commit_label(hexsha, activity_description), '-',
+                                                       previous, path, _author(author), datahashes[new])
+                    batch.write(os.path.join(output_dir, f'{cid}.prov'), rawprov)
+                    cids[(path, new)] = cid
+                    new_revisions.append((path, new, cid, dt))
+                    metadata.append(container_metadata(rawprov, os.path.join(output_dir, f'{cid}.prov')))
+
+        if self.blobstore is not None:
+            def put(revision):
+                path, sha, cid, _ = revision
+                if self.blobstore.contains(datahashes[sha]):
+                    self.blobstore.add_ref(datahashes[sha], cid)
+                else:
+                    self.blobstore.put(os.path.join(output_dir, datahashes[sha]), cid, datahashes[sha])
+
+            run_parallel(put, new_revisions, jobs)
+            # The data was only kept in the output directory until it was stored.
+            for datahash in set(new_blobs.values()):
+                if os.path.exists(os.path.join(output_dir, datahash)):
+                    os.remove(os.path.join(output_dir, datahash))
+
+        # The revisions are recorded with the time of their commit.
+        Catalog.in_directory(output_dir).add([(os.path.join(repo.working_tree_dir, *path.split('/')), cid,
+                                               datahashes[sha], dt) for path, sha, cid, dt in new_revisions],
+                                             metadata=metadata)
+        with checkpoint:
+            checkpoint.executemany('insert or ignore into blobs(sha, datahash) values (?, ?)', new_blobs.items())
+            checkpoint.executemany('insert or ignore into revisions(path, sha, cid) values (?, ?, ?)',
+                                   [r[:3] for r in new_revisions])
+            checkpoint.executemany('insert or ignore into commits(hexsha) values (?)', [(c[0][0],) for c in chunk])
+        return len(new_revisions)
+
 
 if __name__ == '__main__':  # pragma: no cover
     usage_message = """
@@ -152,6 +569,9 @@ if __name__ == '__main__':  # pragma: no cover
 
         python -m provtoolutils.standalone
         python -m provtoolutils.standalone --repopath <path to repository> --filepath <path to file within repository>
+        python -m provtoolutils.standalone --repopath <path to repository>
+        python -m provtoolutils.standalone --repopath <path to repository> --backfill <output directory>
+        python -m provtoolutils.standalone --batch <manifest>
         """
     parser = argparse.ArgumentParser('Provenance standalone conversion', usage=usage_message,
                                      formatter_class=argparse.RawTextHelpFormatter)
@@ -163,12 +583,44 @@ if __name__ == '__main__':  # pragma: no cover
     parser.add_argument('--filepath', help=textwrap.dedent(
         '''
             File within the repository, which should be used. The path should be relative to the repository root.
+            Without it, all files of the repository are wrapped at once.
+        '''
+    ))
+    parser.add_argument('--backfill', help=textwrap.dedent(
+        '''
+            Directory, into which containers for all revisions of the files in the history of the repository are
+            written. An interrupted backfill continues, if started again with the same directory.
+        '''
+    ))
+    parser.add_argument('--batch', help=textwrap.dedent(
+        '''
+            Manifest (csv or json lines) describing many files, which are wrapped without asking. The columns are
+            entity_path, authors, activity_location, activity_label, activity_means, activity_time and used.
+        '''
+    ))
+    parser.add_argument('--jobs', type=int, default=default_jobs, help=textwrap.dedent(
+        f'''
+            Number of threads hashing and writing in the batch and repository modes.
+            Defaults to {default_jobs}.
+        '''
+    ))
+
+    parser.add_argument('--blobstore', default=os.environ.get(blobstore_env), help=textwrap.dedent(
+        f'''
+            Root directory of a shared content addressed blob store. The data is stored there instead of next to
+            the container. Defaults to the value of the environment variable {blobstore_env}.
         '''
     ))
 
     args = parser.parse_args()
 
-    if args.repopath or args.filepath:
-        Standalone().run_repo(args.repopath, args.filepath)
+    if args.batch:
+        Standalone(blobstore=args.blobstore).run_batch(args.batch, jobs=args.jobs)
+    elif args.repopath and args.backfill:
+        Standalone(blobstore=args.blobstore).run_backfill(args.repopath, args.backfill, jobs=args.jobs)
+    elif args.repopath and not args.filepath:
+        Standalone(blobstore=args.blobstore).run_repo_bulk(args.repopath, jobs=args.jobs)
+    elif args.repopath or args.filepath:
+        Standalone(blobstore=args.blobstore).run_repo(args.repopath, args.filepath)
     else:
-        Standalone().run()
+        Standalone(blobstore=args.blobstore).run()
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import uuid
+
+from typing import Dict, Iterable, List
+
+from provtoolutils.constants import manifest_filename, model_encoding
+from provtoolutils.materialize import materialize
+from provtoolutils.utilities import calculate_data_hash
+
+# Environment variable with the root of the step cache used, if none is given explicitly.
+stepcache_env = 'PROVTOOLSTEPCACHE'
+
+_step_filename = 'provtool_step.json'
+
+
+class StepCache:
+    """
+    Remembers the outputs (data and provenance containers) of executed steps. A step is identified by its used
+    containers, the activity configuration, the versions of the acting software and the executed command. If the
+    same step is executed again, its outputs are restored instead of running the tool again. The restored
+    containers reference the activity, which originally created the outputs.
+
+    The outputs of a step are kept under root/<first two characters of the key>/<key>. Entries are written to a
+    temporary directory and renamed at once, so the cache may be shared between nodes via a shared file system.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(used: Iterable[str], activity: Dict, agent_versions: List[str], command: List[str]) -> str:
+        material = {
+            'used': sorted(used),
+            'activity': activity,
+            'agent_versions': agent_versions,
+            'command': command
+        }
+        return calculate_data_hash(json.dumps(material, ensure_ascii=False, sort_keys=True).encode(model_encoding))
+
+    @staticmethod
+    def normalize_command(command: List[str], directories: Dict[str, str]) -> List[str]:
+        """
+        Replaces the given directories within the arguments of **command** by placeholders. Steps, which only differ
+        in the location of their input and output directories, get the same key this way.
+
+        Only whole paths are replaced: an argument (or the value of an argument like --name=value), which is one of
+        the directories or a path below it. Other arguments, which merely contain the directory as text, are kept.
+
+        :param directories: Placeholder as key, directory as value. Relative and absolute spellings of the
+        directory are replaced.
+        """
+        replacements = []
+        for placeholder, directory in directories.items():
+            if directory is not None:
+                for spelling in {directory.rstrip(os.sep), os.path.abspath(directory)}:
+                    replacements.append((spelling, placeholder))
+        # Longest first. A directory below another one is replaced by its own placeholder.
+        replacements.sort(key=lambda r: len(r[0]), reverse=True)
+
+        def replace(token: str) -> str:
+            for spelling, placeholder in replacements:
+                if token == spelling or token.startswith(spelling + os.sep):
+                    return placeholder + token[len(spelling):]
+            return token
+
+        normalized = []
+        for arg in command:
+            replaced = replace(arg)
+            name, separator, value = arg.partition('=')
+            if replaced == arg and separator != '':
+                replaced = name + separator + replace(value)
+            normalized.append(replaced)
+        return normalized
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def contains(self, key: str) -> bool:
+        return os.path.isfile(os.path.join(self.path(key), _step_filename))
+
+    def store(self, key: str, output_dirpath: str) -> bool:
+        """
+        Copies all files of **output_dirpath** (except the manifest of incremental runs) into the cache.
+
+        :return: False, if the step was already cached (for example, stored concurrently by another node).
+        """
+        if self.contains(key):
+            return False
+
+        tmp = os.path.join(self.root, f'.{key}.{uuid.uuid4().hex}.tmp')
+        files = []
+        try:
+            for dirname, dirnames, filenames in os.walk(output_dirpath):
+                for f in filenames:
+                    relpath = os.path.relpath(os.path.join(dirname, f), output_dirpath)
+                    if relpath == manifest_filename:
+                        continue
+                    os.makedirs(os.path.join(tmp, os.path.dirname(relpath)), exist_ok=True)
+                    materialize(os.path.join(dirname, f), os.path.join(tmp, relpath))
+                    files.append(relpath)
+            with open(os.path.join(tmp, _step_filename), 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'key': key, 'files': sorted(files)}, f, ensure_ascii=False, indent=1)
+
+            os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+            try:
+                os.rename(tmp, self.path(key))
+            except OSError:
+                # Renaming onto a non empty directory fails. Someone else was faster.
+                if self.contains(key):
+                    return False
+                raise
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+        return True
+
+    def restore(self, key: str, output_dirpath: str, strategy: str = 'auto') -> List[str]:
+        """
+        Restores the cached outputs into **output_dirpath**. Existing files are never overwritten.
+
+        :return: The restored files relative to **output_dirpath**.
+        """
+        with open(os.path.join(self.path(key), _step_filename), 'r', encoding='utf-8') as f:
+            files = json.load(f)['files']
+
+        for relpath in files:
+            target = os.path.join(output_dirpath, relpath)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            materialize(os.path.join(self.path(key), relpath), target, strategy)
+        return files
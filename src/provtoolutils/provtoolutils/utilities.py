@@ -18,6 +18,21 @@ def calculate_data_hash(data):
     return datahash
 
 
+def calculate_file_hash(filepath, chunk_size=1024 * 1024):
+    """
+    Calculates the same hash as calculate_data_hash for the content of the given file without reading it into
+    memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+
+    return digest.hexdigest()
+
+
 def calculate_sign_hash(data):
     js = json.loads(data.decode(model_encoding))
     if 'signature' in js:
@@ -0,0 +1,158 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+
+from typing import Callable, Dict, List, Tuple
+
+# See: man inotify
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_event = struct.Struct('iIII')
+
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def available() -> bool:
+    """
+    True, if inotify can be used on this platform.
+    """
+    return _libc() is not None
+
+
+class Inotify:
+    """
+    Minimal wrapper around the inotify system calls of the C library.
+    """
+
+    def __init__(self):
+        self._libc = _libc()
+        if self._libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available on this platform')
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, int, str]]:
+        """
+        Waits up to **timeout** seconds for events.
+
+        :return: A list of (watch descriptor, mask, cookie, name) tuples.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if len(readable) == 0:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = _event.unpack_from(buffer, offset)
+            offset = offset + _event.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset = offset + length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirectoryWatcher:
+    """
+    Watches a directory tree in a background thread and calls **on_closed** with the path of each file, which is
+    closed after writing or moved into the tree. Subdirectories created later on are watched as well.
+
+    Files, which are written while a new subdirectory is not watched yet, or events lost due to a queue overflow are
+    not reported. Users must therefore check the directory once more after stopping the watcher.
+    """
+
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory: str, on_closed: Callable[[str], None], poll_interval: float = 0.2):
+        self.directory = directory
+        self.on_closed = on_closed
+        self.poll_interval = poll_interval
+        self.overflowed = False
+        self._inotify = Inotify()
+        self._watches: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._add_tree(directory)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _add_tree(self, directory: str):
+        for dirname, dirnames, filenames in os.walk(directory):
+            try:
+                self._watches[self._inotify.add_watch(dirname, self.mask)] = dirname
+            except FileNotFoundError:
+                continue
+
+    def start(self) -> 'DirectoryWatcher':
+        self._thread.start()
+        return self
+
+    def _handle(self, events):
+        for wd, mask, cookie, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            dirname = self._watches.get(wd)
+            if dirname is None:
+                continue
+            path = os.path.join(dirname, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.on_closed(path)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._handle(self._inotify.read(self.poll_interval))
+        # Events of files closed right before stopping.
+        events = self._inotify.read(0)
+        while len(events) > 0:
+            self._handle(events)
+            events = self._inotify.read(0)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+        self._inotify.close()
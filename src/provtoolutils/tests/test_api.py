@@ -0,0 +1,107 @@
+import io
+import json
+import jsonschema
+import os
+import pytest
+import tempfile
+
+from provtoolutils import api
+from provtoolutils.constants import model_encoding, prov_schema
+from provtoolutils.utilities import calculate_data_hash
+
+config = {
+    'agent': {
+        'type': 'software',
+        'creator': 'Max Mustermann',
+        'version': '-',
+        'label': 'Test script for automatic tests of the api',
+        'location': '-',
+        'acted_on_behalf_of': {
+            'given_name': 'Max',
+            'family_name': 'Mustermann',
+            'type': 'person'
+        }
+    },
+    'activity': {
+        'location': 'The current work station',
+        'label': 'Automatic tests for the api',
+        'means': 'Python steps record their provenance directly.'
+    }
+}
+
+agentinfo = {
+    'agent': {
+        'label': 'DLR',
+        'type': 'organization'
+    }
+}
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+def _read(base_dir, cid):
+    with open(os.path.join(base_dir, cid + '.prov'), 'rb') as f:
+        rawprov = f.read()
+    assert calculate_data_hash(rawprov) == cid
+    prov = json.loads(rawprov.decode(model_encoding))
+    jsonschema.validate(prov, prov_schema)
+    return prov
+
+
+def test_activity(base_dir):
+    config_filepath = os.path.join(base_dir, 'config.json')
+    with open(config_filepath, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    external = os.path.join(base_dir, 'external.txt')
+
+    with api.activity(config_filepath, agentinfo) as act:
+        act.use('1' * 64)
+        act.use(os.path.join(base_dir, '2' * 64 + '.prov'))
+        h1 = act.add_bytes(os.path.join(base_dir, 'bytes.txt'), b'bytes')
+        h2 = act.add_stream(os.path.join(base_dir, 'stream.txt'), io.BytesIO(b'stream' * 100000), chunk_size=1000)
+        with open(external, 'wb') as f:
+            f.write(b'external')
+        h3 = act.add_path(external)
+
+    assert h1 == calculate_data_hash(b'bytes')
+    assert h2 == calculate_data_hash(b'stream' * 100000)
+    assert h3 == calculate_data_hash(b'external')
+    assert len(act.written) == 3
+
+    activity_ids = set()
+    for path, cid in act.written.items():
+        prov = _read(base_dir, cid)
+        assert prov['entity']['self']['prov:label'] == os.path.basename(path)
+        with open(path, 'rb') as f:
+            assert calculate_data_hash(f.read()) == prov['entity']['self']['provtool:datahash']
+        assert {u['prov:entity'] for u in prov['used'].values()} == {'1' * 64, '2' * 64}
+        assert {a['prov:label'] for a in prov['agent'].values()} == \
+            {'Test script for automatic tests of the api', 'Max Mustermann', 'DLR'}
+        activity_ids.add(next(iter(prov['activity'])))
+    # All outputs were generated by the same activity.
+    assert len(activity_ids) == 1
+    assert not any([f.endswith('.tmp') for f in os.listdir(base_dir)])
+
+
+def test_activity_modified(base_dir):
+    path = os.path.join(base_dir, 'modified.txt')
+    with api.activity(json.dumps(config)) as act:
+        act.add_bytes(path, b'first')
+        with open(path, 'ab') as f:
+            f.write(b' and more')
+
+    prov = _read(base_dir, act.written[path])
+    assert prov['entity']['self']['provtool:datahash'] == calculate_data_hash(b'first and more')
+
+
+def test_activity_error(base_dir):
+    with pytest.raises(RuntimeError):
+        with api.activity(config) as act:
+            act.add_bytes(os.path.join(base_dir, 'partial.txt'), b'partial')
+            raise RuntimeError('failed')
+
+    assert os.listdir(base_dir) == ['partial.txt']
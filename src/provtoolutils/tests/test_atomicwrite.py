@@ -0,0 +1,84 @@
+import os
+import pytest
+import tempfile
+import threading
+
+from provtoolutils.atomicwrite import append_locked, FsyncBatch, write_atomic
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+def test_write_atomic(base_dir):
+    target = os.path.join(base_dir, 'target')
+    write_atomic(target, b'first')
+    write_atomic(target, b'second', fsync=False)
+
+    with open(target, 'rb') as f:
+        assert f.read() == b'second'
+    assert os.listdir(base_dir) == ['target']
+
+
+def test_batch(base_dir):
+    targets = [os.path.join(base_dir, f'target{i}') for i in range(3)]
+    with FsyncBatch() as batch:
+        for i, t in enumerate(targets):
+            batch.write(t, str(i).encode('utf-8'))
+        # Nothing is visible before the commit.
+        assert not any([os.path.exists(t) for t in targets])
+
+    for i, t in enumerate(targets):
+        with open(t, 'rb') as f:
+            assert f.read() == str(i).encode('utf-8')
+    assert sorted(os.listdir(base_dir)) == ['target0', 'target1', 'target2']
+
+
+def test_batch_abort(base_dir):
+    with pytest.raises(RuntimeError):
+        with FsyncBatch() as batch:
+            batch.write(os.path.join(base_dir, 'target'), b'data')
+            raise RuntimeError('failed')
+
+    assert os.listdir(base_dir) == []
+
+
+def test_batch_replace_fails(base_dir, monkeypatch):
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if dst.endswith('target1'):
+            raise OSError('failed')
+        replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    batch = FsyncBatch(fsync=False)
+    for i in range(3):
+        batch.write(os.path.join(base_dir, f'target{i}'), b'data')
+    with pytest.raises(OSError):
+        batch.commit()
+
+    # The files renamed before the failure stay, the temporary files of the others are removed.
+    assert os.listdir(base_dir) == ['target0']
+
+
+def test_append_locked(base_dir):
+    mapping = os.path.join(base_dir, 'mapping.txt')
+    line = 'x' * 10000
+
+    def append(n):
+        for i in range(50):
+            append_locked(mapping, f'{n}={line}\n', fsync=False)
+
+    threads = [threading.Thread(target=append, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with open(mapping, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 8 * 50
+    assert all([lin.split('=')[1] == line for lin in lines])
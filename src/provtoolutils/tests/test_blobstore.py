@@ -0,0 +1,97 @@
+import os
+import pytest
+import tempfile
+
+from provtoolutils.blobstore import blob_path, BlobStore
+from provtoolutils.utilities import calculate_data_hash
+
+data = b'Ijon Tichy ist ein allseits bekannter Raumfahrer.'
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def store(base_dir):
+    return BlobStore(os.path.join(base_dir, 'store'))
+
+
+@pytest.fixture
+def data_filepath(base_dir):
+    filepath = os.path.join(base_dir, 'data.txt')
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    return filepath
+
+
+def test_put(store, data_filepath):
+    datahash = store.put(data_filepath, 'cid1')
+
+    assert datahash == calculate_data_hash(data)
+    assert store.path(datahash) == blob_path(store.root, datahash)
+    with open(store.path(datahash), 'rb') as f:
+        assert f.read() == data
+    assert not os.access(store.path(datahash), os.W_OK) or os.geteuid() == 0
+
+    # The stored data is independent of the source.
+    with open(data_filepath, 'ab') as f:
+        f.write(b'modified')
+    with open(store.path(datahash), 'rb') as f:
+        assert f.read() == data
+
+
+def test_put_wrong_hash(store, data_filepath):
+    with pytest.raises(ValueError):
+        store.put(data_filepath, 'cid1', calculate_data_hash(b'other'))
+    assert not store.contains(calculate_data_hash(b'other'))
+
+
+def test_refcount(store, data_filepath):
+    datahash = store.put(data_filepath, 'cid1')
+    assert store.put_bytes(data, 'cid2') == datahash
+    store.add_ref(datahash, 'cid2')
+    assert store.refcount(datahash) == 2
+
+    assert not store.release(datahash, 'cid1')
+    assert store.contains(datahash)
+    assert store.release(datahash, 'cid2')
+    assert not store.contains(datahash)
+    assert store.refcount(datahash) == 0
+
+    with pytest.raises(ValueError):
+        store.add_ref(datahash, 'cid3')
+
+
+def test_materialize(store, base_dir):
+    datahash = store.put_bytes(data, 'cid1')
+    target = os.path.join(base_dir, 'target.txt')
+    store.materialize(datahash, target, 'hardlink')
+
+    assert os.stat(target).st_ino == os.stat(store.path(datahash)).st_ino
+    with pytest.raises(ValueError):
+        store.materialize(calculate_data_hash(b'other'), os.path.join(base_dir, 'other.txt'))
+
+
+def test_deduplicate(store, data_filepath):
+    datahash = store.put(data_filepath, 'cid1')
+
+    assert store.deduplicate(data_filepath, datahash) == 'hardlink'
+    assert os.stat(data_filepath).st_ino == os.stat(store.path(datahash)).st_ino
+    with open(data_filepath, 'rb') as f:
+        assert f.read() == data
+    assert [f for f in os.listdir(os.path.dirname(data_filepath)) if f.endswith('.tmp')] == []
+
+
+def test_collect(store, data_filepath):
+    datahash = store.put(data_filepath, 'cid1')
+    store.add_ref(datahash, 'cid2')
+    other = store.put_bytes(b'other', 'cid3')
+
+    assert store.collect(['cid2']) == 1
+    assert store.refcount(datahash) == 1
+    assert not store.contains(other)
+    assert store.collect([]) == 1
+    assert not store.contains(datahash)
@@ -0,0 +1,215 @@
+import datetime
+import os
+import pytest
+import subprocess
+import sys
+import tempfile
+
+from provtoolutils.catalog import utc, Catalog, catalog_filename
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+def test_catalog(base_dir):
+    catalog = Catalog.in_directory(base_dir)
+    assert os.path.exists(os.path.join(base_dir, catalog_filename))
+
+    path = os.path.join(base_dir, 'a.txt')
+    first = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    catalog.add([(path, '1' * 64, 'a' * 64), (os.path.join(base_dir, 'b.txt'), '2' * 64, 'a' * 64)], first)
+    catalog.add([(path, '3' * 64, 'c' * 64)])
+
+    assert [e['cid'] for e in catalog.lookup(path)] == ['3' * 64, '1' * 64]
+    assert catalog.lookup(path)[1] == {'path': path, 'cid': '1' * 64, 'datahash': 'a' * 64,
+                                       'time': utc(first)}
+    assert [e['path'] for e in catalog.by_datahash('a' * 64)] == [path, os.path.join(base_dir, 'b.txt')]
+    assert catalog.by_cid('3' * 64)[0]['datahash'] == 'c' * 64
+    assert catalog.lookup(os.path.join(base_dir, 'missing.txt')) == []
+
+    # Relative paths are recorded and looked up as absolute paths.
+    cwd = os.getcwd()
+    try:
+        os.chdir(base_dir)
+        assert [e['cid'] for e in Catalog(catalog_filename).lookup('a.txt')] == ['3' * 64, '1' * 64]
+    finally:
+        os.chdir(cwd)
+
+
+def test_migrate(base_dir):
+    from provtoolutils.catalog import mapping_filename, migrate
+    from provtoolutils.model import make_provstring, Activity, Entity, Person
+    from provtoolutils.utilities import calculate_data_hash
+
+    os.makedirs(os.path.join(base_dir, 'sub'))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cids = {}
+    for relpath in ['a=1.txt', 'b.txt', os.path.join('sub', 'c.txt')]:
+        rawprov = make_provstring(os.path.basename(relpath), Entity.FILE, Person('Max', 'Mustermann'),
+                                  Activity(now, now, '-', '-', '-'), calculate_data_hash(relpath.encode('utf-8')))
+        cids[relpath] = calculate_data_hash(rawprov)
+        with open(os.path.join(base_dir, os.path.dirname(relpath), cids[relpath] + '.prov'), 'wb') as f:
+            f.write(rawprov)
+
+    # Older versions wrote the entries without separator.
+    with open(os.path.join(base_dir, mapping_filename), 'w', encoding='utf-8') as f:
+        f.write(''.join([f'{os.path.join(base_dir, p)}={cids[p]}.prov' for p in ['a=1.txt', 'b.txt']]))
+        f.write(f'{os.path.join(base_dir, "missing.txt")}={"0" * 64}.prov')
+    with open(os.path.join(base_dir, 'sub', mapping_filename), 'w', encoding='utf-8') as f:
+        f.write(f'{os.path.join(base_dir, "sub", "c.txt")}={cids[os.path.join("sub", "c.txt")]}.prov\n')
+
+    assert migrate(base_dir) == 3
+    assert migrate(base_dir) == 3
+
+    entries = Catalog.in_directory(base_dir).entries()
+    assert [(e['path'], e['cid']) for e in entries] == [(os.path.join(base_dir, p), cids[p])
+                                                        for p in ['a=1.txt', 'b.txt']]
+    assert entries[1]['datahash'] == calculate_data_hash(b'b.txt')
+    found = Catalog.in_directory(os.path.join(base_dir, 'sub')).lookup(os.path.join(base_dir, 'sub', 'c.txt'))
+    assert [e['cid'] for e in found] == [cids[os.path.join('sub', 'c.txt')]]
+
+
+def test_integration(base_dir):
+    path = os.path.join(base_dir, 'a.txt')
+    Catalog.in_directory(base_dir).add([(path, '1' * 64, 'a' * 64)])
+
+    result = subprocess.run([sys.executable, '-m', 'provtoolutils.catalog', 'lookup', '--path', path],
+                            stdout=subprocess.PIPE, check=True)
+    assert result.stdout.decode('utf-8').split('\t')[:3] == [path, '1' * 64, 'a' * 64]
+
+    result = subprocess.run([sys.executable, '-m', 'provtoolutils.catalog', 'lookup', '--cid', '2' * 64,
+                             '--directory', base_dir], stdout=subprocess.PIPE)
+    assert result.returncode == 1
+    assert result.stdout == b''
+
+
+def _write_container(directory, name, author, end, location, used=None):
+    from provtoolutils.model import make_provstring, Activity, Entity
+    from provtoolutils.utilities import calculate_data_hash
+
+    rawprov = make_provstring(name, Entity.FILE, author, Activity(end, end, location, 'Measure', '-', used=used),
+                              calculate_data_hash(name.encode('utf-8')))
+    cid = calculate_data_hash(rawprov)
+    with open(os.path.join(directory, cid + '.prov'), 'wb') as f:
+        f.write(rawprov)
+    return cid, rawprov
+
+
+def test_query(base_dir):
+    from provtoolutils.catalog import container_metadata
+    from provtoolutils.model import Person
+    from provtoolutils.utilities import calculate_data_hash
+
+    max_ = Person('Max', 'Mustermann')
+    erika = Person('Erika', 'Mustermann', acted_on_behalf_of=Person('Max', 'Mustermann'))
+    jan = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+    feb = datetime.datetime(2021, 2, 1, tzinfo=datetime.timezone.utc)
+    a, rawa = _write_container(base_dir, 'a.txt', max_, jan, 'Lab')
+    b, rawb = _write_container(base_dir, 'b.txt', erika, feb, 'Office', used=[a])
+
+    catalog = Catalog.in_directory(base_dir)
+    catalog.add([(os.path.join(base_dir, 'a.txt'), a, calculate_data_hash(b'a.txt'))],
+                metadata=[container_metadata(rawa, os.path.join(base_dir, a + '.prov'))])
+    catalog.index([container_metadata(rawb, os.path.join(base_dir, b + '.prov'))])
+
+    def cids(**criteria):
+        return [m['cid'] for m in catalog.query(**criteria)]
+
+    assert cids() == [a, b]
+    assert cids(agent='Max Mustermann') == [a, b]
+    assert cids(agent='Erika Mustermann') == [b]
+    assert cids(agent='Nobody') == []
+    assert cids(since='2021-01-15') == [b]
+    assert cids(until='2021-02-01T00:00:00Z') == [a, b]
+    assert cids(until='2021-01-31T23:59:59+00:00') == [a]
+    assert cids(since=jan, until=jan) == [a]
+    assert cids(datahash=calculate_data_hash(b'b.txt')) == [b]
+    assert cids(location='Lab', agent='Max Mustermann') == [a]
+    assert cids(location='Lab', since='2021-01-15') == []
+
+    found = catalog.metadata(b)
+    assert found['container'] == os.path.join(base_dir, b + '.prov')
+    assert found['label'] == 'b.txt'
+    assert found['end'] == '2021-02-01T00:00:00.000000+00:00'
+    assert found['agents'] == ['Erika Mustermann', 'Max Mustermann']
+    assert found['used'] == [a]
+    assert catalog.metadata('0' * 64) is None
+
+
+def test_query_uses_indexes(base_dir):
+    catalog = Catalog.in_directory(base_dir)
+    with catalog._connect() as conn:
+        for criteria in [{'agent': 'Max Mustermann'}, {'datahash': 'a' * 64}, {'since': utc('2021-01-01')},
+                         {'location': 'Lab', 'since': utc('2021-01-01')}]:
+            sql, params = catalog._query_sql(**criteria)
+            plan = [str(r[-1]) for r in conn.execute('explain query plan ' + sql, params)]
+            # The containers are searched by an index, not scanned.
+            assert all(step.startswith('SEARCH') for step in plan if 'containers' in step), plan
+
+
+def test_index_directory(base_dir):
+    from provtoolutils.catalog import index_directory
+    from provtoolutils.model import Person
+
+    os.makedirs(os.path.join(base_dir, 'sub'))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    a, _ = _write_container(base_dir, 'a.txt', Person('Max', 'Mustermann'), now, 'Lab')
+    b, _ = _write_container(os.path.join(base_dir, 'sub'), 'b.txt', Person('Max', 'Mustermann'), now, 'Lab')
+    with open(os.path.join(base_dir, 'invalid.prov'), 'wb') as f:
+        f.write(b'no container')
+
+    assert index_directory(base_dir, jobs=2) == 2
+    assert index_directory(base_dir, jobs=2) == 2
+    assert sorted(m['cid'] for m in Catalog.in_directory(base_dir).query(location='Lab')) == sorted([a, b])
+
+    result = subprocess.run([sys.executable, '-m', 'provtoolutils.catalog', 'query', '--agent', 'Max Mustermann',
+                             '--directory', base_dir], stdout=subprocess.PIPE, check=True)
+    lines = result.stdout.decode('utf-8').splitlines()
+    assert sorted(line.split('\t')[0] for line in lines) == sorted([os.path.join(base_dir, a + '.prov'),
+                                                                    os.path.join(base_dir, 'sub', b + '.prov')])
+
+
+def _metadata(cid, used, end):
+    return {'cid': cid, 'container': f'/results/{cid}.prov', 'label': cid, 'type': 'file', 'datahash': 'a' * 64,
+            'activity': 'activity', 'activity_label': 'Measure', 'location': 'Lab', 'start': utc(end),
+            'end': utc(end), 'agents': ['Max Mustermann'], 'used': used}
+
+
+def test_impact(base_dir):
+    catalog = Catalog.in_directory(base_dir)
+    # a <- b <- c, a <- d <- c (diamond), e unrelated, f <-> g (cycle) below c.
+    catalog.index([_metadata('a', [], '2021-01-01'), _metadata('b', ['a'], '2021-01-02'),
+                   _metadata('d', ['a'], '2021-01-03'), _metadata('c', ['b', 'd'], '2021-01-04'),
+                   _metadata('e', ['x'], '2021-01-05'), _metadata('f', ['c', 'g'], '2021-01-06'),
+                   _metadata('g', ['f'], '2021-01-07')])
+
+    assert [m['cid'] for m in catalog.impact('a')] == ['b', 'd', 'c', 'f', 'g']
+    assert [m['cid'] for m in catalog.impact('c')] == ['f', 'g']
+    assert [m['cid'] for m in catalog.impact('f')] == ['g']
+    assert catalog.impact('e') == []
+    assert catalog.impact('unknown') == []
+    assert catalog.impact('b')[0]['container'] == '/results/c.prov'
+
+    result = subprocess.run([sys.executable, '-m', 'provtoolutils.catalog', 'impact', 'd', '--directory', base_dir],
+                            stdout=subprocess.PIPE, check=True)
+    assert [line.split('\t')[0] for line in result.stdout.decode('utf-8').splitlines()] == \
+        ['/results/c.prov', '/results/f.prov', '/results/g.prov']
+
+
+def test_impact_uses_index(base_dir):
+    catalog = Catalog.in_directory(base_dir)
+    # A long chain with a side branch at each container.
+    count = 10000
+    catalog.index([_metadata(f'{i}', [f'{i - 1}'] if i > 0 else [], '2021-01-01') for i in range(count)] +
+                  [_metadata(f'side{i}', [f'{i}'], '2021-01-02') for i in range(count)])
+
+    assert len(catalog.impact(f'{count - 10}')) == 9 + 10
+    assert len(catalog.impact('0')) == 2 * count - 1
+    with catalog._connect() as conn:
+        plan = [str(r[-1]) for r in conn.execute('explain query plan with recursive d(cid) as (select cid from used '
+                                                 'where used = ? union select used.cid from used join d on '
+                                                 'used.used = d.cid) select cid from d', ('0',))]
+    assert all('used_used' in step for step in plan if 'used' in step.split()), plan
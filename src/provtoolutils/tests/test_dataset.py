@@ -0,0 +1,72 @@
+import os
+import pytest
+import tempfile
+
+from provtoolutils import dataset
+from provtoolutils.utilities import calculate_data_hash
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+def _write(base_dir, files):
+    for relpath, content in files.items():
+        filepath = os.path.join(base_dir, *relpath.split('/'))
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as f:
+            f.write(content)
+
+
+def test_merkle_root():
+    entries = [{'path': f'f{i}', 'size': i, 'hash': calculate_data_hash(str(i).encode('utf-8'))} for i in range(5)]
+    root = dataset.merkle_root(entries)
+
+    assert dataset.merkle_root(list(reversed(entries))) == root
+    assert dataset.merkle_root(entries[:4]) != root
+    assert dataset.merkle_root([]) == calculate_data_hash(b'')
+    for field, value in [('path', 'other'), ('size', 99), ('hash', '0' * 64)]:
+        changed = [dict(e) for e in entries]
+        changed[2][field] = value
+        assert dataset.merkle_root(changed) != root
+
+
+def test_build_manifest(base_dir):
+    _write(base_dir, {'a.txt': b'a', 'sub/b.txt': b'bb', 'sub/deeper/c.txt': b'ccc'})
+
+    entries = dataset.build_manifest(base_dir, jobs=2)
+
+    assert entries == [
+        {'path': 'a.txt', 'size': 1, 'hash': calculate_data_hash(b'a')},
+        {'path': 'sub/b.txt', 'size': 2, 'hash': calculate_data_hash(b'bb')},
+        {'path': 'sub/deeper/c.txt', 'size': 3, 'hash': calculate_data_hash(b'ccc')}
+    ]
+    data = dataset.manifest_bytes(entries)
+    assert dataset.read_manifest(data, dataset.merkle_root(entries)) == entries
+    with pytest.raises(ValueError):
+        dataset.read_manifest(data, '0' * 64)
+
+    # Hashes of unchanged files are taken over.
+    st = os.stat(os.path.join(base_dir, 'a.txt'))
+    prehashed = {os.path.join(base_dir, 'a.txt'): (st.st_size, st.st_mtime_ns, 'known')}
+    assert dataset.build_manifest(base_dir, prehashed=prehashed)[0]['hash'] == 'known'
+
+
+def test_verify_members(base_dir):
+    _write(base_dir, {'a.txt': b'a', 'sub/b.txt': b'bb'})
+    entries = dataset.build_manifest(base_dir)
+    dataset.verify_members(entries, base_dir)
+
+    _write(base_dir, {'sub/b.txt': b'xx', 'extra.txt': b''})
+    os.remove(os.path.join(base_dir, 'a.txt'))
+    with pytest.raises(ValueError) as e:
+        dataset.verify_members(entries, base_dir)
+    message = str(e.value)
+    assert 'a.txt: missing' in message
+    assert 'extra.txt: not in manifest' in message
+    assert 'sub/b.txt: modified' in message
+
+    with pytest.raises(ValueError):
+        dataset.verify_members(entries, os.path.join(base_dir, 'missing'))
@@ -1,4 +1,5 @@
 import datetime
+import dateutil.parser
 import glob
 import json
 import jsonschema
@@ -6,9 +7,12 @@ import os
 import pytest
 import re
 import shutil
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 
 if sys.version_info < (3, 10):
     from importlib_metadata import entry_points
@@ -21,6 +25,7 @@ from subprocess import PIPE
 
 from collections import namedtuple
 
+from provtoolutils.blobstore import blob_path
 from provtoolutils.constants import prov_schema, model_encoding
 from provtoolutils.directorywrapper import DirectoryWrapper
 from provtoolutils.utilities import calculate_data_hash
@@ -640,6 +645,146 @@ def test_prov2plain(config_filepath, reference_dir):
     with pytest.raises(Exception):
         used = dw.prov2plain(corruptfiledirpath)
 
+def test_prov2plain_jobs(config_filepath, reference_dir):
+    testfiledirpath = os.path.join(reference_dir, 'prov2plain')
+    dw = DirectoryWrapper(None, None)
+    plained = dw.prov2plain(testfiledirpath, jobs=1)
+
+    assert len(plained) == 3
+
+    duplicates_filedirpath = os.path.join(reference_dir, 'duplicates')
+    with pytest.raises(ValueError) as e:
+        dw.prov2plain(duplicates_filedirpath, jobs=4)
+    assert '1 of 2 items failed' in str(e.value)
+
+def test_prov2plain_hardlink(config_filepath, reference_dir):
+    testfiledirpath = os.path.join(reference_dir, 'integration')
+    dw = DirectoryWrapper(None, None)
+    plained = dw.prov2plain(testfiledirpath, strategy='hardlink')
+
+    assert plained == {'751e9fe9fa9960259fb082a57d39461878d602b77eedd6bb5bdcaa1828b64034'}
+    datafilepath = os.path.join(testfiledirpath, 'aa1db5c660d3d1f3f4f9361b9848694300929be94b74c84452a87420c59e5df9')
+    assert os.stat(os.path.join(testfiledirpath, 'testfile2.txt')).st_ino == os.stat(datafilepath).st_ino
+
+def test_prov2plain_modified_data(config_filepath, reference_dir):
+    testfiledirpath = os.path.join(reference_dir, 'integration')
+    datafilepath = os.path.join(testfiledirpath, 'aa1db5c660d3d1f3f4f9361b9848694300929be94b74c84452a87420c59e5df9')
+    with open(datafilepath, 'ab') as f:
+        f.write(b'modified')
+    dw = DirectoryWrapper(None, None)
+    with pytest.raises(ValueError):
+        dw.prov2plain(testfiledirpath)
+    assert not os.path.exists(os.path.join(testfiledirpath, 'testfile2.txt'))
+
+def test_blobstore(config_filepath, base_dir):
+    blobstore = os.path.join(base_dir, 'store')
+    outdir = os.path.join(base_dir, 'out')
+    os.makedirs(os.path.join(outdir, 'sub'))
+    for name in [os.path.join(outdir, 'result1.txt'), os.path.join(outdir, 'sub', 'result2.txt')]:
+        with open(name, 'w') as f:
+            f.write(teststring1)
+
+    dw = DirectoryWrapper(None, config_filepath, blobstore=blobstore)
+    dw.run_out(None, outdir, '2019-12-30T23:55:00+00:00', '2019-12-31T15:16:17+00:00')
+
+    datahash = calculate_data_hash(teststring1.encode('utf-8'))
+    assert dw.blobstore.refcount(datahash) == 2
+    assert len([f for f in os.listdir(os.path.join(blobstore, datahash[:2])) if not f.startswith('.')]) == 1
+    # The outputs are links to the stored data.
+    assert os.stat(os.path.join(outdir, 'result1.txt')).st_ino == os.stat(blob_path(blobstore, datahash)).st_ino
+    assert os.stat(os.path.join(outdir, 'sub', 'result2.txt')).st_ino == \
+        os.stat(blob_path(blobstore, datahash)).st_ino
+
+    # Incremental runs take the links for unchanged.
+    incremental_outdir = os.path.join(base_dir, 'incremental')
+    os.mkdir(incremental_outdir)
+    with open(os.path.join(incremental_outdir, 'result.txt'), 'w') as f:
+        f.write(teststring1)
+    for _ in range(2):
+        dw.run_out(None, incremental_outdir, '2019-12-30T23:55:00+00:00', '2019-12-31T15:16:17+00:00',
+                   incremental=True)
+    assert len(glob.glob(os.path.join(incremental_outdir, '*.prov'))) == 1
+    assert dw.blobstore.refcount(datahash) == 3
+
+    # Unpack containers without any data next to them.
+    indir = os.path.join(base_dir, 'in')
+    os.mkdir(indir)
+    for f in glob.glob(os.path.join(outdir, '*.prov')):
+        shutil.copy(f, indir)
+    plained = DirectoryWrapper(blobstore=blobstore).prov2plain(indir)
+    assert len(plained) == 1
+    with open(os.path.join(indir, 'result1.txt')) as f:
+        assert f.read() == teststring1
+
+def test_directory_entities(config_filepath, base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    os.makedirs(os.path.join(outdir, 'results', 'step1'))
+    files = {os.path.join(outdir, 'summary.txt'): 'summary',
+             os.path.join(outdir, 'results', 'a.dat'): 'a',
+             os.path.join(outdir, 'results', 'step1', 'b.dat'): 'b'}
+    for name, content in files.items():
+        with open(name, 'w') as f:
+            f.write(content)
+
+    dw = DirectoryWrapper(None, config_filepath, directory_entities=True)
+    dw.run_out(None, outdir, '2019-12-30T23:55:00+00:00', '2019-12-31T15:16:17+00:00')
+
+    # One container for the file and one for the directory, none within the directory.
+    prov_files = glob.glob(os.path.join(outdir, '**', '*.prov'), recursive=True)
+    assert len(prov_files) == 2
+    types = {}
+    for pf in prov_files:
+        pr, dr, err = read_provanddata({'directory': outdir}, os.path.basename(pf).replace('.prov', ''))
+        assert not err
+        entity = json.loads(pr.decode(model_encoding))['entity']['self']
+        types[entity['prov:label']] = entity['prov:type']
+        if entity['prov:type'] == 'Directory':
+            assert [e['path'] for e in json.loads(dr)['files']] == ['a.dat', 'step1/b.dat']
+    assert types == {'summary.txt': 'File', 'results': 'Directory'}
+
+    # Used as input, the directory is verified as a whole.
+    used = DirectoryWrapper(None, None).prov2plain(outdir, extract=False)
+    assert len(used) == 2
+    with open(os.path.join(outdir, 'results', 'a.dat'), 'a') as f:
+        f.write('modified')
+    with pytest.raises(ValueError) as e:
+        DirectoryWrapper(None, None).prov2plain(outdir, extract=False)
+    assert 'a.dat: modified' in str(e.value.__cause__)
+
+
+def test_directory_entities_blobstore(config_filepath, base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    os.makedirs(os.path.join(outdir, 'results'))
+    with open(os.path.join(outdir, 'results', 'a.dat'), 'w') as f:
+        f.write('a')
+
+    blobstore = os.path.join(base_dir, 'store')
+    dw = DirectoryWrapper(None, config_filepath, blobstore=blobstore, directory_entities=True)
+    dw.run_out(None, outdir, '2019-12-30T23:55:00+00:00', '2019-12-31T15:16:17+00:00')
+
+    pf = glob.glob(os.path.join(outdir, '*.prov'))[0]
+    pr, dr, err = read_provanddata({'directory': outdir, 'blobstore': blobstore},
+                                   os.path.basename(pf).replace('.prov', ''))
+    assert not err
+    assert [e['path'] for e in json.loads(dr)['files']] == ['a.dat']
+    assert len(DirectoryWrapper(None, None, blobstore=blobstore).prov2plain(outdir, extract=False)) == 1
+
+
+def test_directory_entities_incremental(config_filepath, base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    os.makedirs(os.path.join(outdir, 'results'))
+    with open(os.path.join(outdir, 'results', 'a.dat'), 'w') as f:
+        f.write('a')
+
+    dw = DirectoryWrapper(None, config_filepath, directory_entities=True)
+    for _ in range(2):
+        dw.run_out(None, outdir, '2019-12-30T23:55:00+00:00', '2019-12-31T15:16:17+00:00', incremental=True)
+
+    # Neither the manifest nor the container of the first run are wrapped as files.
+    assert len(glob.glob(os.path.join(outdir, '*.prov'))) == 1
+    assert len(glob.glob(os.path.join(outdir, 'results', '*.prov'))) == 0
+
+
 def test_prov2plain_duplicateexception(config_filepath, reference_dir):
     duplicates_filedirpath = os.path.join(reference_dir, 'duplicates')
     dw = DirectoryWrapper(None, None)
@@ -678,3 +823,214 @@ def test_parse_agentinfo_extended_file(agentinfo_extended_filepath):
         o = p.acted_on_behalf_of
         assert o is not None
         assert o.name == 'DLR'
+
+
+def test_incremental_output(config_filepath, base_dir):
+    out_dir = os.path.join(base_dir, 'test_incremental_output')
+    os.mkdir(out_dir)
+    with open(os.path.join(out_dir, 't1'), 'w') as f:
+        f.write('t1')
+    with open(os.path.join(out_dir, 't2'), 'w') as f:
+        f.write('t2')
+
+    startend = datetime.datetime.strftime(datetime.datetime.now(datetime.timezone.utc), '%Y-%m-%dT%H:%M:%S%z')
+    dw = DirectoryWrapper(None, config_filepath)
+    dw.run_out(None, out_dir, startend, startend, incremental=True)
+
+    first_run = {f for f in os.listdir(out_dir) if f.endswith('.prov')}
+    assert len(first_run) == 2
+    with open(os.path.join(out_dir, 'provtool_manifest.json'), 'r') as f:
+        manifest = json.load(f)['files']
+    assert sorted(manifest.keys()) == ['t1', 't2']
+    assert {e['cid'] + '.prov' for e in manifest.values()} == first_run
+
+    # Nothing changed: Neither the plain files nor the containers of the first run are wrapped again.
+    dw.run_out(None, out_dir, startend, startend, incremental=True)
+    assert {f for f in os.listdir(out_dir) if f.endswith('.prov')} == first_run
+
+    with open(os.path.join(out_dir, 't2'), 'w') as f:
+        f.write('t2 modified')
+    with open(os.path.join(out_dir, 't3'), 'w') as f:
+        f.write('t3')
+    dw.run_out(None, out_dir, startend, startend, incremental=True)
+
+    third_run = {f for f in os.listdir(out_dir) if f.endswith('.prov')}
+    assert len(third_run - first_run) == 2
+    with open(os.path.join(out_dir, 'provtool_manifest.json'), 'r') as f:
+        manifest = json.load(f)['files']
+    assert sorted(manifest.keys()) == ['t1', 't2', 't3']
+    assert manifest['t2']['hash'] == calculate_data_hash(b't2 modified')
+
+    # The container of the first version of t2 is no output. It is kept, but not wrapped.
+    dw.run_out(None, out_dir, startend, startend, incremental=True)
+    assert {f for f in os.listdir(out_dir) if f.endswith('.prov')} == third_run
+    with open(os.path.join(out_dir, 'provtool_manifest.json'), 'r') as f:
+        content = json.load(f)
+    assert sorted(content['files'].keys()) == ['t1', 't2', 't3']
+    assert len(content['superseded']) == 1
+    assert content['superseded'][0] in first_run
+
+
+def test_run_exec(config_filepath, prov_input_filepath, base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    script = ('import os, sys; '
+              'open(os.path.join(sys.argv[1], "result1.txt"), "w").write("1"); '
+              'os.makedirs(os.path.join(sys.argv[1], "sub")); '
+              'open(os.path.join(sys.argv[1], "sub", "result2.txt"), "w").write("2"); '
+              'sys.exit(3)')
+    before = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    dw = DirectoryWrapper(None, config_filepath)
+    returncode = dw.run_exec(os.path.dirname(prov_input_filepath), outdir, [sys.executable, '-c', script, outdir])
+
+    assert returncode == 3
+    assert os.path.exists(os.path.join(base_dir, 'test.txt'))
+    prov_files = glob.glob(os.path.join(outdir, '**', '*.prov'), recursive=True)
+    assert len(prov_files) == 2
+    for pf in prov_files:
+        with open(pf, 'rb') as f:
+            prov = json.loads(f.read().decode(model_encoding))
+        activity = next(iter(prov['activity'].values()))
+        assert dateutil.parser.parse(activity['prov:startTime']) >= before
+        assert activity['resources:exitStatus'] == {'$': '3', 'type': 'xsd:int'}
+        assert 'resources:cpuUserTime' in activity
+        assert prov['used'][next(iter(prov['used']))]['prov:entity'] == \
+            os.path.basename(prov_input_filepath).replace('.prov', '')
+        entity = prov['entity']['self']
+        with open(os.path.join(os.path.dirname(pf), entity['prov:label']), 'rb') as f:
+            assert calculate_data_hash(f.read()) == entity['provtool:datahash']
+
+
+def test_integration_exec(config_filepath, prov_input_filepath, base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    return_code = subprocess.call([sys.executable, '-m', 'provtoolutils.directorywrapper', 'exec',
+                                   '--configfile', config_filepath, '--inputdir', os.path.dirname(prov_input_filepath),
+                                   '--outputdir', outdir, '--',
+                                   sys.executable, '-c', f'open("{outdir}/result.txt", "w").write("1")'])
+    assert return_code == 0
+    assert len(glob.glob(os.path.join(outdir, '*.prov'))) == 1
+
+    return_code = subprocess.call([sys.executable, '-m', 'provtoolutils.directorywrapper', 'exec',
+                                   '--configfile', config_filepath, '--outputdir', outdir, '--',
+                                   sys.executable, '-c', 'import sys; sys.exit(5)'])
+    assert return_code == 5
+
+
+def test_integration_stepcache_without_exec(config_filepath, prov_input_filepath, base_dir):
+    process = subprocess.run([sys.executable, '-m', 'provtoolutils.directorywrapper', '--stepcache',
+                              os.path.join(base_dir, 'cache'), '--inputdir', os.path.dirname(prov_input_filepath)],
+                             stderr=subprocess.PIPE)
+    assert process.returncode == 2
+    assert b'--stepcache is only supported with exec' in process.stderr
+
+
+def test_run_watch(config_filepath, prov_input_filepath, base_dir, monkeypatch):
+    from provtoolutils import directorywrapper, watch
+
+    outdir = os.path.join(base_dir, 'out')
+    hashed = []
+
+    def calculate_file_hash(filepath, *args):
+        hashed.append(filepath)
+        with open(filepath, 'rb') as f:
+            return calculate_data_hash(f.read())
+    monkeypatch.setattr(directorywrapper, 'calculate_file_hash', calculate_file_hash)
+
+    stop = threading.Event()
+    dw = DirectoryWrapper(None, config_filepath)
+    watcher = threading.Thread(target=dw.run_watch, args=(os.path.dirname(prov_input_filepath), outdir, stop))
+    watcher.start()
+
+    # The watcher starts asynchronously. Write files until one of them is hashed before the end of the activity.
+    written = []
+    for i in range(50):
+        os.makedirs(outdir, exist_ok=True)
+        written.append(os.path.join(outdir, f'step{i}.txt'))
+        with open(written[-1], 'w') as f:
+            f.write(str(i))
+        time.sleep(0.1)
+        if not watch.available() or len([h for h in hashed if h in written]) > 0:
+            break
+    in_advance = [h for h in hashed if h in written]
+    before_stop = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    stop.set()
+    watcher.join()
+
+    if watch.available():
+        assert len(in_advance) > 0
+        # Files hashed while watching are not hashed again.
+        for pf in in_advance:
+            assert hashed.count(pf) == 1
+    prov_files = glob.glob(os.path.join(outdir, '*.prov'))
+    assert len(prov_files) == len(written)
+    for pf in prov_files:
+        with open(pf, 'rb') as f:
+            prov = json.loads(f.read().decode(model_encoding))
+        activity = next(iter(prov['activity'].values()))
+        assert dateutil.parser.parse(activity['prov:endTime']) >= before_stop
+        assert prov['used'][next(iter(prov['used']))]['prov:entity'] == \
+            os.path.basename(prov_input_filepath).replace('.prov', '')
+
+
+def test_integration_watch(config_filepath, prov_input_filepath, base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    process = subprocess.Popen([sys.executable, '-m', 'provtoolutils.directorywrapper', 'watch',
+                                '--configfile', config_filepath, '--inputdir', os.path.dirname(prov_input_filepath),
+                                '--outputdir', outdir])
+    deadline = time.monotonic() + 10
+    while not os.path.exists(outdir):
+        if time.monotonic() > deadline or process.poll() is not None:
+            process.kill()
+            process.wait()
+            pytest.fail('The watcher did not create the output directory')
+        time.sleep(0.05)
+    with open(os.path.join(outdir, 'result.txt'), 'w') as f:
+        f.write('1')
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait() == 0
+    assert len(glob.glob(os.path.join(outdir, '*.prov'))) == 1
+
+
+def test_run_exec_stepcache(config_filepath, prov_input_filepath, base_dir, monkeypatch):
+    from provtoolutils import directorywrapper
+
+    with open(prov_input_filepath, 'rb') as f:
+        input_container = f.read()
+    hashed = []
+    original_hash = directorywrapper.calculate_data_hash
+
+    def calculate_data_hash(data):
+        hashed.append(data)
+        return original_hash(data)
+
+    monkeypatch.setattr(directorywrapper, 'calculate_data_hash', calculate_data_hash)
+    counter = os.path.join(base_dir, 'counter')
+    script = ('import os, sys; '
+              f'open("{counter}", "a").write("x"); '
+              'open(os.path.join(sys.argv[1], "result.txt"), "w").write("result")')
+    stepcache = os.path.join(base_dir, 'cache')
+
+    def run(name, *args):
+        indir = os.path.join(base_dir, 'in' + name)
+        os.mkdir(indir)
+        shutil.copy(prov_input_filepath, indir)
+        shutil.copy(os.path.join(base_dir, calculate_data_hash(teststring1.encode('utf-8'))), indir)
+        outdir = os.path.join(base_dir, 'out' + name)
+        dw = DirectoryWrapper(None, config_filepath, stepcache=stepcache)
+        assert dw.run_exec(indir, outdir, [sys.executable, '-c', script, outdir] + list(args)) == 0
+        return outdir
+
+    outdirs = [run('1'), run('2')]
+    with open(counter) as f:
+        assert f.read() == 'x'
+    # The inputs were hashed for the key. They are not hashed again while unpacking.
+    assert input_container not in hashed
+    assert sorted(os.listdir(outdirs[0])) == sorted(os.listdir(outdirs[1]))
+    # The inputs are not unpacked, if the outputs are restored.
+    assert not os.path.exists(os.path.join(base_dir, 'in2', 'test.txt'))
+
+    # A different command is a different step.
+    run('3', 'other')
+    with open(counter) as f:
+        assert f.read() == 'xx'
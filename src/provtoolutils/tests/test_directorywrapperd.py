@@ -0,0 +1,165 @@
+import datetime
+import os
+import pytest
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+from distutils import dir_util
+from pathlib import Path
+from subprocess import PIPE
+
+from provtoolutils.directorywrapperc import send_request
+from provtoolutils.directorywrapperd import DirectoryWrapperDaemon
+
+config = '''{
+   "agent": {
+       "type": "software",
+       "creator": "Max Mustermann",
+       "version": "-",
+       "label": "Test script for automatic tests of DirectoryWrapperDaemon",
+       "location": "-",
+       "acted_on_behalf_of": {
+           "given_name": "Max",
+           "family_name": "Mustermann",
+           "type": "person"
+       }
+   },
+   "activity": {
+       "location": "The current work station",
+       "label": "Automatic tests for DirectoryWrapperDaemon",
+       "means": "Testing"
+   }
+}'''
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def ref_tmpdir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def reference_dir(ref_tmpdir, request):
+    filename = request.module.__file__
+    data_dir = Path(filename).with_name('test_directorywrapper')
+
+    if os.path.exists(data_dir):
+        dir_util.copy_tree(data_dir, str(ref_tmpdir))
+
+    return ref_tmpdir
+
+
+@pytest.fixture
+def config_filepath(base_dir):
+    config_filepath = os.path.join(base_dir, 'config.json')
+    with open(config_filepath, 'w') as f:
+        f.write(config)
+    return config_filepath
+
+
+@pytest.fixture
+def daemon(base_dir):
+    socket_path = os.path.join(base_dir, 'directorywrapper.sock')
+    server = DirectoryWrapperDaemon(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_wrapper_cache(daemon, base_dir, config_filepath):
+    server = DirectoryWrapperDaemon(os.path.join(base_dir, 'cache.sock'))
+    dw1 = server.wrapper(None, config_filepath)
+    dw2 = server.wrapper(None, config_filepath)
+    assert dw1 is dw2
+
+    other_config_filepath = os.path.join(base_dir, 'other_config.json')
+    with open(other_config_filepath, 'w') as f:
+        f.write(config.replace('"Testing"', '"Other"'))
+    assert server.wrapper(None, other_config_filepath) is not dw1
+    server.server_close()
+
+
+def test_running_daemon(daemon):
+    # A second daemon does not take over the socket of a running one.
+    with pytest.raises(RuntimeError):
+        DirectoryWrapperDaemon(daemon)
+    assert send_request(daemon, {'command': 'createactivityid'})['status'] == 'ok'
+
+
+def test_stale_socket(base_dir):
+    socket_path = os.path.join(base_dir, 'stale.sock')
+    # A socket nobody listens on anymore, like after a crash of the daemon.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.bind(socket_path)
+    server = DirectoryWrapperDaemon(socket_path)
+    server.server_close()
+
+    other_path = os.path.join(base_dir, 'other')
+    open(other_path, 'w').close()
+    with pytest.raises(RuntimeError):
+        DirectoryWrapperDaemon(other_path)
+    assert os.path.exists(other_path)
+
+
+def test_createactivityid(daemon):
+    response = send_request(daemon, {'command': 'createactivityid'})
+    assert response['status'] == 'ok'
+    assert len(response['result']) == 64
+
+
+def test_unknown_command(daemon):
+    response = send_request(daemon, {'command': 'schnurps'})
+    assert response['status'] == 'error'
+
+
+def test_integration_client(daemon, reference_dir, base_dir, config_filepath):
+    indir = os.path.join(base_dir, 'in')
+    os.mkdir(indir)
+    shutil.copy(os.path.join(reference_dir, 'integration',
+                             '751e9fe9fa9960259fb082a57d39461878d602b77eedd6bb5bdcaa1828b64034.prov'), indir)
+    shutil.copy(os.path.join(reference_dir, 'integration',
+                             'aa1db5c660d3d1f3f4f9361b9848694300929be94b74c84452a87420c59e5df9'), indir)
+    outdir = os.path.join(base_dir, 'out')
+    os.mkdir(outdir)
+    open(os.path.join(outdir, 'result.txt'), 'w').close()
+
+    return_code = subprocess.call([sys.executable, '-m', 'provtoolutils.directorywrapperc', '--socket', daemon,
+                                   '--inputdir', indir])
+    assert return_code == 0
+    assert os.path.exists(os.path.join(indir, 'testfile2.txt'))
+
+    startend = datetime.datetime.strftime(datetime.datetime.now(datetime.timezone.utc), '%Y-%m-%dT%H:%M:%S%z')
+    return_code = subprocess.call([sys.executable, '-m', 'provtoolutils.directorywrapperc', '--socket', daemon,
+                                   '--configfile', config_filepath, '--outputdir', outdir,
+                                   '--start', startend, '--end', startend])
+    assert return_code == 0
+    assert len([f for f in os.listdir(outdir) if f.endswith('.prov')]) == 1
+
+
+def test_integration_client_error(daemon, base_dir, config_filepath):
+    startend = datetime.datetime.strftime(datetime.datetime.now(datetime.timezone.utc), '%Y-%m-%dT%H:%M:%S%z')
+    process = subprocess.run([sys.executable, '-m', 'provtoolutils.directorywrapperc', '--socket', daemon,
+                              '--configfile', config_filepath, '--outputdir', os.path.join(base_dir, 'missing'),
+                              '--start', startend, '--end', 'no date'], stderr=PIPE)
+    assert process.returncode == 1
+    assert len(process.stderr) > 0
+
+
+def test_integration_client_no_daemon(base_dir):
+    process = subprocess.run([sys.executable, '-m', 'provtoolutils.directorywrapperc', '--socket',
+                              os.path.join(base_dir, 'missing.sock'), '--createactivityid'], stderr=PIPE)
+    assert process.returncode == 1
+    assert b'No directory wrapper daemon' in process.stderr
+    assert b'Traceback' not in process.stderr
@@ -0,0 +1,56 @@
+import os
+import pytest
+import tempfile
+
+from provtoolutils.materialize import materialize
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def src_filepath(base_dir):
+    filepath = os.path.join(base_dir, 'src')
+    with open(filepath, 'wb') as f:
+        f.write(b'Ijon Tichy ist ein allseits bekannter Raumfahrer.')
+    return filepath
+
+
+@pytest.mark.parametrize('strategy', ['auto', 'hardlink', 'reflink', 'copy_file_range', 'symlink', 'copy'])
+def test_materialize(base_dir, src_filepath, strategy):
+    dst_filepath = os.path.join(base_dir, 'dst')
+    used = materialize(src_filepath, dst_filepath, strategy)
+
+    assert used != 'auto'
+    with open(dst_filepath, 'rb') as f:
+        assert f.read() == b'Ijon Tichy ist ein allseits bekannter Raumfahrer.'
+
+
+def test_materialize_independent_copy(base_dir, src_filepath):
+    dst_filepath = os.path.join(base_dir, 'dst')
+    materialize(src_filepath, dst_filepath)
+    with open(dst_filepath, 'ab') as f:
+        f.write(b' Modified')
+
+    with open(src_filepath, 'rb') as f:
+        assert f.read() == b'Ijon Tichy ist ein allseits bekannter Raumfahrer.'
+
+
+@pytest.mark.parametrize('strategy', ['auto', 'hardlink', 'copy'])
+def test_materialize_existing_target(base_dir, src_filepath, strategy):
+    dst_filepath = os.path.join(base_dir, 'dst')
+    with open(dst_filepath, 'wb') as f:
+        f.write(b'existing')
+
+    with pytest.raises(FileExistsError):
+        materialize(src_filepath, dst_filepath, strategy)
+    with open(dst_filepath, 'rb') as f:
+        assert f.read() == b'existing'
+
+
+def test_materialize_unknown_strategy(base_dir, src_filepath):
+    with pytest.raises(ValueError):
+        materialize(src_filepath, os.path.join(base_dir, 'dst'), 'teleport')
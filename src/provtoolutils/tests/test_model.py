@@ -328,3 +328,32 @@ def test_ids():
 
     assert 'self' in rawprov.decode(model_encoding)
     assert not 'self' in containerprov
+
+
+def test_resources_namespace():
+    import jsonschema
+    import prov.model
+    from provtoolutils.constants import prov_schema
+
+    start = datetime.datetime(2019, 6, 1, 12, 34, 0, tzinfo=datetime.timezone.utc)
+    p = Person(given_name="Horst", family_name="Knilch")
+    plain = Activity(start, start, 'here', 'Testaktivität', 'Diese Aktivitaet dient zum testen', generate_uuid=False)
+    rawprov = make_provstring("test", Entity.FILE, p, plain, calculate_data_hash(b''))
+    assert 'resources' not in json.loads(rawprov.decode(model_encoding))['prefix']
+
+    measured = Activity(start, start, 'here', 'Testaktivität', 'Diese Aktivitaet dient zum testen', generate_uuid=False,
+                        additional_props={'resources:cpuUserTime': 1.25, 'resources:maxRss': 8 * 1024 ** 3,
+                                          'resources:exitStatus': 0})
+    rawprov = make_provstring("test", Entity.FILE, p, measured, calculate_data_hash(b''))
+    prov_json = json.loads(rawprov.decode(model_encoding))
+    jsonschema.validate(prov_json, prov_schema)
+    assert prov_json['prefix']['resources'] == 'http://dlr.de/provtool/resources#'
+
+    # Numbers are typed literals. They survive a round trip through the prov library.
+    attributes = next(iter(prov_json['activity'].values()))
+    assert attributes['resources:maxRss'] == {'$': str(8 * 1024 ** 3), 'type': 'xsd:long'}
+    document = prov.model.ProvDocument.deserialize(content=rawprov.decode(model_encoding), format='json')
+    record = next(iter(document.get_records(prov.model.ProvActivity)))
+    values = {str(k): v for k, v in record.attributes}
+    assert values['resources:cpuUserTime'] == 1.25
+    assert values['resources:maxRss'] == 8 * 1024 ** 3
@@ -0,0 +1,62 @@
+import pytest
+import threading
+import time
+
+from provtoolutils.parallel import run_parallel
+
+
+def test_run_parallel_order():
+    def slow_square(x):
+        time.sleep(0.001 * (10 - x))
+        return x * x
+
+    assert run_parallel(slow_square, range(10), 4) == [x * x for x in range(10)]
+
+
+def test_run_parallel_lazy_items():
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(x):
+        started.set()
+        release.wait()
+        return x
+
+    t = threading.Thread(target=lambda: run_parallel(blocking, items(), 2))
+    t.start()
+    started.wait()
+    time.sleep(0.05)
+    # Two items in progress and at most four waiting in the bounded queue plus one blocked in put.
+    assert len(consumed) <= 7
+    release.set()
+    t.join()
+    assert len(consumed) == 100
+
+
+def test_run_parallel_aggregated_errors():
+    processed = []
+
+    def fail_odd(x):
+        processed.append(x)
+        if x % 2 == 1:
+            raise ValueError(f'odd {x}')
+        return x
+
+    with pytest.raises(ValueError) as e:
+        run_parallel(fail_odd, range(10), 3)
+    assert sorted(processed) == list(range(10))
+    assert '5 of 10 items failed' in str(e.value)
+    assert 'odd 1' in str(e.value) and 'odd 9' in str(e.value)
+
+
+def test_run_parallel_jobs():
+    with pytest.raises(ValueError):
+        run_parallel(lambda x: x, [1], 0)
+    assert run_parallel(lambda x: x, [], 1) == []
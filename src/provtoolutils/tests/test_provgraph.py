@@ -0,0 +1,108 @@
+import datetime
+import json
+import pytest
+
+from provtoolutils.constants import model_encoding
+from provtoolutils.model import make_provstring, ActingSoftware, Activity, Entity, Person
+from provtoolutils.provgraph import ProvGraph
+from provtoolutils.utilities import calculate_data_hash
+
+
+@pytest.fixture
+def containers():
+    """
+    Creates the chain a <- b <- (c, d) where c and d are generated by the same activity.
+    """
+    author = ActingSoftware(Person('Max', 'Mustermann'), 'Max Mustermann', '-', 'Software', '-')
+    now = datetime.datetime.now(datetime.timezone.utc)
+    datahash = calculate_data_hash(b'')
+
+    result = {}
+    act_a = Activity(now, now, '-', 'Activity a', '-', [])
+    rawprov_a = make_provstring('a', Entity.FILE, author, act_a, datahash)
+    result[calculate_data_hash(rawprov_a)] = rawprov_a
+    act_b = Activity(now, now, '-', 'Activity b', '-', [calculate_data_hash(rawprov_a)])
+    rawprov_b = make_provstring('b', Entity.FILE, author, act_b, datahash)
+    result[calculate_data_hash(rawprov_b)] = rawprov_b
+    act_cd = Activity(now, now, '-', 'Activity cd', '-', [calculate_data_hash(rawprov_b), 'missing'])
+    for label in ['c', 'd']:
+        rawprov = make_provstring(label, Entity.FILE, author, act_cd, datahash)
+        result[calculate_data_hash(rawprov)] = rawprov
+
+    return result
+
+
+def _cid(containers, label):
+    return next(c for c, pr in containers.items()
+                if json.loads(pr.decode(model_encoding))['entity']['self']['prov:label'] == label)
+
+
+def test_intern():
+    graph = ProvGraph()
+    cid = calculate_data_hash(b'test')
+    node = graph.intern(cid, ProvGraph.ENTITY)
+
+    assert graph.intern(cid, ProvGraph.ENTITY) == node
+    assert graph.index(cid) == node
+    assert graph.name(node) == cid
+    assert cid in graph
+    # Hex digests are stored in binary form.
+    assert isinstance(graph._names[node], bytes)
+
+    other = graph.intern('act_id', ProvGraph.ACTIVITY)
+    assert other != node
+    assert graph.name(other) == 'act_id'
+    assert graph.kind(other) == ProvGraph.ACTIVITY
+    assert len(graph) == 2
+    assert graph.index('unknown') is None
+
+
+def test_add_container(containers):
+    graph = ProvGraph()
+    for cid, pr in containers.items():
+        graph.add_container(cid, pr)
+
+    c = graph.index(_cid(containers, 'c'))
+    assert graph.loaded(c)
+    assert graph.get(c, 'label') == 'c'
+    assert graph.get(c, 'datahash') == calculate_data_hash(b'')
+
+    activity = graph.neighbours('wasGeneratedBy', c)
+    assert len(activity) == 1
+    assert graph.get(activity[0], 'label') == 'Activity cd'
+    # Both c and d are generated by the same activity.
+    assert len(graph.neighbours('wasGeneratedBy', activity[0], reverse=True)) == 2
+    # The relations of the shared activity are not duplicated.
+    assert len(graph.neighbours('used', activity[0])) == 2
+    assert len(graph.neighbours('wasAssociatedWith', activity[0])) == 2
+
+    missing = graph.index('missing')
+    assert missing is not None
+    assert not graph.loaded(missing)
+
+
+def test_ancestors(containers):
+    graph = ProvGraph()
+    for cid, pr in containers.items():
+        graph.add_container(cid, pr)
+
+    ancestors = {graph.name(n) for n in graph.ancestors(graph.index(_cid(containers, 'd')))}
+    assert ancestors == {_cid(containers, 'a'), _cid(containers, 'b'), 'missing'}
+    assert graph.ancestors(graph.index(_cid(containers, 'a'))) == []
+
+
+def test_load(containers):
+    read = []
+
+    def _read(cid):
+        read.append(cid)
+        if cid in containers:
+            return containers[cid], b'', False
+        return None, None, True
+
+    graph = ProvGraph.load(_read, _cid(containers, 'c'))
+
+    assert sorted(read) == sorted([_cid(containers, 'a'), _cid(containers, 'b'), _cid(containers, 'c'), 'missing'])
+    assert _cid(containers, 'd') not in graph
+    assert len(list(graph.nodes(ProvGraph.ACTIVITY))) == 3
+    assert len([n for n in graph.nodes(ProvGraph.ENTITY) if graph.loaded(n)]) == 3
@@ -0,0 +1,66 @@
+import logging
+import os
+import pytest
+import tempfile
+
+from provtoolutils import provtoollogger
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def configured():
+    yield
+    provtoollogger.shutdown()
+    for name in provtoollogger.loggers:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_configure(configured, base_dir):
+    logfile = os.path.join(base_dir, 'provtool.log')
+    sink = ListHandler()
+    provtoollogger.configure([sink, 'file:' + logfile], 'INFO')
+    provtoollogger.configure([sink, 'file:' + logfile], 'INFO')
+
+    logger = logging.getLogger('DirectoryWrapper')
+    assert len([h for h in logger.handlers if isinstance(h, logging.handlers.QueueHandler)]) == 1
+
+    logger.info('Writing provenance file: %s with length %d', 'test.prov', 42)
+    logger.debug('Not written')
+    provtoollogger.shutdown()
+
+    assert len(sink.records) == 1
+    # Formatting is left to the sinks.
+    assert sink.records[0].args == ('test.prov', 42)
+    with open(logfile) as f:
+        assert 'Writing provenance file: test.prov with length 42' in f.read()
+
+
+def test_configure_env(configured, monkeypatch, base_dir):
+    logfile = os.path.join(base_dir, 'env.log')
+    monkeypatch.setenv(provtoollogger.sinks_env, f'file:{logfile}')
+    provtoollogger.configure(default_sinks=['stderr'])
+
+    logging.getLogger('Validator').warning('Validation failed')
+    provtoollogger.shutdown()
+    with open(logfile) as f:
+        assert 'Validation failed' in f.read()
+
+
+def test_create_sink_unknown():
+    with pytest.raises(ValueError):
+        provtoollogger.create_sink('carrier pigeon')
@@ -0,0 +1,26 @@
+import os
+import pytest
+import sys
+
+from provtoolutils import resources
+
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason='wait4 is not available')
+def test_run():
+    script = 'x = bytearray(64 * 1024 * 1024); sum(range(2000000)); raise SystemExit(3)'
+    returncode, usage = resources.run([sys.executable, '-c', script])
+
+    assert returncode == 3
+    assert usage['resources:exitStatus'] == 3
+    assert usage['resources:maxRss'] >= 64 * 1024 * 1024
+    assert usage['resources:cpuUserTime'] + usage['resources:cpuSystemTime'] > 0
+    assert usage['resources:bytesRead'] >= 0
+    assert usage['resources:bytesWritten'] >= 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason='wait4 is not available')
+def test_run_killed():
+    returncode, usage = resources.run([sys.executable, '-c', 'import os, signal; os.kill(os.getpid(), signal.SIGTERM)'])
+
+    assert returncode == -15
+    assert usage['resources:exitStatus'] == -15
@@ -3,11 +3,15 @@ import pytest
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 
 from distutils import dir_util
 from pathlib import Path
 from subprocess import PIPE
 
+from provtoolutils import search
+
 
 @pytest.fixture
 def base_dir():
@@ -38,3 +42,78 @@ def test_integration_searchdir(base_dir, reference_dir):
 
     assert p.returncode == 0
     assert p.stdout.strip().decode() == os.path.join(reference_dir, '751e9fe9fa9960259fb082a57d39461878d602b77eedd6bb5bdcaa1828b64034.prov')
+
+
+class _Plugin:
+    def __init__(self, name, search):
+        self.name = name
+        self._search = search
+
+    def load(self):
+        return self
+
+    def search(self, options, label):
+        return self._search(options, label)
+
+
+def test_iter_search(mocker):
+    release = threading.Event()
+
+    def streaming(options, label):
+        yield '/a/' + 'a' * 64 + '.prov'
+        # The first result is delivered before the plugin finishes.
+        release.wait(5)
+        yield '/a/' + 'b' * 64 + '.prov'
+
+    def failing(options, label):
+        raise RuntimeError('Broken plugin')
+
+    plugins = [
+        _Plugin('streaming', streaming),
+        _Plugin('list', lambda options, label: ['/b/' + 'a' * 64 + '.prov', '/b/' + 'c' * 64 + '.prov']),
+        _Plugin('failing', failing)
+    ]
+    mocker.patch('provtoolutils.search.entry_points', return_value=plugins)
+
+    found = search.iter_search({'directory': '.'}, 'label')
+    first = [next(found), next(found)]
+    release.set()
+    paths = first + list(found)
+
+    # Duplicates are detected by container id.
+    assert len(paths) == 3
+    assert {os.path.basename(p) for p in paths} == {c * 64 + '.prov' for c in 'abc'}
+
+
+def test_iter_search_timeout(mocker):
+    def slow(options, label):
+        time.sleep(5)
+        return ['/slow/' + 'a' * 64 + '.prov']
+
+    plugins = [_Plugin('slow', slow), _Plugin('fast', lambda options, label: ['/fast/' + 'b' * 64 + '.prov'])]
+    mocker.patch('provtoolutils.search.entry_points', return_value=plugins)
+
+    start = time.monotonic()
+    assert search.search({'directory': '.'}, 'label', timeout=0.5) == ['/fast/' + 'b' * 64 + '.prov']
+    assert time.monotonic() - start < 3
+
+
+def test_iter_search_timeout_streaming(mocker):
+    def streaming(options, label):
+        # Takes longer than the timeout in total, but delivers a result within each timeout.
+        for c in 'abcde':
+            time.sleep(0.2)
+            yield '/stream/' + c * 64 + '.prov'
+
+    def stalled(options, label):
+        yield '/stalled/' + 'f' * 64 + '.prov'
+        time.sleep(5)
+        yield '/stalled/' + 'g' * 64 + '.prov'
+
+    plugins = [_Plugin('streaming', streaming), _Plugin('stalled', stalled)]
+    mocker.patch('provtoolutils.search.entry_points', return_value=plugins)
+
+    start = time.monotonic()
+    paths = search.search({'directory': '.'}, 'label', timeout=0.5)
+    assert sorted(os.path.basename(p)[0] for p in paths) == list('abcdef')
+    assert time.monotonic() - start < 3
@@ -1,5 +1,7 @@
+import csv
 import datetime
 import dateutil.parser
+import glob
 import json
 import jsonschema
 import os
@@ -15,6 +17,7 @@ else:
 
 from git import Repo
 
+from provtoolutils.catalog import catalog_filename, Catalog
 from provtoolutils.constants import model_encoding, prov_schema
 from provtoolutils.model import make_provstring, Activity, Entity, Person
 from provtoolutils.standalone import Standalone
@@ -51,18 +54,25 @@ def default_answers():
     }
 
 
+def _read_catalog(directory):
+    """
+    The latest container of each file in the catalog of **directory**.
+    """
+    return {e['path']: e['cid'] + '.prov' for e in Catalog.in_directory(directory).entries()}
+
+
 def _run_standalone_first(filedir, mocker, sa):
     entity_path = os.path.join(filedir, testfile_name)
     with open(entity_path, 'w') as f:
         f.write(data)
-    mapping_file = os.path.join(filedir, 'provtool_filemapping.txt')
-    assert not os.path.exists(mapping_file)
+    catalog_file = os.path.join(filedir, catalog_filename)
+    assert not os.path.exists(catalog_file)
     answers = default_answers()
     answers['entity_path'] = [entity_path]
 
     mocker.patch('builtins.input', create_mock_input(answers))
     sa.run()
-    return entity_path, mapping_file
+    return entity_path, catalog_file
 
 
 def _run_standalone_repeated(mocker, sa):
@@ -134,26 +144,46 @@ def test_write_prov_file(filedir):
     starttime = datetime.datetime.now(datetime.timezone.utc)
     sa.write_prov_file(starttime, 'location', 'label', 'means', [], entity_path, Person('Mäx', 'Müstermann'))
 
-    mapping_file = os.path.join(filedir, 'provtool_filemapping.txt')
-    assert os.path.exists(mapping_file)
+    catalog_file = os.path.join(filedir, catalog_filename)
+    assert os.path.exists(catalog_file)
     assert os.path.exists(os.path.join(filedir, calculate_data_hash(data.encode(model_encoding))))
 
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        pr, dr, err =read_provanddata({'directory': os.path.dirname(resultfile)}, 
-                                       os.path.basename(resultfile).replace('.prov', ''))
-        assert not err
-        assert dr.decode(model_encoding) == data
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    pr, dr, err =read_provanddata({'directory': os.path.dirname(resultfile)}, 
+                                   os.path.basename(resultfile).replace('.prov', ''))
+    assert not err
+    assert dr.decode(model_encoding) == data
+
+    prov = pr.decode(model_encoding)
+    assert re.match('.*Müstermann.*', prov)
 
-        prov = pr.decode(model_encoding)
-        assert re.match('.*Müstermann.*', prov)
+    found = Catalog.in_directory(filedir).query(agent='Mäx Müstermann', location='location',
+                                                since=starttime.replace(microsecond=0))
+    assert [m['container'] for m in found] == [resultfile]
+
+def test_write_prov_file_blobstore(filedir):
+    entity_path = os.path.join(filedir, 'test.txt')
+    with open(entity_path, 'w') as f:
+        f.write(data)
+
+    blobstore = os.path.join(filedir, 'store')
+    sa = Standalone(db=':memory:', blobstore=blobstore)
+    starttime = datetime.datetime.now(datetime.timezone.utc)
+    sa.write_prov_file(starttime, 'location', 'label', 'means', [], entity_path, Person('Max', 'Mustermann'))
+
+    datahash = calculate_data_hash(data.encode(model_encoding))
+    assert not os.path.exists(os.path.join(filedir, datahash))
+    assert sa.blobstore.refcount(datahash) == 1
+
+    provfile = glob.glob(os.path.join(filedir, '*.prov'))[0]
+    pr, dr, err = read_provanddata({'directory': filedir, 'blobstore': blobstore},
+                                   os.path.basename(provfile).replace('.prov', ''))
+    assert not err
+    assert dr.decode(model_encoding) == data
 
 '''
     Integration tests following
@@ -162,26 +192,22 @@ def test_write_prov_file(filedir):
 
 def test_file_creation_and_content(filedir, mocker):
     sa = Standalone(db=':memory:')
-    entity_path, mapping_file = _run_standalone_first(filedir, mocker, sa)
+    entity_path, catalog_file = _run_standalone_first(filedir, mocker, sa)
 
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
 
 def test_file_usage(filedir, mocker):
     entity_path = os.path.join(filedir, 'test.txt')
     with open(entity_path, 'w') as f:
         f.write(data)
 
-    mapping_file = os.path.join(filedir, 'provtool_filemapping.txt')
-    assert not os.path.exists(mapping_file)
+    catalog_file = os.path.join(filedir, catalog_filename)
+    assert not os.path.exists(catalog_file)
 
     answers = default_answers()
     answers['entity_path'] = [entity_path]
@@ -193,28 +219,24 @@ def test_file_usage(filedir, mocker):
     sa = Standalone(db=':memory:')
     sa.run()
 
-    assert os.path.exists(mapping_file)
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    assert os.path.exists(catalog_file)
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        pr, dr, err =read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
-        assert not err
-        assert dr.decode(model_encoding) == data
-        assert 'used' in pr.decode(model_encoding)
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    pr, dr, err =read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    assert not err
+    assert dr.decode(model_encoding) == data
+    assert 'used' in pr.decode(model_encoding)
 
 def test_file_creation_multiple_authors(filedir, mocker):
     entity_path = os.path.join(filedir, 'test.txt')
     with open(entity_path, 'w') as f:
         f.write(data)
 
-    mapping_file = os.path.join(filedir, 'provtool_filemapping.txt')
-    assert not os.path.exists(mapping_file)
+    catalog_file = os.path.join(filedir, catalog_filename)
+    assert not os.path.exists(catalog_file)
 
     answers = default_answers()
     answers['entity_path'] = [entity_path]
@@ -226,57 +248,45 @@ def test_file_creation_multiple_authors(filedir, mocker):
     sa = Standalone(db=':memory:')
     sa.run()
 
-    assert os.path.exists(mapping_file)
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    assert os.path.exists(catalog_file)
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
-        assert not err
-        assert dr.decode(model_encoding) == data
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    assert not err
+    assert dr.decode(model_encoding) == data
 
-        js = json.loads(pr.decode(model_encoding))
-        assert len(js['agent']) == 2
-        assert len(js['actedOnBehalfOf']) == 1
+    js = json.loads(pr.decode(model_encoding))
+    assert len(js['agent']) == 2
+    assert len(js['actedOnBehalfOf']) == 1
 
 def test_input_remembering(filedir, mocker):
     sa = Standalone(db=':memory:')
-    entity_path, mapping_file = _run_standalone_first(filedir, mocker, sa)
+    entity_path, catalog_file = _run_standalone_first(filedir, mocker, sa)
 
-    assert os.path.exists(mapping_file)
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    assert os.path.exists(catalog_file)
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        assert os.path.exists(resultfile)
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    assert os.path.exists(resultfile)
 
-        os.remove(resultfile)
+    os.remove(resultfile)
 
-    os.remove(mapping_file)
+    os.remove(catalog_file)
     _run_standalone_repeated(mocker, sa)
 
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
-        assert not err
-        dr.decode(model_encoding) == data
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    assert not err
+    dr.decode(model_encoding) == data
 
 def test_same_id(filedir, mocker):
     sa = Standalone(db=':memory:')
@@ -285,42 +295,34 @@ def test_same_id(filedir, mocker):
     assert not os.path.exists(os.path.join(filedir, testfile_name))
     assert not os.path.exists(rawdatafile_name)
 
-    entity_path, mapping_file = _run_standalone_first(filedir, mocker, sa)
+    entity_path, catalog_file = _run_standalone_first(filedir, mocker, sa)
 
-    assert os.path.exists(mapping_file)
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    assert os.path.exists(catalog_file)
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        filename_1 = os.path.join(filedir, mappings[entity_path])
-        assert os.path.exists(filename_1)
-        assert os.path.exists(rawdatafile_name)
+    filename_1 = os.path.join(filedir, mappings[entity_path])
+    assert os.path.exists(filename_1)
+    assert os.path.exists(rawdatafile_name)
 
-        os.remove(filename_1)
-        os.remove(rawdatafile_name)
+    os.remove(filename_1)
+    os.remove(rawdatafile_name)
 
-    os.remove(mapping_file)
+    os.remove(catalog_file)
     _run_standalone_repeated(mocker, sa)
 
-    assert os.path.exists(mapping_file)
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    assert os.path.exists(catalog_file)
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        filename_2 = os.path.join(filedir, mappings[entity_path])
-        assert os.path.exists(filename_2)
-        assert os.path.exists(rawdatafile_name)
+    filename_2 = os.path.join(filedir, mappings[entity_path])
+    assert os.path.exists(filename_2)
+    assert os.path.exists(rawdatafile_name)
 
-        os.remove(filename_2)
-        os.remove(rawdatafile_name)
+    os.remove(filename_2)
+    os.remove(rawdatafile_name)
 
     assert len(filename_1) > 0
     assert len(filename_2) > 0
@@ -341,36 +343,32 @@ def test_repository_mode(filedir, mocker):
     sa = Standalone(db=':memory:')
     sa.run_repo(filedir, entity_path)
 
-    mapping_file = os.path.join(filedir, 'provtool_filemapping.txt')
-    assert os.path.exists(mapping_file)
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    catalog_file = os.path.join(filedir, catalog_filename)
+    assert os.path.exists(catalog_file)
+    mappings = _read_catalog(filedir)
 
-        assert entity_path in mappings
+    assert entity_path in mappings
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
-        assert not err
-        assert dr.decode(model_encoding) == data
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    assert not err
+    assert dr.decode(model_encoding) == data
 
-        js = json.loads(pr.decode(model_encoding))
-        jsonschema.validate(js, prov_schema)
+    js = json.loads(pr.decode(model_encoding))
+    jsonschema.validate(js, prov_schema)
 
-        ag = next(iter(js['agent'].values()))
+    ag = next(iter(js['agent'].values()))
 
-        assert ag['person:familyName'] == 'Müstermann'
-        assert ag['person:givenName'] == 'Max'
-        assert ag['prov:label'] == 'Max Müstermann'
-        assert ag['prov:type'] == 'prov:Person'
+    assert ag['person:familyName'] == 'Müstermann'
+    assert ag['person:givenName'] == 'Max'
+    assert ag['prov:label'] == 'Max Müstermann'
+    assert ag['prov:type'] == 'prov:Person'
 
-        assert len(js['activity']) == 1
-        ac = next(iter(js['activity'].values()))
-        assert ac['prov:label'] == f'Git commit {cm}'
-        assert dateutil.parser.parse(ac['prov:endTime']) > datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=-5)
-        assert dateutil.parser.parse(ac['prov:endTime']) > datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=-5)
+    assert len(js['activity']) == 1
+    ac = next(iter(js['activity'].values()))
+    assert ac['prov:label'] == f'Git commit {cm}'
+    assert dateutil.parser.parse(ac['prov:endTime']) > datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=-5)
+    assert dateutil.parser.parse(ac['prov:endTime']) > datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=-5)
 
 def test_repository_mode_additional_comment(filedir, mocker):
     entity_path = os.path.join(filedir, 'test.txt')
@@ -387,20 +385,249 @@ def test_repository_mode_additional_comment(filedir, mocker):
     sa = Standalone(db=':memory:')
     sa.run_repo(filedir, entity_path, 'Testactivity')
 
-    mapping_file = os.path.join(filedir, 'provtool_filemapping.txt')
-    with open(mapping_file, 'r') as f:
-        mappings = {}
-        for l in f.readlines():
-            s = l.split('=')
-            mappings[s[0].strip()] = s[1].strip()
+    catalog_file = os.path.join(filedir, catalog_filename)
+    mappings = _read_catalog(filedir)
+
+    resultfile = os.path.join(filedir, mappings[entity_path])
+    pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    assert not err
+    assert dr.decode(model_encoding) == data
+
+    js = json.loads(pr.decode(model_encoding))
+    jsonschema.validate(js, prov_schema)
+
+    ac = next(iter(js['activity'].values()))
+    assert ac['prov:label'] == f'Git commit {cm}. Testactivity'
+
+def test_repository_mode_bulk(filedir):
+    repo = Repo.init(filedir)
+    repo.config_writer().set_value("user", "name", "Max Müstermann").release()
+    repo.config_writer().set_value("user", "email", "max.müstermann@musterstadt.de").release()
+
+    files = {'test.txt': data, 'same.txt': data, os.path.join('sub dir', 'other.txt'): 'Other'}
+    for relpath, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(filedir, relpath)), exist_ok=True)
+        with open(os.path.join(filedir, relpath), 'w') as f:
+            f.write(content)
+    repo.index.add([os.path.join(filedir, relpath) for relpath in files])
+    first = repo.index.commit("Initial commit for testing purpose")
+    with open(os.path.join(filedir, 'test.txt'), 'w') as f:
+        f.write(data + ' changed')
+    repo.index.add([os.path.join(filedir, 'test.txt')])
+    second = repo.index.commit("Second commit for testing purpose")
+
+    sa = Standalone(db=':memory:')
+    written = sa.run_repo_bulk(filedir, 'Testactivity', jobs=2)
 
-        resultfile = os.path.join(filedir, mappings[entity_path])
-        pr, dr, err = read_provanddata({'directory': os.path.dirname(resultfile)}, os.path.basename(resultfile).replace('.prov', ''))
+    assert set(written) == {os.path.join(filedir, relpath) for relpath in files}
+    mappings = _read_catalog(filedir)
+    mappings.update(_read_catalog(os.path.join(filedir, 'sub dir')))
+    assert mappings == {path: cid + '.prov' for path, cid in written.items()}
+
+    for path, cid in written.items():
+        pr, dr, err = read_provanddata({'directory': os.path.dirname(path)}, cid)
         assert not err
-        assert dr.decode(model_encoding) == data
+        with open(path, 'rb') as f:
+            assert dr == f.read()
+        js = json.loads(pr.decode(model_encoding))
+        jsonschema.validate(js, prov_schema)
+        cm = second if path.endswith('test.txt') else first
+        assert next(iter(js['activity'].values()))['prov:label'] == f'Git commit {cm}. Testactivity'
+        assert next(iter(js['agent'].values()))['person:familyName'] == 'Müstermann'
 
+    # The containers are the same as written by the repository mode for single files.
+    for path, cid in written.items():
+        os.remove(os.path.join(os.path.dirname(path), cid + '.prov'))
+        sa.run_repo(filedir, os.path.relpath(path, filedir), 'Testactivity')
+        assert os.path.exists(os.path.join(os.path.dirname(path), cid + '.prov'))
+
+    assert set(sa.run_repo_bulk(filedir, paths=['sub dir'])) == {os.path.join(filedir, 'sub dir', 'other.txt')}
+
+def test_repository_mode_bulk_blobstore(filedir):
+    from provtoolutils.blobstore import BlobStore
+
+    repo = Repo.init(filedir)
+    repo.config_writer().set_value("user", "name", "Max Mustermann").release()
+    repo.config_writer().set_value("user", "email", "max.mustermann@musterstadt.de").release()
+    filepath = os.path.join(filedir, 'test.txt')
+    with open(filepath, 'w') as f:
+        f.write(data)
+    repo.index.add([filepath])
+    repo.index.commit("Initial commit for testing purpose")
+    # The working tree differs from the committed blob (like with smudge filters), but git does not report it.
+    repo.git.update_index('--assume-unchanged', 'test.txt')
+    with open(filepath, 'w') as f:
+        f.write(data + ' smudged')
+
+    blobstore = os.path.join(filedir, 'store')
+    written = Standalone(db=':memory:', blobstore=blobstore).run_repo_bulk(filedir, jobs=2)
+
+    datahash = calculate_data_hash(data.encode('utf-8'))
+    assert BlobStore(blobstore).refcount(datahash) == 1
+    with open(BlobStore(blobstore).path(datahash), 'rb') as f:
+        assert f.read() == data.encode('utf-8')
+    assert _read_catalog(filedir) == {filepath: written[filepath] + '.prov'}
+
+
+def _commit(repo, filedir, files, message):
+    for relpath, content in files.items():
+        filepath = os.path.join(filedir, relpath)
+        if content is None:
+            repo.index.remove([filepath], working_tree=True)
+            continue
+        with open(filepath, 'w') as f:
+            f.write(content)
+        repo.index.add([filepath])
+    return repo.index.commit(message)
+
+def test_repository_backfill(filedir, mocker):
+    repodir = os.path.join(filedir, 'repo')
+    outdir = os.path.join(filedir, 'history')
+    repo = Repo.init(repodir)
+    repo.config_writer().set_value("user", "name", "Max Müstermann").release()
+    repo.config_writer().set_value("user", "email", "max.müstermann@musterstadt.de").release()
+
+    first = _commit(repo, repodir, {'a.txt': 'a1', 'b.txt': 'b'}, 'First')
+    second = _commit(repo, repodir, {'a.txt': 'a2', 'b.txt': None}, 'Second')
+
+    sa = Standalone(db=':memory:')
+    # The first checkpoint is written, the second chunk fails.
+    make_container = Standalone.make_container
+    calls = []
+    def failing(*args):
+        calls.append(args)
+        if len(calls) > 2:
+            raise RuntimeError('Interrupted')
+        return make_container(*args)
+    mocker.patch.object(sa, 'make_container', failing)
+    with pytest.raises(RuntimeError):
+        sa.run_backfill(repodir, outdir, checkpoint_every=1)
+    mocker.stopall()
+    assert sa.run_backfill(repodir, outdir, checkpoint_every=1) == 1
+
+    third = _commit(repo, repodir, {'a.txt': 'a1'}, 'Revert')
+    fourth = _commit(repo, repodir, {'a.txt': 'a3'}, 'Fourth')
+    # The reverted content is a known revision already.
+    assert sa.run_backfill(repodir, outdir, 'Backfill', jobs=2) == 1
+    assert sa.run_backfill(repodir, outdir) == 0
+
+    # The revisions are recorded with the path in the working tree and the time of their commit.
+    mappings, provs = {}, {}
+    for e in Catalog.in_directory(outdir).entries():
+        pr, dr, err = read_provanddata({'directory': outdir}, e['cid'])
+        assert not err
         js = json.loads(pr.decode(model_encoding))
         jsonschema.validate(js, prov_schema)
+        hexsha = next(iter(js['activity'].values()))['prov:label'].split(' ')[2].rstrip('.')
+        assert dateutil.parser.parse(e['time']) == repo.commit(hexsha).committed_datetime
+        revision = f'{os.path.relpath(e["path"], repodir)}@{hexsha}'
+        mappings[revision] = e['cid'] + '.prov'
+        provs[revision] = (js, dr.decode(model_encoding))
+    assert set(mappings) == {f'a.txt@{first}', f'b.txt@{first}', f'a.txt@{second}', f'a.txt@{fourth}'}
+
+    assert provs[f'a.txt@{first}'][1] == 'a1'
+    assert 'used' not in provs[f'a.txt@{first}'][0]
+    js, content = provs[f'a.txt@{fourth}']
+    assert content == 'a3'
+    assert next(iter(js['activity'].values()))['prov:label'] == f'Git commit {fourth}. Backfill'
+    # The revision before is the reverted one, which has the container of the first commit.
+    assert [u['prov:entity'] for u in js['used'].values()] == [mappings[f'a.txt@{first}'].replace('.prov', '')]
+    js, _ = provs[f'a.txt@{second}']
+    assert [u['prov:entity'] for u in js['used'].values()] == [mappings[f'a.txt@{first}'].replace('.prov', '')]
+
+def test_repository_backfill_merge(filedir):
+    repodir = os.path.join(filedir, 'repo')
+    outdir = os.path.join(filedir, 'history')
+    repo = Repo.init(repodir)
+    repo.config_writer().set_value("user", "name", "Max Müstermann").release()
+    repo.config_writer().set_value("user", "email", "max.müstermann@musterstadt.de").release()
+
+    _commit(repo, repodir, {'a.txt': 'a\nb\nc\n', 'b.txt': 'b'}, 'Base')
+    main = repo.active_branch.name
+    repo.git.checkout('-b', 'side')
+    _commit(repo, repodir, {'a.txt': 'A\nb\nc\n', 'b.txt': 'B'}, 'Side')
+    repo.git.checkout(main)
+    _commit(repo, repodir, {'a.txt': 'a\nb\nC\n'}, 'Main')
+    # a.txt is merged from both sides, b.txt is taken from the side branch.
+    repo.git.merge('--no-edit', 'side')
+    merge = repo.head.commit
+    _commit(repo, repodir, {'a.txt': 'after'}, 'After')
+
+    sa = Standalone(db=':memory:')
+    assert sa.run_backfill(repodir, outdir) == 7
 
-        ac = next(iter(js['activity'].values()))
-        assert ac['prov:label'] == f'Git commit {cm}. Testactivity'
+    provs = {}
+    for e in Catalog.in_directory(outdir).entries():
+        pr, dr, err = read_provanddata({'directory': outdir}, e['cid'])
+        assert not err
+        js = json.loads(pr.decode(model_encoding))
+        provs[dr.decode(model_encoding)] = (e['cid'], [u['prov:entity'] for u in js.get('used', {}).values()])
+    merged, used = provs['A\nb\nC\n']
+    assert sorted(used) == sorted([provs['A\nb\nc\n'][0], provs['a\nb\nC\n'][0]])
+    assert merge.hexsha in Catalog.in_directory(outdir).metadata(merged)['activity_label']
+    assert provs['after'][1] == [merged]
+    assert provs['B'][1] == [provs['b'][0]]
+
+
+@pytest.mark.parametrize('manifest_name', ['manifest.jsonl', 'manifest.csv'])
+def test_batch_mode(filedir, manifest_name):
+    os.makedirs(os.path.join(filedir, 'sub'))
+    for relpath, content in [('a.txt', data), (os.path.join('sub', 'b.txt'), 'Other')]:
+        with open(os.path.join(filedir, relpath), 'w') as f:
+            f.write(content)
+    rows = [
+        {'entity_path': 'a.txt', 'authors': ['Max Müstermann', 'Erika Musterfrau'], 'activity_location': 'here',
+         'activity_label': 'Activity', 'activity_means': 'Testing', 'activity_time': '2019-09-02T10:14:00+00:00'},
+        {'entity_path': os.path.join('sub', 'b.txt'), 'authors': ['Max Müstermann'], 'activity_location': 'here',
+         'activity_label': 'Activity', 'activity_means': 'Testing', 'activity_time': '2019-09-02T10:14:00+00:00',
+         'used': ['1' * 64, '2' * 64]}
+    ]
+    manifest = os.path.join(filedir, manifest_name)
+    with open(manifest, 'w', encoding='utf-8', newline='') as f:
+        if manifest_name.endswith('.csv'):
+            writer = csv.DictWriter(f, ['entity_path', 'authors', 'activity_location', 'activity_label',
+                                        'activity_means', 'activity_time', 'used'])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: ';'.join(v) if isinstance(v, list) else v for k, v in row.items()})
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+
+    written = Standalone(db=':memory:').run_batch(manifest, jobs=2)
+
+    a, b = os.path.join(filedir, 'a.txt'), os.path.join(filedir, 'sub', 'b.txt')
+    assert set(written) == {a, b}
+    assert Catalog.in_directory(filedir).lookup(a)[0]['cid'] == written[a]
+    assert Catalog.in_directory(os.path.join(filedir, 'sub')).lookup(b)[0]['datahash'] == \
+        calculate_data_hash(b'Other')
+
+    pr, dr, err = read_provanddata({'directory': filedir}, written[a])
+    assert not err
+    assert dr.decode(model_encoding) == data
+    js = json.loads(pr.decode(model_encoding))
+    jsonschema.validate(js, prov_schema)
+    assert {ag['prov:label'] for ag in js['agent'].values()} == {'Max Müstermann', 'Erika Musterfrau'}
+    assert len(js['actedOnBehalfOf']) == 1
+    assert 'used' not in js
+
+    pr, dr, err = read_provanddata({'directory': os.path.join(filedir, 'sub')}, written[b])
+    assert not err
+    js = json.loads(pr.decode(model_encoding))
+    assert {u['prov:entity'] for u in js['used'].values()} == {'1' * 64, '2' * 64}
+
+    # The metadata is indexed for queries.
+    found = Catalog.in_directory(os.path.join(filedir, 'sub')).query(agent='Max Müstermann', location='here',
+                                                                       until='2019-09-02T10:14:00Z')
+    assert [m['cid'] for m in found] == [written[b]]
+    assert found[0]['used'] == ['1' * 64, '2' * 64]
+    assert Catalog.in_directory(filedir).query(agent='Erika Musterfrau')[0]['label'] == 'a.txt'
+
+def test_batch_mode_invalid(filedir):
+    manifest = os.path.join(filedir, 'manifest.jsonl')
+    with open(manifest, 'w') as f:
+        f.write(json.dumps({'entity_path': 'a.txt', 'authors': ['Max Mustermann']}) + '\n')
+
+    with pytest.raises(ValueError) as e:
+        Standalone(db=':memory:').run_batch(manifest)
+    assert 'manifest.jsonl:1: Missing activity_location' in str(e.value)
@@ -0,0 +1,65 @@
+import os
+import pytest
+import tempfile
+
+from provtoolutils.constants import manifest_filename
+from provtoolutils.stepcache import StepCache
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+@pytest.fixture
+def output_dirpath(base_dir):
+    outdir = os.path.join(base_dir, 'out')
+    os.makedirs(os.path.join(outdir, 'sub'))
+    for relpath in ['result.txt', os.path.join('sub', 'result.txt'), manifest_filename]:
+        with open(os.path.join(outdir, relpath), 'w') as f:
+            f.write(relpath)
+    return outdir
+
+
+def test_key():
+    activity = {'location': 'here', 'label': 'Test', 'means': 'Testing'}
+    key = StepCache.key(['b', 'a'], activity, ['tool 1.0'], ['tool', '--fast'])
+
+    assert key == StepCache.key(['a', 'b'], dict(activity), ['tool 1.0'], ['tool', '--fast'])
+    assert key != StepCache.key(['a', 'b'], activity, ['tool 1.1'], ['tool', '--fast'])
+    assert key != StepCache.key(['a', 'b'], activity, ['tool 1.0'], ['tool', '--slow'])
+    assert key != StepCache.key(['a'], activity, ['tool 1.0'], ['tool', '--fast'])
+
+
+def test_normalize_command():
+    normalized = StepCache.normalize_command(['tool', '--in=/data/in', '--out', 'data/in2/x',
+                                              os.path.abspath('data/in2')],
+                                             {'{inputdir}': '/data/in', '{outputdir}': 'data/in2'})
+    assert normalized == ['tool', '--in={inputdir}', '--out', '{outputdir}/x', '{outputdir}']
+
+    # Only whole paths are replaced, not text, which happens to contain a directory.
+    normalized = StepCache.normalize_command(['tool', '/data/input', 'x/data/in', '--pattern=/data/in*', '/data/in/a'],
+                                             {'{inputdir}': '/data/in'})
+    assert normalized == ['tool', '/data/input', 'x/data/in', '--pattern=/data/in*', '{inputdir}/a']
+
+
+def test_store_restore(base_dir, output_dirpath):
+    cache = StepCache(os.path.join(base_dir, 'cache'))
+    key = StepCache.key([], {}, [], ['tool'])
+
+    assert not cache.contains(key)
+    assert cache.store(key, output_dirpath)
+    assert cache.contains(key)
+    assert not cache.store(key, output_dirpath)
+
+    restore_dirpath = os.path.join(base_dir, 'restored')
+    restored = cache.restore(key, restore_dirpath)
+    assert sorted(restored) == sorted(['result.txt', os.path.join('sub', 'result.txt')])
+    with open(os.path.join(restore_dirpath, 'sub', 'result.txt')) as f:
+        assert f.read() == os.path.join('sub', 'result.txt')
+    assert not os.path.exists(os.path.join(restore_dirpath, manifest_filename))
+
+    with pytest.raises(FileExistsError):
+        cache.restore(key, restore_dirpath)
+    assert [f for f in os.listdir(cache.root) if f.startswith('.')] == []
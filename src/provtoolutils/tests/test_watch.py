@@ -0,0 +1,44 @@
+import os
+import pytest
+import tempfile
+import threading
+
+from provtoolutils import watch
+
+pytestmark = pytest.mark.skipif(not watch.available(), reason='inotify is not available')
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+def test_directory_watcher(base_dir):
+    closed = []
+    event = threading.Event()
+
+    def on_closed(path):
+        closed.append(path)
+        if path.endswith('moved.txt'):
+            event.set()
+
+    watcher = watch.DirectoryWatcher(base_dir, on_closed, poll_interval=0.05).start()
+    with open(os.path.join(base_dir, 'result.txt'), 'w') as f:
+        f.write('Ijon Tichy')
+    os.mkdir(os.path.join(base_dir, 'sub'))
+    # Give the watcher the chance to add the new subdirectory.
+    while os.path.join(base_dir, 'sub') not in watcher._watches.values():
+        event.wait(0.01)
+    with open(os.path.join(base_dir, 'sub', 'result.txt'), 'w') as f:
+        f.write('Ijon Tichy')
+    with open(os.path.join(base_dir, 'tmp'), 'w') as f:
+        f.write('Ijon Tichy')
+    os.rename(os.path.join(base_dir, 'tmp'), os.path.join(base_dir, 'moved.txt'))
+
+    assert event.wait(5)
+    watcher.stop()
+
+    assert os.path.join(base_dir, 'result.txt') in closed
+    assert os.path.join(base_dir, 'sub', 'result.txt') in closed
+    assert os.path.join(base_dir, 'moved.txt') in closed
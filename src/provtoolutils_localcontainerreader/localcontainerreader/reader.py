@@ -1,4 +1,5 @@
 import glob
+import itertools
 import json
 import jsonschema
 import os
@@ -6,11 +7,48 @@ import os
 from provtoolutils.constants import model_encoding, prov_schema
 from provtoolutils.utilities import calculate_data_hash
 
+try:
+    from provtoolutils import dataset
+except ImportError:
+    # Older versions of provtoolutils do not know directory containers.
+    dataset = None
+
+
+def _read_directory(container_filepath: str, prov_obj: dict, manifest_filepath: str):
+    """
+    Reads the manifest of a directory container and verifies the files of the directory next to the container.
+
+    :return: The manifest and True in case of error.
+    """
+    entity = prov_obj['entity']['self']
+    if dataset is None:
+        print(f'Directory container {container_filepath} needs a newer version of provtoolutils')
+        return None, True
+    if not os.path.exists(manifest_filepath):
+        print(f'Manifest {manifest_filepath} for container {container_filepath} does not exist')
+        return None, True
+
+    with open(manifest_filepath, 'rb') as f:
+        manifest = f.read()
+    try:
+        entries = dataset.read_manifest(manifest, entity['provtool:datahash'])
+        dataset.verify_members(entries, os.path.join(os.path.dirname(container_filepath), entity['prov:label']))
+    except ValueError as e:
+        print(e)
+        return manifest, True
+    return manifest, False
+
 
 def read_provanddata(options: dict, cid: str):
     """
     Returns a tuple consisting of the provenance, the _data_ and a boolean with True in case
     of error.
+
+    The data of a directory container is its manifest. Such a container is only valid, if the directory named by
+    its label next to it contains exactly the files of the manifest.
+
+    The data is looked up in the blob store given by the option 'blobstore' (or the environment variable
+    PROVTOOLBLOBSTORE) first and next to the container afterwards.
     """
     if 'directory' not in options:
         raise ValueError('Need \'id\' and \'directory\' in the options dict')
@@ -19,7 +57,9 @@ def read_provanddata(options: dict, cid: str):
     dr = None
     err = False
 
-    globs = glob.glob(f'{os.path.join(options["directory"], "**", cid) + ".prov"}', recursive=True)
+    # The first match only. The directory is not searched any further.
+    globs = list(itertools.islice(glob.iglob(f'{os.path.join(options["directory"], "**", cid) + ".prov"}',
+                                             recursive=True), 1))
 
     if len(globs) > 0:
         with open(globs[0], 'rb') as f:
@@ -33,9 +73,17 @@ def read_provanddata(options: dict, cid: str):
             jsonschema.validate(prov_obj, prov_schema)
             datahash = prov_obj['entity']['self']['provtool:datahash']
             rawfile_path = os.path.join(os.path.dirname(globs[0]), datahash)
+            blobstore = options.get('blobstore', os.environ.get('PROVTOOLBLOBSTORE'))
+            # Same layout as provtoolutils.blobstore.blob_path
+            if blobstore is not None and os.path.isfile(os.path.join(blobstore, datahash[:2], datahash)):
+                rawfile_path = os.path.join(blobstore, datahash[:2], datahash)
 
             pr = provb
 
+            if prov_obj['entity']['self'].get('prov:type') == 'Directory':
+                dr, directory_err = _read_directory(globs[0], prov_obj, rawfile_path)
+                return (pr, dr, err or directory_err)
+
             if not os.path.exists(rawfile_path,):
                 err = True
 
@@ -79,20 +127,26 @@ def _match(provcontainer_filepath: str, entityname: str):
         return False
 
 
-def search(options: dict, label: str):
-    if 'directory' in options:
-        entity_filenames = []
-        for dirpath, dirnames, filenames in os.walk(options['directory']):
-            prov_container_files = [os.path.join(dirpath, f) for f in filenames if f.endswith('.prov')]
-            matching = [p for p in prov_container_files if _match(p, label)]
+def iter_search(options: dict, label: str):
+    """
+    Same as search, but yields each container as soon as it is found.
+    """
+    if 'directory' not in options:
+        raise ValueError('Need \'label\' and \'directory\' in the options dict')
+    for dirpath, dirnames, filenames in os.walk(options['directory']):
+        prov_container_files = [os.path.join(dirpath, f) for f in filenames if f.endswith('.prov')]
+        matching = [p for p in prov_container_files if _match(p, label)]
+
+        for m in matching:
+            entity_filename = os.path.abspath(m)
+            if entity_filename.startswith('./'):
+                entity_filename = entity_filename[2:]
 
-            for m in matching:
-                entity_filename = os.path.abspath(m)
-                if entity_filename.startswith('./'):
-                    entity_filename = entity_filename[2:]
+            yield entity_filename
 
-                entity_filenames.append(entity_filename)
 
-        return entity_filenames
+def search(options: dict, label: str):
+    if 'directory' in options:
+        return list(iter_search(options, label))
     else:
         raise ValueError('Need \'label\' and \'directory\' in the options dict')
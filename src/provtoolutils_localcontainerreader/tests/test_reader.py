@@ -1,3 +1,4 @@
+import json
 import os
 import pytest
 import tempfile
@@ -6,7 +7,7 @@ from distutils import dir_util
 from pathlib import Path
 from provtoolutils.constants import model_encoding
 
-from localcontainerreader.reader import search, read_provanddata
+from localcontainerreader.reader import iter_search, search, read_provanddata
 
 @pytest.fixture
 def ref_tmpdir():
@@ -46,3 +47,55 @@ def test_search(reference_dir):
     assert len(location) == 1
     assert os.path.join(reference_dir, 'sub1',
                         '582b990865a3f5ca9108f78afcc57a81035b74f0789d0a8d00e76be6daa7a129.prov') in location
+
+    found = iter_search({'directory': reference_dir}, 'test.txt')
+    assert next(found) == location[0]
+    assert list(found) == []
+
+def test_read_provanddata_blobstore(reference_dir):
+    datahash = 'a591a6d40bf420404a011733cfb7b190d62c65bf0bcda32b57b277d9ad9f146e'
+    blobstore = os.path.join(reference_dir, 'blobstore')
+    os.makedirs(os.path.join(blobstore, datahash[:2]))
+    os.rename(os.path.join(reference_dir, datahash), os.path.join(blobstore, datahash[:2], datahash))
+
+    pr, dr, err = read_provanddata({'directory': reference_dir, 'blobstore': blobstore}, 'fd14ee953e58d379989eed4881a0e125392fb1f9f4d39faea99445fe2e472272')
+    assert err == False
+    assert dr.decode(model_encoding) == 'Hello World'
+
+
+def _write_directory_container(base_dir):
+    import datetime
+    from provtoolutils import dataset
+    from provtoolutils.model import make_provstring, Activity, Entity, Person
+    from provtoolutils.utilities import calculate_data_hash
+
+    os.makedirs(os.path.join(base_dir, 'results', 'sub'))
+    for name, content in [('a.dat', b'a'), (os.path.join('sub', 'b.dat'), b'b')]:
+        with open(os.path.join(base_dir, 'results', name), 'wb') as f:
+            f.write(content)
+    entries = dataset.build_manifest(os.path.join(base_dir, 'results'))
+    root = dataset.merkle_root(entries)
+    with open(os.path.join(base_dir, root), 'wb') as f:
+        f.write(dataset.manifest_bytes(entries))
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rawprov = make_provstring('results', Entity.DIRECTORY, Person('Max', 'Mustermann'),
+                              Activity(now, now, '-', 'Directory', '-'), root)
+    cid = calculate_data_hash(rawprov)
+    with open(os.path.join(base_dir, cid + '.prov'), 'wb') as f:
+        f.write(rawprov)
+    return cid
+
+
+def test_read_provanddata_directory():
+    with tempfile.TemporaryDirectory() as base_dir:
+        cid = _write_directory_container(base_dir)
+
+        pr, dr, err = read_provanddata({'directory': base_dir}, cid)
+        assert err == False
+        assert len(json.loads(dr.decode(model_encoding))['files']) == 2
+
+        with open(os.path.join(base_dir, 'results', 'sub', 'b.dat'), 'ab') as f:
+            f.write(b'modified')
+        pr, dr, err = read_provanddata({'directory': base_dir}, cid)
+        assert err == True
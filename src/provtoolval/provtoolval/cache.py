@@ -0,0 +1,71 @@
+import contextlib
+import json
+import sqlite3
+
+from typing import Dict, Iterable, Optional, Tuple
+
+# Number of ids per query. Older sqlite versions allow at most 999 parameters.
+_chunk_size = 500
+
+
+class ValidationCache:
+    """
+    Persistent results of the validation of single containers. Containers are content addressed and therefore do not
+    change. Their data may change or vanish though. Therefore, each result is stored with a fingerprint of the files it
+    was obtained from (see Validator) and only used as long as the fingerprint matches.
+
+    Only containers, which were read and verified successfully, are recorded. The validity of a lineage is combined
+    from the results of its containers on each check.
+
+    Several processes may use the same cache concurrently (write ahead log).
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The database file. It is created, if it does not exist.
+        """
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('create table if not exists verified(cid text primary key, fingerprint text not null, '
+                         'fields text not null)')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # One connection per operation. Connections can not be shared between the threads of the validator.
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, cid: str) -> Optional[Tuple[str, Dict]]:
+        """
+        The fingerprint and the report fields (see Validator) recorded for the container **cid** or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute('select fingerprint, fields from verified where cid = ?', (cid,)).fetchone()
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def get_many(self, cids: Iterable[str]) -> Dict[str, Tuple[str, Dict]]:
+        """
+        The fingerprints and report fields recorded for those of the containers **cids**, which are in the cache.
+        """
+        ids = list(cids)
+        results = {}
+        with self._connect() as conn:
+            for i in range(0, len(ids), _chunk_size):
+                chunk = ids[i:i + _chunk_size]
+                rows = conn.execute('select cid, fingerprint, fields from verified '
+                                    f'where cid in ({", ".join(["?"] * len(chunk))})', chunk)
+                results.update({row[0]: (row[1], json.loads(row[2])) for row in rows})
+        return results
+
+    def put(self, results: Iterable[Tuple[str, str, Dict]]):
+        """
+        Records the (cid, fingerprint, report fields) **results** in a single transaction.
+        """
+        with self._connect() as conn:
+            conn.executemany('insert or replace into verified(cid, fingerprint, fields) values (?, ?, ?)',
+                             [(cid, fingerprint, json.dumps(fields)) for cid, fingerprint, fields in results])
@@ -1,19 +1,17 @@
 import argparse
-import logging
 import os
 import sys
 import textwrap
 
+from provtoolutils import provtoollogger
+from provtoolutils.constants import default_jobs
+from provtoolval.cache import ValidationCache
 from provtoolval.report import create_csv_report, create_html_report
 from provtoolval.validator import Validator
 
 
 if __name__ == '__main__':
-    logger = logging.getLogger('Validator')
-    fh = logging.FileHandler('Validator.log')
-    fh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logger.addHandler(fh)
-    logger.setLevel(logging.WARNING)
+    provtoollogger.configure(default_sinks=['file:Validator.log'], default_level='WARNING')
 
     usage_message = """
         %(prog)s [options]
@@ -44,15 +42,29 @@ if __name__ == '__main__':
         '''
     ), required=True)
 
+    parser.add_argument('--jobs', type=int, default=default_jobs, help=textwrap.dedent(
+        f'''
+            Number of threads reading and verifying the containers of the provenance chain.
+            Defaults to {default_jobs}. With 1, the containers are read one after another.
+        '''
+    ))
+
+    parser.add_argument('--cache', help=textwrap.dedent(
+        '''
+            Database file with the results of earlier validations. Containers, whose files did not change since
+            they were verified, are not read again. The file is created, if it does not exist.
+        '''
+    ), required=False)
+
     args = parser.parse_args()
 
     if not (args.reportfile.endswith('.html') or args.reportfile.endswith('.csv')):
         print('Invalid reportfile. Please specify a file ending with .html or .csv', file=sys.stderr)
         sys.exit(2)
 
-    validator = Validator(args.filelocation)
+    validator = Validator(args.filelocation, ValidationCache(args.cache) if args.cache is not None else None)
 
-    validation_result = validator.check(args.target)
+    validation_result = validator.check(args.target, jobs=args.jobs)
     {
         '.html': create_html_report,
         '.csv': create_csv_report
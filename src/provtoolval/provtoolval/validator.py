@@ -1,9 +1,15 @@
+import glob
 import json
 import logging
 import os
 import sys
 
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from provtoolutils import dataset
+from provtoolutils.blobstore import blob_path, blobstore_env
+from provtoolutils.parallel import run_parallel
+from provtoolval.cache import ValidationCache
 
 if sys.version_info < (3, 10):
     from importlib_metadata import entry_points
@@ -11,103 +17,264 @@ else:
     from importlib.metadata import entry_points
 
 
+# The fields of a report entry, which are read from the container (see Validator._read_entry).
+_read_fields = ['entity_name', 'entity_datahash', 'members', 'act_name', 'start_time', 'end_time', 'used']
+
+
 class Validator:
 
-    def __init__(self, filelocation: str = ''):
+    def __init__(self, filelocation: str = '', cache: ValidationCache = None):
+        """
+        :param cache: Results of earlier validations. Containers, whose files did not change since, are not read
+        again.
+        """
+        # Handlers are configured by the applications (see provtoolutils.provtoollogger).
         self.logger = logging.getLogger('Validator')
-        fh = logging.FileHandler('Validator.log')
-        fh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        self.logger.addHandler(fh)
-        self.logger.setLevel(logging.WARNING)
 
         self._filelocation = filelocation
+        self._plugins = None
+        self._cache = cache
 
-    def read_provanddata(self, pcid):
-        discovered_plugins = entry_points(group='provtoolutils.reader')
-        for dp in discovered_plugins:
-            if dp.name == 'file':
-                if not os.path.exists(self._filelocation):
-                    self.logger.warning('Found reader for file type but to filelocation given')
-                    continue
-                try:
-                    pr, dr, err = dp.load().read_provanddata({'directory': self._filelocation}, pcid)
-                    return pr, dr, err
-                # Catch any exception. These may come from arbitrary plugins and may be unpredictable. On
-                # the other hand the integrity of a container (data and provenance) can always be checked.
-                # Therefore, if any of the readers return without an error, it is sufficient.
-                except Exception as e:
-                    print(e)
+    def _readers(self):
+        # The plugins are loaded once. Lineages may consist of many containers.
+        if self._plugins is None:
+            self._plugins = [(dp.name, dp.load()) for dp in entry_points(group='provtoolutils.reader')
+                             if dp.name == 'file']
+        return self._plugins
+
+    def read_provanddata(self, pcid, directory: str = None):
+        """
+        :param directory: The directory below the file location to search the container in. Defaults to the file
+        location.
+        """
+        directory = directory if directory is not None else self._filelocation
+        for name, plugin in self._readers():
+            if not os.path.exists(directory):
+                self.logger.warning('Found reader for file type but to filelocation given')
+                continue
+            try:
+                pr, dr, err = plugin.read_provanddata({'directory': directory}, pcid)
+                return pr, dr, err
+            # Catch any exception. These may come from arbitrary plugins and may be unpredictable. On
+            # the other hand the integrity of a container (data and provenance) can always be checked.
+            # Therefore, if any of the readers return without an error, it is sufficient.
+            except Exception as e:
+                print(e)
 
         return None, None, True
 
-    def check(self, pcid) -> List[Dict]:
+    def _read_entry(self, pcid: str, entry: Dict, directory: str = None) -> List[str]:
+        """
+        Reads the container **pcid** into its report **entry**.
+
+        :param directory: See read_provanddata.
+        :return: The ids of the used containers.
+        :raises ValueError: If the container can not be read or is invalid.
+        """
+        # Without a directory, read_provanddata is called as before. It may be overridden with a single argument.
+        pr, dr, err = self.read_provanddata(pcid) if directory is None else self.read_provanddata(pcid, directory)
+        if err:
+            raise ValueError(f'Error reading the provenance file {pcid}')
+        provenance = json.loads(pr)
+        entity = next(iter(provenance['entity'].values()))
+        entry['entity_name'] = entity['prov:label']
+        entry['entity_datahash'] = entity['provtool:datahash']
+        if entity.get('prov:type') == dataset.directory_type:
+            # The reader verified the files of the directory against the manifest already.
+            entry['members'] = len(json.loads(dr)['files'])
+
+        activity = next(iter(provenance['activity'].values()))
+        entry['act_name'] = activity['prov:label']
+        entry['start_time'] = activity['prov:startTime']
+        entry['end_time'] = activity['prov:endTime']
+        if 'used' in provenance:
+            entry['used'] = [u['prov:entity'] for u in provenance['used'].values()]
+        return entry['used']
+
+    def _container_path(self, pcid: str) -> Optional[str]:
+        """
+        The path of the container file of **pcid** in the file location or None. Same resolution (first match) as
+        the file reader. The file location is only searched up to the first match.
+        """
+        return next(glob.iglob(os.path.join(self._filelocation, '**', pcid) + '.prov', recursive=True), None)
+
+    @staticmethod
+    def _fingerprint(container_path: str, fields: Dict) -> Optional[str]:
+        """
+        Size and modification time of the files the file reader verifies a container with: the container, its data
+        (in the blob store or next to the container) and for directories the files of the directory. None, if the data
+        is missing at its place.
+        """
+        datahash = fields['entity_datahash']
+        data_path = os.path.join(os.path.dirname(container_path), datahash)
+        blobstore = os.environ.get(blobstore_env)
+        if blobstore is not None and os.path.isfile(blob_path(blobstore, datahash)):
+            data_path = blob_path(blobstore, datahash)
+        paths = [container_path, data_path]
+        if 'members' in fields:
+            members = os.path.join(os.path.dirname(container_path), fields['entity_name'])
+            paths.extend(sorted(os.path.join(dirpath, f) for dirpath, _, filenames in os.walk(members)
+                                for f in filenames))
+
+        fingerprint = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return None
+            fingerprint.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+        return json.dumps(fingerprint)
+
+    def _prefetch(self, pcid: str, jobs: int, read_entry: Callable[[str, Dict], List[str]],
+                  fetch: Callable[[List[str]], None]) -> Dict[str, Union[Tuple[Dict, List[str]], ValueError]]:
+        """
+        Reads the lineage of **pcid** breadth first. The containers of each frontier are read and verified (including
+        hashing their data) by a pool of **jobs** threads, the ids they used form the next frontier. **fetch** is
+        called with each frontier before it is read.
+
+        :return: For each container the fields of its report entry and the ids of the used containers, or the error.
+        """
+        def read(cid):
+            fields = {'used': []}
+            try:
+                return read_entry(cid, fields), fields
+            except ValueError as e:
+                return e, None
+
+        results = {}
+        frontier = [pcid]
+        while len(frontier) > 0:
+            fetch(frontier)
+            for cid, (used, fields) in zip(frontier, run_parallel(read, frontier, jobs)):
+                results[cid] = used if fields is None else (fields, used)
+            frontier = list(dict.fromkeys(u for cid in frontier if not isinstance(results[cid], ValueError)
+                                          for u in results[cid][1] if u not in results))
+        return results
+
+    def check(self, pcid, jobs: int = 1) -> List[Dict]:
         """
             Result is returned in json-compatible schema. See: constants.py: report_schema
+
+            The lineage is traversed depth first with an explicit stack, so its depth is not limited by the recursion
+            limit. Each container is read once. The report lists a container after the containers it used (up to the
+            first invalid one, after which the remaining are not checked).
+
+            :param jobs: With more than one job, all containers of the lineage are read and verified in parallel
+            first (see _prefetch). The validity is combined afterwards in the same order, so the report does not
+            depend on the number of jobs.
+
+            With a cache, only containers, which are not in the cache or whose files changed, are read. The newly
+            verified containers are added to the cache.
         """
+        # Cached results by container id. They are fetched lazily, one query for the containers used by a container
+        # (or for a frontier with more than one job).
+        cache = {}
+        fetched = set()
+        verified = []
+
+        def fetch(pcids: List[str]):
+            pcids = [c for c in pcids if c not in fetched]
+            if self._cache is not None and len(pcids) > 0:
+                fetched.update(pcids)
+                cache.update(self._cache.get_many(pcids))
+
+        def read_entry(pcid: str, entry: Dict) -> List[str]:
+            if self._cache is None:
+                return self._read_entry(pcid, entry)
+            # The path of the container is cached with its fields. The file location is only searched, if the
+            # container is not in the cache or not at its place anymore.
+            container_path = None
+            cached = cache.get(pcid)
+            if cached is not None:
+                fields = dict(cached[1])
+                container_path = fields.pop('container', None)
+                if container_path is not None and cached[0] == self._fingerprint(container_path, fields):
+                    entry.update(fields)
+                    return entry['used']
+            if container_path is None or not os.path.isfile(container_path):
+                container_path = self._container_path(pcid)
+            if container_path is None:
+                return self._read_entry(pcid, entry)
+
+            # The reader searches the directory of the container only.
+            used = self._read_entry(pcid, entry, os.path.dirname(container_path))
+            fingerprint = self._fingerprint(container_path, entry)
+            if fingerprint is not None:
+                fields = {k: entry[k] for k in _read_fields if k in entry}
+                fields['container'] = container_path
+                verified.append((pcid, fingerprint, fields))
+            return used
+
+        fetch([pcid])
+        prefetched = self._prefetch(pcid, jobs, read_entry, fetch) if jobs > 1 else {}
+
+        def read(pcid: str, entry: Dict) -> List[str]:
+            if pcid not in prefetched:
+                used = read_entry(pcid, entry)
+                fetch(used)
+                return used
+            if isinstance(prefetched[pcid], ValueError):
+                raise prefetched[pcid]
+            fields, used = prefetched[pcid]
+            entry.update(fields)
+            return used
+
         known_ids = {}
+        # The containers on the stack. Reaching one of them again is a cycle.
+        visiting = set()
+        report_entries = []
+        # Frames of the containers on the stack: entry, iterator over the used ids, id of the used container checked.
+        stack = []
 
-        def _check(pcid: str, ancestors: List[str], report_entries: List[str], used_by=None):
+        def enter(pcid: str, used_by: Optional[str]) -> Optional[bool]:
+            """
+            The validity of an already known container or None, if the container is put on the stack for checking.
+            """
             if pcid in known_ids:
                 if used_by is not None:
                     known_ids[pcid]['used_by'].append(used_by)
+                if pcid in visiting:
+                    self.logger.warning(f'Cycle in the lineage of {pcid}')
                 return known_ids[pcid]['valid']
 
-            entity_name = 'UNKNOWN'
-            entity_datahash = 'UNKNOWN'
-            act_name = 'UNKNOWN'
-            start_time = None
-            end_time = None
-            used = []
-            entry = {'entity': pcid, 'data': entity_datahash, 'name': entity_name, 'valid': False,
-                     'used_by': [used_by], 'activity': act_name,
-                     'start_time': start_time, 'end_time': end_time, 'used': used}
+            entry = {'entity': pcid, 'data': 'UNKNOWN', 'name': 'UNKNOWN', 'valid': False,
+                     'used_by': [used_by], 'activity': 'UNKNOWN',
+                     'start_time': None, 'end_time': None, 'used': []}
             known_ids[pcid] = entry
-
             try:
-                pr, dr, err = self.read_provanddata(pcid)
-                if err:
-                    raise ValueError(f'Error reading the provenance file {pcid}')
-                provenance = json.loads(pr)
-                entity = next(iter(provenance['entity'].values()))
-                entry['entity_name'] = entity['prov:label']
-                entry['entity_datahash'] = entity['provtool:datahash']
-
-                ancestors.append(pcid)
-                entry['act_name'] = next(iter(provenance['activity'].values()))['prov:label']
-                entry['start_time'] = next(iter(provenance['activity'].values()))['prov:startTime']
-                entry['end_time'] = next(iter(provenance['activity'].values()))['prov:endTime']
-                if 'used' in provenance:
-                    entry['used'] = [u['prov:entity'] for u in provenance['used'].values()]
-                    for u in provenance['used'].values():
-                        # Check, if used entities are valid
-                        result_of_used = _check(u['prov:entity'], ancestors, report_entries, pcid)
-                        if not result_of_used:
-                            self.logger.warning(f"Used resource not valid: Expecting {u['prov:entity']} for {pcid}")
-                            report_entries.append(entry)
-                            return False
-
-                entry['valid'] = True
-                report_entries.append(entry)
-                return True
+                used = read(pcid, entry)
             except ValueError as e:
                 self.logger.warning('Problems with processing {}'.format(pcid))
                 self.logger.warning(e)
                 report_entries.append(entry)
                 return False
 
-        report_entries = []
-        _check(pcid, [], report_entries)
+            visiting.add(pcid)
+            stack.append([entry, iter(used), None])
+            return None
 
-        # Dedup and merge used_by
-        deduped = {}
-        for re in report_entries:
-            key = str(re['entity']) + str(re['name']) + str(re['valid'])
-            if key in deduped:
-                deduped[key]['used_by'] = deduped[key]['used_by'] + re['used_by']
+        result = enter(pcid, None)
+        while len(stack) > 0:
+            frame = stack[-1]
+            entry = frame[0]
+            if result is False:
+                self.logger.warning(f"Used resource not valid: Expecting {frame[2]} for {entry['entity']}")
             else:
-                deduped[key] = re
+                frame[2] = next(frame[1], None)
+                if frame[2] is not None:
+                    # Check, if used entities are valid
+                    result = enter(frame[2], entry['entity'])
+                    continue
+                entry['valid'] = True
+            report_entries.append(entry)
+            visiting.remove(entry['entity'])
+            stack.pop()
+            result = entry['valid']
+
+        for re in report_entries:
+            re['used_by'] = [u for u in re['used_by'] if u is not None]
 
-        for v in deduped.values():
-            v['used_by'] = [u for u in v['used_by'] if u is not None]
+        if len(verified) > 0:
+            self._cache.put(verified)
 
         return report_entries
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+from provtoolval.cache import ValidationCache
+
+
+def test_cache():
+    with tempfile.TemporaryDirectory() as d:
+        cache = ValidationCache(os.path.join(d, 'cache.db'))
+        assert cache.get('1' * 64) is None
+
+        cache.put([('1' * 64, 'fingerprint', {'entity_name': 'a.txt', 'used': ['2' * 64]})])
+        assert cache.get('1' * 64) == ('fingerprint', {'entity_name': 'a.txt', 'used': ['2' * 64]})
+
+        # Results are replaced and persist.
+        cache.put([('1' * 64, 'other', {'entity_name': 'a.txt', 'used': []})])
+        reopened = ValidationCache(os.path.join(d, 'cache.db'))
+        assert reopened.get('1' * 64) == ('other', {'entity_name': 'a.txt', 'used': []})
+        assert reopened.get_many([str(i) for i in range(1000)] + ['1' * 64]) == {'1' * 64: ('other', {
+            'entity_name': 'a.txt', 'used': []})}
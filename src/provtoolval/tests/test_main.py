@@ -67,3 +67,23 @@ def test_incomplete_arguments(reference_dir):
     ])
 
     assert rc != 0
+
+
+def test_main_cache(reference_dir):
+    cachefile_path = os.path.join(reference_dir, 'validation_cache.db')
+    for i in range(2):
+        rfp = os.path.join(reference_dir, f'validation_report_{i}.csv')
+        rc = subprocess.call([
+            'python',
+            '-m', 'provtoolval.main',
+            '--filelocation', reference_dir,
+            '--target', '52da7d6cfd7eec1fee8b40f7311484d36a186eca32a1fd1a491751d0abd40b29',
+            '--reportfile', rfp,
+            '--cache', cachefile_path
+        ])
+        assert rc == 0
+        assert os.path.exists(cachefile_path)
+
+    with open(os.path.join(reference_dir, 'validation_report_0.csv')) as first, \
+            open(os.path.join(reference_dir, 'validation_report_1.csv')) as second:
+        assert first.read() == second.read()
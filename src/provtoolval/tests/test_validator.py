@@ -1,7 +1,10 @@
+import glob
+import json
 import jsonschema
 import os
 import pytest
 import random
+import sys
 import tempfile
 
 from distutils import dir_util
@@ -66,3 +69,188 @@ def test_check(reference_dir):
     check_result_random = v.check(random_bytes_id)
     jsonschema.validate(check_result_random, report_schema)
     assert not check_result_random[0]['valid']
+
+
+def test_check_directory(ref_tmpdir):
+    import datetime
+    from provtoolutils import dataset
+    from provtoolutils.model import make_provstring, Activity, Entity, Person
+
+    os.makedirs(os.path.join(ref_tmpdir, 'results'))
+    for name in ['a.dat', 'b.dat']:
+        with open(os.path.join(ref_tmpdir, 'results', name), 'wb') as f:
+            f.write(name.encode('utf-8'))
+    entries = dataset.build_manifest(os.path.join(ref_tmpdir, 'results'))
+    root = dataset.merkle_root(entries)
+    with open(os.path.join(ref_tmpdir, root), 'wb') as f:
+        f.write(dataset.manifest_bytes(entries))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rawprov = make_provstring('results', Entity.DIRECTORY, Person('Max', 'Mustermann'),
+                              Activity(now, now, '-', 'Directory', '-'), root)
+    cid = calculate_data_hash(rawprov)
+    with open(os.path.join(ref_tmpdir, cid + '.prov'), 'wb') as f:
+        f.write(rawprov)
+
+    check_result = Validator(filelocation=ref_tmpdir).check(cid)
+    jsonschema.validate(check_result, report_schema)
+    assert check_result[0]['valid']
+    assert check_result[0]['members'] == 2
+
+    os.remove(os.path.join(ref_tmpdir, 'results', 'a.dat'))
+    check_result = Validator(filelocation=ref_tmpdir).check(cid)
+    assert not check_result[0]['valid']
+
+
+def _chain_reader(parents, invalid=()):
+    """
+    A reader for synthetic containers. **parents** maps each container id to the ids of the containers it used.
+    """
+    def read_provanddata(pcid):
+        if pcid not in parents or pcid in invalid:
+            return None, None, True
+        provenance = {
+            'entity': {'self': {'prov:label': pcid, 'provtool:datahash': pcid}},
+            'activity': {'a': {'prov:label': 'Step', 'prov:startTime': '2021-01-01T00:00:00+00:00',
+                               'prov:endTime': '2021-01-01T00:00:00+00:00'}}
+        }
+        if len(parents[pcid]) > 0:
+            provenance['used'] = {f'u{i}': {'prov:entity': p} for i, p in enumerate(parents[pcid])}
+        return json.dumps(provenance).encode('utf-8'), b'', False
+
+    return read_provanddata
+
+
+def test_check_deep_chain(mocker):
+    depth = 20 * sys.getrecursionlimit()
+    parents = {str(i): [str(i - 1)] if i > 0 else [] for i in range(depth)}
+    # A second lineage joins the chain in the middle.
+    parents['side'] = [str(depth // 2)]
+    parents['top'] = [str(depth - 1), 'side']
+    v = Validator()
+    mocker.patch.object(v, 'read_provanddata', side_effect=_chain_reader(parents))
+
+    check_result = v.check('top')
+    assert len(check_result) == depth + 2
+    assert all(e['valid'] for e in check_result)
+    assert [e['entity'] for e in check_result[:3]] == ['0', '1', '2']
+    assert [e['entity'] for e in check_result[-2:]] == ['side', 'top']
+    assert check_result[depth // 2]['used_by'] == [str(depth // 2 + 1), 'side']
+    # Each container is read once.
+    assert v.read_provanddata.call_count == depth + 2
+
+    # An invalid container invalidates all containers, which depend on it.
+    v = Validator()
+    mocker.patch.object(v, 'read_provanddata', side_effect=_chain_reader(parents, invalid={'10'}))
+    check_result = v.check('top')
+    assert not any(e['valid'] for e in check_result)
+    # The containers below the unreadable one are not reached. After the chain turned out invalid, the side lineage
+    # is not checked anymore.
+    assert [e['entity'] for e in check_result[:2]] == ['10', '11']
+    assert len(check_result) == depth - 10 + 1
+    assert check_result[-1]['entity'] == 'top' and not check_result[-1]['valid']
+
+
+def test_check_cycle(mocker):
+    v = Validator()
+    mocker.patch.object(v, 'read_provanddata', side_effect=_chain_reader({'a': ['b'], 'b': ['c'], 'c': ['a']}))
+
+    check_result = v.check('a')
+    assert [(e['entity'], e['valid']) for e in check_result] == [('c', False), ('b', False), ('a', False)]
+    assert check_result[2]['used_by'] == ['c']
+
+
+@pytest.mark.parametrize('invalid', [(), ('5',), ('top',)])
+def test_check_parallel(mocker, invalid):
+    # A lineage with shared ancestors.
+    parents = {str(i): [str(j) for j in range(max(0, i - 3), i)] for i in range(50)}
+    parents['top'] = ['49', '20']
+    sequential = Validator()
+    mocker.patch.object(sequential, 'read_provanddata', side_effect=_chain_reader(parents, invalid))
+    parallel = Validator()
+    mocker.patch.object(parallel, 'read_provanddata', side_effect=_chain_reader(parents, invalid))
+
+    assert parallel.check('top', jobs=4) == sequential.check('top')
+    # The containers are read once, also those the sequential check did not reach.
+    assert parallel.read_provanddata.call_count == (1 if invalid == ('top',) else len(parents))
+
+
+def test_check_parallel_files(reference_dir):
+    for pcid in ['f50a36489bb2efd260872f8c97b7382a4e9f92832256c16ecd2c4ef53e876551',
+                 '93eea484b4e263713cd0215720648eaedc557ed83101b29800c86e6217b3b079',
+                 'eacd6ad0653b95ab22df1c539442dcbaaf9c60f2155517c4203da01e746e0f45']:
+        assert Validator(filelocation=reference_dir).check(pcid, jobs=4) == \
+            Validator(filelocation=reference_dir).check(pcid)
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_check_cache(reference_dir, mocker, jobs):
+    from provtoolval.cache import ValidationCache
+
+    cache = ValidationCache(os.path.join(reference_dir, 'cache.db'))
+    target = 'eacd6ad0653b95ab22df1c539442dcbaaf9c60f2155517c4203da01e746e0f45'
+    expected = Validator(filelocation=reference_dir).check(target)
+
+    v = Validator(filelocation=reference_dir, cache=cache)
+    spy = mocker.spy(v, '_read_entry')
+    assert v.check(target, jobs=jobs) == expected
+    assert spy.call_count == 3
+
+    # All containers are taken from the cache. Only the containers of the lineage are looked up.
+    v = Validator(filelocation=reference_dir, cache=cache)
+    spy = mocker.spy(v, '_read_entry')
+    lookup = mocker.spy(cache, 'get_many')
+    search = mocker.spy(glob, 'iglob')
+    assert v.check(target, jobs=jobs) == expected
+    assert spy.call_count == 0
+    # The containers are found at their cached paths. The file location is not searched.
+    assert search.call_count == 0
+    assert sorted(c for call in lookup.call_args_list for c in call.args[0]) == sorted(e['entity'] for e in expected)
+
+    # A lineage with a missing container. The missing one is not cached, the readable one is.
+    v = Validator(filelocation=reference_dir, cache=cache)
+    spy = mocker.spy(v, '_read_entry')
+    check_result = v.check('93eea484b4e263713cd0215720648eaedc557ed83101b29800c86e6217b3b079', jobs=jobs)
+    assert spy.call_count == 2
+    assert cache.get(check_result[0]['entity']) is None
+    assert cache.get(check_result[1]['entity']) is not None
+
+    # Changed data is verified again.
+    data_path = os.path.join(reference_dir, expected[0]['entity_datahash'])
+    with open(data_path, 'ab') as f:
+        f.write(b'changed')
+    v = Validator(filelocation=reference_dir, cache=cache)
+    spy = mocker.spy(v, '_read_entry')
+    check_result = v.check(target, jobs=jobs)
+    assert [c.args[0] for c in spy.call_args_list] == [expected[0]['entity']]
+    assert not check_result[0]['valid']
+    assert not check_result[-1]['valid']
+
+
+def test_check_cache_directory(ref_tmpdir):
+    from provtoolval.cache import ValidationCache
+    import datetime
+    from provtoolutils import dataset
+    from provtoolutils.model import make_provstring, Activity, Entity, Person
+
+    os.makedirs(os.path.join(ref_tmpdir, 'results'))
+    with open(os.path.join(ref_tmpdir, 'results', 'a.dat'), 'wb') as f:
+        f.write(b'a')
+    entries = dataset.build_manifest(os.path.join(ref_tmpdir, 'results'))
+    root = dataset.merkle_root(entries)
+    with open(os.path.join(ref_tmpdir, root), 'wb') as f:
+        f.write(dataset.manifest_bytes(entries))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rawprov = make_provstring('results', Entity.DIRECTORY, Person('Max', 'Mustermann'),
+                              Activity(now, now, '-', 'Directory', '-'), root)
+    cid = calculate_data_hash(rawprov)
+    with open(os.path.join(ref_tmpdir, cid + '.prov'), 'wb') as f:
+        f.write(rawprov)
+
+    cache = ValidationCache(os.path.join(ref_tmpdir, 'cache.db'))
+    assert Validator(filelocation=ref_tmpdir, cache=cache).check(cid)[0]['valid']
+    assert cache.get(cid)[1]['members'] == 1
+
+    # A file added to the directory invalidates the cached result.
+    with open(os.path.join(ref_tmpdir, 'results', 'b.dat'), 'wb') as f:
+        f.write(b'b')
+    assert not Validator(filelocation=ref_tmpdir, cache=cache).check(cid)[0]['valid']
@@ -15,9 +15,9 @@ from provtoolvis import create_image
 
 from typing import Dict, List, Set, Tuple
 
-from provtoolutils.constants import prov_schema
+from provtoolutils.constants import model_encoding, prov_schema
+from provtoolutils.provgraph import ProvGraph
 from provtoolutils.quilt import Matrix
-from provtoolutils.utilities import convert_rawprov2containerprov
 
 
 def read_provanddata(options, cid):
@@ -63,6 +63,33 @@ def _setup_logging():
     return logger
 
 
+def _read_valid(options: dict, cid: str):
+    """
+    Reads a container like read_provanddata. Containers with an invalid schema are treated as unreadable.
+    """
+    pr, dr, err = read_provanddata(options, cid)
+    if err:
+        logging.getLogger('visualisation').warning(f'Problems while reading {cid}')
+    if pr is None:
+        return pr, dr, err
+    try:
+        jsonschema.validate(json.loads(pr.decode(model_encoding)), prov_schema)
+    except jsonschema.ValidationError:
+        logging.getLogger('visualisation').warning('Invalid schema for {}'.format(cid))
+        traceback.print_exc()
+        return None, None, True
+    return pr, dr, err
+
+
+def load_graph(options: dict, cid: str) -> ProvGraph:
+    """
+    Loads the provenance graph of the given container and all of its ancestors. Each container is read once.
+    :param options: A dictionary containing all the parameters to resolve the provenance graph.
+    :return: The provenance graph.
+    """
+    return ProvGraph.load(lambda c: _read_valid(options, c), cid)
+
+
 def find_prov_ids_recursive(options: dict, cid: str) -> List[str]:
     """
     Searches recursively through a provenance graph and reports the container ids found.
@@ -70,78 +97,68 @@ def find_prov_ids_recursive(options: dict, cid: str) -> List[str]:
     graph.
     :return: The ids of the provenance containers.
     """
-    prov_ids = []
-    to_scan = [cid]
-    used = set()
-    while len(to_scan) > 0:
-        cid = to_scan.pop()
-        used.add(cid)
-        prov_ids.append(cid)
-        pr, _, err = read_provanddata(options, cid)
+    graph = load_graph(options, cid)
 
-        j = json.loads(convert_rawprov2containerprov(pr))
-        if 'used' in j:
-            for u in j['used'].values():
-                to_scan.append(u['prov:entity'])
+    return [graph.name(n) for n in graph.nodes(ProvGraph.ENTITY) if graph.loaded(n)]
 
-    return prov_ids
 
+def load_containers(options, prov_ids: List[str]) -> ProvGraph:
+    """
+    Reads the given containers (and only these) into a provenance graph. Each container is read once.
+    """
+    graph = ProvGraph()
+    for pf in prov_ids:
+        pr, _, _ = _read_valid(options, pf)
+        if pr is not None:
+            graph.add_provenance(os.path.basename(pf).replace('.prov', ''), json.loads(pr.decode(model_encoding)))
+    return graph
 
-def search_prov_files_for_relations(options, prov_ids: List[str]) -> Tuple[Set[str], Dict[str, str],
-                                                                           Dict[str, str], Dict[str, str],
-                                                                           Dict[str, str]]:
-    logger = _setup_logging()
-    activities = set()
-    activities.add('UNKNOWN_ACTIVITY')
-    agents = set()
-    agents.add('UNKNOWN_AGENT')
+
+def graph_relations(graph: ProvGraph) -> Tuple[Set[str], Set[str], Dict[str, Set[str]], Dict[str, str],
+                                               Dict[str, str], Dict[str, str], Dict[str, str]]:
+    """
+    The relations of a provenance graph in the form used for creating the quilt: agents, activities, used entities
+    by activity, generating activity by entity, responsible person by activity (by id and by label) and the labels
+    by id. Entities, which are used but were not loaded, are generated by the unknown activity.
+    """
+    activities = {'UNKNOWN_ACTIVITY'}
+    agents = {'UNKNOWN_AGENT'}
     generations = {}
     used = {}
     act2ag = {'UNKNOWN_ACTIVITY': 'UNKNOWN_AGENT'}
-    act2ag_trans = {}
     id2label = {'UNKNOWN_ACTIVITY': 'Unknown activity', 'UNKNOWN_AGENT': 'Unknown agent'}
-    for pf in prov_ids:
-        pr, _, err = read_provanddata(options, pf)
-        if err:
-            logger.warn(f'Problems while reading {pf}')
-        j = json.loads(convert_rawprov2containerprov(pr))
-        try:
-            jsonschema.validate(j, prov_schema)
-        except jsonschema.ValidationError:
-            logger.warning('Invalid schema for {}'.format(pf))
-            traceback.print_exc()
-            continue
-        act = next(iter(j['activity'].values()))
-        act['id'] = next(iter(j['activity'].keys()))
-        activities.add(act['id'])
-        id2label[act['id']] = act['prov:label']
-        entity = next(iter(j['entity'].values()))
-        entity['id'] = os.path.basename(pf).replace('.prov', '')
-        id2label[entity['id']] = entity['prov:label']
-
-        for k, v in j['agent'].items():
-            agents.add(k)
-            id2label[k] = v['prov:label']
-
-        # Not exact. There could be more than 1 person as agent, for example in a actedOnBehalfOf-relation.
-        act2ag[act['id']] = [ag for ag, props in j['agent'].items() if props['prov:type'] == 'prov:Person'][0]
-
-        generations[entity['id']] = act['id']
-        if 'used' in j:
-            for u in j['used'].values():
-                li = used.get(u['prov:activity'], set())
-                li.add(u['prov:entity'])
-                used[u['prov:activity']] = li
-
-                if not u['prov:entity'] in id2label:
-                    id2label[u['prov:entity']] = u['prov:entity']
-                if not u['prov:entity'] in generations:
-                    generations[u['prov:entity']] = 'UNKNOWN_ACTIVITY'
-
-    for k, v in act2ag.items():
-        act2ag_trans[id2label[k]] = id2label[v]
-
-    return set(agents), activities, used, generations, act2ag, act2ag_trans, id2label
+    for n in graph.nodes():
+        name = graph.name(n)
+        if graph.kind(n) == ProvGraph.AGENT:
+            agents.add(name)
+            id2label[name] = graph.get(n, 'label')
+        elif graph.kind(n) == ProvGraph.ACTIVITY and graph.loaded(n):
+            activities.add(name)
+            id2label[name] = graph.get(n, 'label')
+            # Not exact. There could be more than 1 person as agent, for example in a actedOnBehalfOf-relation.
+            act2ag[name] = [graph.name(a) for a in graph.neighbours('wasAssociatedWith', n)
+                            if graph.get(a, 'type') == 'prov:Person'][0]
+            for e in graph.neighbours('used', n):
+                used.setdefault(name, set()).add(graph.name(e))
+        elif graph.kind(n) == ProvGraph.ENTITY and graph.loaded(n):
+            id2label[name] = graph.get(n, 'label')
+            generations[name] = graph.name(graph.neighbours('wasGeneratedBy', n)[0])
+        elif graph.kind(n) == ProvGraph.ENTITY:
+            id2label[name] = name
+            generations[name] = 'UNKNOWN_ACTIVITY'
+
+    act2ag_trans = {id2label[k]: id2label[v] for k, v in act2ag.items()}
+
+    return agents, activities, used, generations, act2ag, act2ag_trans, id2label
+
+
+def search_prov_files_for_relations(options, prov_ids: List[str]) -> Tuple[Set[str], Set[str], Dict[str, Set[str]],
+                                                                           Dict[str, str], Dict[str, str],
+                                                                           Dict[str, str], Dict[str, str]]:
+    """
+    The relations (see graph_relations) of the given containers.
+    """
+    return graph_relations(load_containers(options, prov_ids))
 
 
 def find_relevant_ids(specified_entity, used, generations, act2ag, logger: logging.Logger = None):
@@ -228,9 +245,9 @@ def create_matrices(activities, relevant_used, relevant_generations, used_for_sp
 
 
 def main(target_id, image_file, args):
-    prov_ids = find_prov_ids_recursive(args, target_id)
+    # Each container of the lineage is read once. The relations are taken from the graph.
     agents, activities, used, generations, act2ag, act2ag_trans, id2label = \
-        search_prov_files_for_relations(args, prov_ids)
+        graph_relations(load_graph(args, target_id))
 
     used_for_specified_entity = find_relevant_ids(target_id, used, generations, act2ag)
     relevant_used, relevant_generations = find_relevant_usage_and_generation(used_for_specified_entity,
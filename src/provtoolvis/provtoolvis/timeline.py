@@ -0,0 +1,284 @@
+import argparse
+import datetime
+import heapq
+import json
+import textwrap
+
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import dateutil.parser
+
+from provtoolutils.provgraph import ProvGraph
+from provtoolvis.file2quilt import ReaderAction, load_graph
+
+
+def _timestamp(value: Optional[str], cache: Dict[str, Optional[float]]) -> Optional[float]:
+    """
+    Converts an xsd:dateTime into seconds since the epoch. Timestamps repeat a lot within a lineage (the model
+    truncates them to seconds), therefore the results are cached.
+    """
+    if value is None:
+        return None
+    if value in cache:
+        return cache[value]
+    try:
+        # Much faster than dateutil and sufficient for the timestamps written by provtoolutils.
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = dateutil.parser.isoparse(value)
+        except ValueError:
+            parsed = None
+    if parsed is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    cache[value] = None if parsed is None else parsed.timestamp()
+    return cache[value]
+
+
+def activity_dag(graph: ProvGraph) -> Tuple[List[int], List[List[int]]]:
+    """
+    Derives the dependencies between the activities of **graph**. An activity depends on another one, if it used an
+    entity generated by the other one.
+
+    :return: The activity nodes and for each of them (by position) the positions of the activities it depends on.
+    """
+    activities = list(graph.nodes(ProvGraph.ACTIVITY))
+    position = {a: i for i, a in enumerate(activities)}
+
+    predecessors: List[List[int]] = []
+    for a in activities:
+        preds = set()
+        for entity in graph.neighbours('used', a):
+            for generator in graph.neighbours('wasGeneratedBy', entity):
+                if generator != a:
+                    preds.add(position[generator])
+        predecessors.append(sorted(preds))
+    return activities, predecessors
+
+
+def topological_order(predecessors: List[List[int]]) -> List[int]:
+    """
+    Sorts the positions of a dag given by its predecessor lists (Kahn's algorithm). Predecessors come first.
+    """
+    count = len(predecessors)
+    indegree = array('l', [0]) * count
+    successors: List[List[int]] = [[] for _ in range(count)]
+    for node, preds in enumerate(predecessors):
+        indegree[node] = len(preds)
+        for p in preds:
+            successors[p].append(node)
+
+    order = [n for n in range(count) if indegree[n] == 0]
+    # order grows while it is traversed. It is the queue of Kahn's algorithm as well.
+    for node in order:
+        for s in successors[node]:
+            indegree[s] -= 1
+            if indegree[s] == 0:
+                order.append(s)
+
+    if len(order) != count:
+        raise ValueError(f'The activities contain a cycle. {count - len(order)} activities are affected')
+    return order
+
+
+def parallelism_profile(starts: List[float], ends: List[float]) -> List[Tuple[float, int]]:
+    """
+    Computes the number of activities running concurrently over time.
+
+    :return: (time, number of running activities) for each time the number changes. The number holds until the next
+    entry.
+    """
+    events = sorted([(s, 1) for s in starts] + [(e, -1) for e in ends])
+    profile: List[Tuple[float, int]] = []
+    running = 0
+    for time, delta in events:
+        running = running + delta
+        if len(profile) > 0 and profile[-1][0] == time:
+            profile[-1] = (time, running)
+        else:
+            profile.append((time, running))
+    return profile
+
+
+class Timeline:
+    """
+    Timing analysis of the activities of a lineage.
+
+    The critical path method (CPM) schedules each activity as early as its dependencies allow, using the observed
+    durations (end time - start time). The critical path is the longest chain of dependent activities; its length is
+    the minimal makespan with unlimited resources. The slack of an activity is the time it could be delayed without
+    delaying the whole lineage. Activities without start or end time are assumed to take no time.
+
+    All times are seconds. Per activity values are given as lists in the order of **activities**.
+    """
+
+    def __init__(self, graph: ProvGraph):
+        self.graph = graph
+        self.activities, self.predecessors = activity_dag(graph)
+        count = len(self.activities)
+
+        cache: Dict[str, Optional[float]] = {}
+        self.start: List[Optional[float]] = []
+        self.end: List[Optional[float]] = []
+        self.duration = array('d', [0.0]) * count
+        for i, a in enumerate(self.activities):
+            start = _timestamp(graph.get(a, 'start_time'), cache)
+            end = _timestamp(graph.get(a, 'end_time'), cache)
+            self.start.append(start)
+            self.end.append(end)
+            if start is not None and end is not None:
+                self.duration[i] = max(0.0, end - start)
+
+        order = topological_order(self.predecessors)
+
+        # Forward pass: earliest start and finish. The predecessor finishing last is remembered to walk the critical
+        # path backwards later on.
+        self.earliest_start = array('d', [0.0]) * count
+        earliest_finish = array('d', [0.0]) * count
+        critical_predecessor = array('l', [-1]) * count
+        for node in order:
+            for p in self.predecessors[node]:
+                if critical_predecessor[node] < 0 or earliest_finish[p] > self.earliest_start[node]:
+                    self.earliest_start[node] = earliest_finish[p]
+                    critical_predecessor[node] = p
+            earliest_finish[node] = self.earliest_start[node] + self.duration[node]
+
+        self.critical_length = max(earliest_finish) if count > 0 else 0.0
+
+        # Backward pass: latest finish without delaying the lineage.
+        latest_finish = array('d', [self.critical_length]) * count
+        self.slack = array('d', [0.0]) * count
+        for node in reversed(order):
+            latest_start = latest_finish[node] - self.duration[node]
+            self.slack[node] = max(0.0, latest_start - self.earliest_start[node])
+            for p in self.predecessors[node]:
+                if latest_start < latest_finish[p]:
+                    latest_finish[p] = latest_start
+
+        self.critical_path: List[int] = []
+        if count > 0:
+            node = max(range(count), key=lambda n: earliest_finish[n])
+            while node >= 0:
+                self.critical_path.append(node)
+                node = critical_predecessor[node]
+            self.critical_path.reverse()
+
+    def timed(self) -> List[int]:
+        """
+        The positions of the activities with start and end time.
+        """
+        return [i for i in range(len(self.activities)) if self.start[i] is not None and self.end[i] is not None]
+
+    def makespan(self) -> float:
+        """
+        The observed time from the first start to the last end.
+        """
+        timed = self.timed()
+        if len(timed) == 0:
+            return 0.0
+        return max(self.end[i] for i in timed) - min(self.start[i] for i in timed)
+
+    def profile(self) -> List[Tuple[float, int]]:
+        timed = self.timed()
+        return parallelism_profile([self.start[i] for i in timed], [self.end[i] for i in timed])
+
+    def average_parallelism(self) -> float:
+        """
+        The sum of all durations divided by the observed makespan.
+        """
+        makespan = self.makespan()
+        return sum(self.duration) / makespan if makespan > 0 else 0.0
+
+    def label(self, position: int) -> str:
+        label = self.graph.get(self.activities[position], 'label')
+        return label if label is not None else self.graph.name(self.activities[position])
+
+    def chrome_trace(self) -> Dict:
+        """
+        Exports the observed timeline as Chrome trace events (complete events, timestamps in microseconds), which can
+        be opened with chrome://tracing or Perfetto. Concurrent activities are distributed to lanes (shown as
+        threads), so that no lane contains overlapping activities.
+        """
+        timed = sorted(self.timed(), key=lambda i: (self.start[i], self.end[i]))
+        origin = self.start[timed[0]] if len(timed) > 0 else 0.0
+        critical = set(self.critical_path)
+
+        events = []
+        # Greedy interval partitioning: reuse the lane, which got free first. Uses the minimal number of lanes.
+        free: List[Tuple[float, int]] = []
+        lanes = 0
+        for i in timed:
+            if len(free) > 0 and free[0][0] <= self.start[i]:
+                _, lane = heapq.heappop(free)
+            else:
+                lane = lanes
+                lanes = lanes + 1
+            heapq.heappush(free, (self.end[i], lane))
+
+            events.append({
+                'name': self.label(i),
+                'cat': 'critical' if i in critical else 'activity',
+                'ph': 'X',
+                'ts': round((self.start[i] - origin) * 1e6),
+                'dur': round(self.duration[i] * 1e6),
+                'pid': 1,
+                'tid': lane,
+                'args': {
+                    'id': self.graph.name(self.activities[i]),
+                    'slack_s': self.slack[i],
+                    'critical': i in critical
+                }
+            })
+
+        for lane in range(lanes):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': lane, 'args': {'name': f'lane {lane}'}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def summary(self, top: int = 10) -> str:
+        lines = [
+            f'Activities: {len(self.activities)} ({len(self.timed())} with start and end time)',
+            f'Observed makespan: {self.makespan():.3f} s',
+            f'Critical path: {self.critical_length:.3f} s, {len(self.critical_path)} activities',
+            f'Parallelism: {self.average_parallelism():.2f} average, '
+            f'{max([p[1] for p in self.profile()], default=0)} maximum',
+            '',
+            'Critical path:'
+        ]
+        for i in self.critical_path:
+            lines.append(f'  {self.duration[i]:12.3f} s  {self.label(i)} ({self.graph.name(self.activities[i])})')
+
+        with_slack = sorted([i for i in range(len(self.activities)) if self.slack[i] > 0],
+                            key=lambda i: self.slack[i], reverse=True)[:top]
+        if len(with_slack) > 0:
+            lines.append('')
+            lines.append('Largest slack:')
+            for i in with_slack:
+                lines.append(f'  {self.slack[i]:12.3f} s  {self.label(i)} ({self.graph.name(self.activities[i])})')
+        return '\n'.join(lines)
+
+
+def main(target_id: str, trace_file: Optional[str], args: dict) -> Timeline:
+    timeline = Timeline(load_graph(args, target_id))
+    print(timeline.summary())
+    if trace_file is not None:
+        with open(trace_file, 'w', encoding='utf-8') as f:
+            json.dump(timeline.chrome_trace(), f)
+    return timeline
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+                                     description=textwrap.dedent('''\
+                                        Computes the critical path, the slack of each activity and the parallelism
+                                        of the lineage of a provenance container.
+                                     '''))
+    parser.add_argument('target_id')
+    parser.add_argument('--trace', help=textwrap.dedent('''\
+                                          Writes the timeline as Chrome trace events (json) into the given file.
+                                       '''))
+    parser.add_argument('--reader', nargs='+', action=ReaderAction)
+
+    args = parser.parse_args()
+
+    main(args.target_id, args.trace, args.reader)
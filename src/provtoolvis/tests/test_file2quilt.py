@@ -326,3 +326,20 @@ def test_main(reference_dir):
             # Iterate over all color channels
             for k in range(len(j)):
                 assert reference[index_i][index_j][k] == image[index_i][index_j][k], 'Images differ at: {}, {}'.format(index_i, index_j)
+
+
+def test_main_reads_once(reference_dir, monkeypatch):
+    read = file2quilt.read_provanddata
+    reads = []
+
+    def counting_read(options, cid):
+        reads.append(cid)
+        return read(options, cid)
+
+    monkeypatch.setattr(file2quilt, 'read_provanddata', counting_read)
+    image_file = os.path.join(reference_dir, 'test_out.png')
+    file2quilt.main('4854deb7749b6005cadd4eaa6622040b5b1e6c98b273309bd63db3deaf1ebbec', image_file, {'directory': reference_dir})
+
+    assert len(reads) == len(set(reads))
+    assert '28dbf4c384508cf78ca3d1245751bfb9b93a4eca377c0fa6214ec31e82157975' in reads
+    assert os.path.exists(image_file)
@@ -0,0 +1,130 @@
+import datetime
+import json
+import os
+import pytest
+import subprocess
+import sys
+import tempfile
+
+from provtoolutils.constants import model_encoding
+from provtoolutils.model import make_provstring, ActingSoftware, Activity, Entity, Person
+from provtoolutils.provgraph import ProvGraph
+from provtoolutils.utilities import calculate_data_hash
+from provtoolvis import timeline
+
+
+@pytest.fixture
+def base_dir():
+    with tempfile.TemporaryDirectory() as d:
+        yield d
+
+
+def _write(base_dir, name, label, start, end, used):
+    t0 = datetime.datetime(2023, 1, 5, 11, 0, 0, tzinfo=datetime.timezone.utc)
+    agent = ActingSoftware(Person('Max', 'Mustermann'), 'Max Mustermann', '-', 'Software', '-')
+    act = Activity(t0 + datetime.timedelta(seconds=start), t0 + datetime.timedelta(seconds=end), '-', label, '-',
+                   used)
+    rawprov = make_provstring(name, Entity.FILE, agent, act, calculate_data_hash(b''))
+    cid = calculate_data_hash(rawprov)
+    with open(os.path.join(base_dir, cid + '.prov'), 'wb') as f:
+        f.write(rawprov)
+    return cid
+
+
+def setup_diamond(base_dir):
+    """
+    a (0-10) is used by b (10-30) and c (10-15). d (30-40) uses b and c.
+    """
+    a = _write(base_dir, 'a', 'A', 0, 10, [])
+    b = _write(base_dir, 'b', 'B', 10, 30, [a])
+    c = _write(base_dir, 'c', 'C', 10, 15, [a])
+    d = _write(base_dir, 'd', 'D', 30, 40, [b, c])
+    return a, b, c, d
+
+
+def test_topological_order():
+    assert timeline.topological_order([[], [0], [0], [1, 2]]) == [0, 1, 2, 3]
+
+    with pytest.raises(ValueError):
+        timeline.topological_order([[1], [0]])
+
+
+def test_parallelism_profile():
+    profile = timeline.parallelism_profile([0, 10, 10], [10, 30, 15])
+    assert profile == [(0, 1), (10, 2), (15, 1), (30, 0)]
+
+
+def test_timeline(base_dir):
+    a, b, c, d = setup_diamond(base_dir)
+
+    tl = timeline.main(d, None, {'directory': base_dir})
+
+    assert len(tl.activities) == 4
+    assert tl.critical_length == 40
+    assert [tl.label(i) for i in tl.critical_path] == ['A', 'B', 'D']
+    slack = {tl.label(i): tl.slack[i] for i in range(len(tl.activities))}
+    assert slack == {'A': 0, 'B': 0, 'C': 15, 'D': 0}
+    assert tl.makespan() == 40
+    assert max([p[1] for p in tl.profile()]) == 2
+    assert tl.average_parallelism() == pytest.approx(45 / 40)
+
+
+def test_chrome_trace(base_dir):
+    a, b, c, d = setup_diamond(base_dir)
+
+    trace = timeline.Timeline(timeline.load_graph({'directory': base_dir}, d)).chrome_trace()
+
+    events = {e['name']: e for e in trace['traceEvents'] if e['ph'] == 'X'}
+    assert len(events) == 4
+    assert events['A']['ts'] == 0
+    assert events['B']['ts'] == 10 * 10 ** 6
+    assert events['B']['dur'] == 20 * 10 ** 6
+    # b and c overlap, the other activities can share a lane with one of them.
+    assert events['B']['tid'] != events['C']['tid']
+    assert len({e['tid'] for e in events.values()}) == 2
+    assert events['D']['cat'] == 'critical'
+    assert events['C']['cat'] == 'activity'
+    assert events['C']['args']['slack_s'] == 15
+
+
+def test_large_lineage():
+    # Chains of activities, where each activity uses the output of its predecessor and of the same step in the
+    # previous chain.
+    graph = ProvGraph()
+    chains, length = 100, 1000
+    for chain in range(chains):
+        for step in range(length):
+            used = {}
+            if step > 0:
+                used['u1'] = {'prov:activity': f'a{chain}_{step}', 'prov:entity': f'e{chain}_{step - 1}'}
+            if chain > 0:
+                used['u2'] = {'prov:activity': f'a{chain}_{step}', 'prov:entity': f'e{chain - 1}_{step}'}
+            start = datetime.datetime(2023, 1, 5, tzinfo=datetime.timezone.utc) + \
+                datetime.timedelta(seconds=chain + step)
+            graph.add_provenance(f'e{chain}_{step}', {
+                'entity': {'self': {'prov:label': 'e'}},
+                'activity': {f'a{chain}_{step}': {'prov:label': 'a',
+                                                  'prov:startTime': start.isoformat(),
+                                                  'prov:endTime': (start + datetime.timedelta(seconds=1)).isoformat()}},
+                'used': used
+            })
+
+    tl = timeline.Timeline(graph)
+
+    assert len(tl.activities) == chains * length
+    assert tl.critical_length == chains + length - 1
+    assert len(tl.critical_path) == chains + length - 1
+    assert len(tl.chrome_trace()['traceEvents']) > chains * length
+
+
+def test_integration(base_dir):
+    a, b, c, d = setup_diamond(base_dir)
+    trace_file = os.path.join(base_dir, 'trace.json')
+
+    result = subprocess.run([sys.executable, '-m', 'provtoolvis.timeline', d, '--trace', trace_file,
+                             '--reader', f'directory={base_dir}'], stdout=subprocess.PIPE)
+
+    assert result.returncode == 0
+    assert 'Critical path: 40.000 s, 3 activities' in result.stdout.decode(model_encoding)
+    with open(trace_file, 'r', encoding='utf-8') as f:
+        assert len(json.load(f)['traceEvents']) > 4